@@ -0,0 +1,248 @@
+"""Навантажувальний тест диспетчера бота з фейковими Telegram, Firestore і AI
+
+Генерує синтетичні оновлення від багатьох користувачів (активні
+користувачі пишуть частіше), подає їх у Dispatcher з обробниками бота і
+вимірює пропускну здатність та затримки p50/p95/p99 для handle_activity,
+/stats і /summary. Зовнішні сервіси замінено на benchmarks.fakes.
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.bench_dispatcher [--updates N] [--concurrency N]
+
+З --output результати зберігаються у JSON; з --baseline порівнюються з
+попереднім запуском, і команда завершується з кодом 1 при регресії.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+from aiogram import Bot
+from aiogram.types import Chat, Message, Update, User
+
+from benchmarks.corpus import MESSAGES
+from benchmarks.fakes import FakeAbacusServer, FakeFirestore, FakeTelegramSession
+from config import (CLASSIFICATION_CACHE_SIZE, CLASSIFICATION_CACHE_TTL,
+                    SCHEDULER_MAX_BACKLOG, SCHEDULER_MAX_CONCURRENCY,
+                    SCHEDULER_MAX_USER_BACKLOG, SCHEDULER_MAX_WAIT)
+from modules.activity_tracker import ActivityTracker
+from modules.ai_client import AIClient
+from modules.classification_cache import ClassificationCache
+from modules.firestore_repository import FirestoreRepository
+from modules.handlers import create_dispatcher
+from modules.scheduler import UpdateScheduler
+from modules.summary_manager import SummaryManager
+from modules.user_manager import UserManager
+
+# Токен лише має пройти перевірку формату, запити в мережу не йдуть
+FAKE_TOKEN = '123456:' + 'A' * 35
+FIRST_USER_ID = 100000
+KINDS = ('activity', 'stats', 'summary')
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """Percentile методом найближчого рангу"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(percent / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def generate_updates(args, rng: random.Random):
+    """Повертає список пар (вид, Update) із заданою сумішшю трафіку"""
+    user_ids = [FIRST_USER_ID + index for index in range(args.users)]
+    # Розподіл, близький до Ципфа: перші користувачі найактивніші
+    weights = list(itertools.accumulate(1 / (rank + 1) ** 1.1
+                                        for rank in range(args.users)))
+    recognized = ActivityTracker()
+    unrecognized = [text for text in MESSAGES
+                    if recognized.detect_by_keywords(text) is None]
+
+    updates = []
+    for update_id in range(1, args.updates + 1):
+        user_id = rng.choices(user_ids, cum_weights=weights)[0]
+        roll = rng.random()
+        if roll < args.stats_share:
+            kind, text = 'stats', '/stats'
+        elif roll < args.stats_share + args.summary_share:
+            kind, text = 'summary', '/summary'
+        else:
+            kind = 'activity'
+            if unrecognized and rng.random() < args.unique_share:
+                # Унікальний текст, якого немає в кеші класифікацій
+                text = f'{rng.choice(unrecognized)} #{update_id}'
+            else:
+                text = rng.choice(MESSAGES)
+
+        message = Message(message_id=update_id, date=datetime.now(),
+                          chat=Chat(id=user_id, type='private'),
+                          from_user=User(id=user_id, is_bot=False,
+                                         first_name=f'User{user_id}'),
+                          text=text)
+        updates.append((kind, Update(update_id=update_id, message=message)))
+    return updates
+
+
+async def run(args) -> Dict:
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+
+    abacus = FakeAbacusServer(latency=args.ai_latency, error_rate=args.ai_error_rate)
+    ai_url = await abacus.start()
+    firestore = FakeFirestore(latency=args.db_latency)
+    session = FakeTelegramSession(latency=args.telegram_latency)
+
+    repository = FirestoreRepository(firestore)
+    user_manager = UserManager(repository)
+    summary_manager = SummaryManager(repository, user_manager.timeline)
+    ai_client = AIClient(api_url=ai_url, api_key='fake')
+    classification_cache = ClassificationCache(CLASSIFICATION_CACHE_SIZE,
+                                               CLASSIFICATION_CACHE_TTL)
+    tracker = ActivityTracker(ai_client, classification_cache)
+    scheduler = None
+    if args.max_concurrency > 0:
+        scheduler = UpdateScheduler(args.max_concurrency, args.max_backlog,
+                                    SCHEDULER_MAX_USER_BACKLOG, SCHEDULER_MAX_WAIT)
+    dp = create_dispatcher(user_manager, summary_manager, tracker, scheduler)
+    bot = Bot(token=FAKE_TOKEN, session=session)
+
+    updates = generate_updates(args, rng)
+    latencies = defaultdict(list)
+    errors = 0
+    pending = iter(updates)
+
+    async def worker():
+        nonlocal errors
+        for kind, update in pending:
+            start = time.perf_counter()
+            try:
+                await dp.feed_update(bot, update)
+            except Exception:
+                errors += 1
+                continue
+            latencies[kind].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    flush_start = time.perf_counter()
+    if scheduler is not None:
+        await scheduler.close()
+    await user_manager.close()
+    flush_time = time.perf_counter() - flush_start
+
+    await ai_client.close()
+    await abacus.close()
+    await bot.session.close()
+
+    results = {
+        'updates': len(updates),
+        'errors': errors,
+        'elapsed': elapsed,
+        'throughput': len(updates) / elapsed,
+        'flush_time': flush_time,
+        'latency_ms': {},
+        'firestore': dict(firestore.counters),
+        'telegram': dict(session.requests),
+        'ai': dict(abacus.requests),
+        'classification_cache': classification_cache.stats(),
+        'scheduler': scheduler.stats() if scheduler is not None else {},
+    }
+    for kind in KINDS:
+        values = sorted(latencies[kind])
+        results['latency_ms'][kind] = {
+            'count': len(values),
+            'p50': percentile(values, 50) * 1000,
+            'p95': percentile(values, 95) * 1000,
+            'p99': percentile(values, 99) * 1000,
+            'max': (values[-1] if values else 0.0) * 1000,
+        }
+    return results
+
+
+def print_results(results: Dict):
+    print(f"Оновлень: {results['updates']}, помилок: {results['errors']}, "
+          f"час: {results['elapsed']:.2f} с")
+    print(f"Пропускна здатність: {results['throughput']:,.0f} оновлень/с")
+    print(f"Дописування буфера після тесту: {results['flush_time'] * 1000:.0f} мс")
+    print(f"{'обробник':<10}{'к-сть':>8}{'p50, мс':>10}{'p95, мс':>10}"
+          f"{'p99, мс':>10}{'max, мс':>10}")
+    for kind, stats in results['latency_ms'].items():
+        print(f"{kind:<10}{stats['count']:>8}{stats['p50']:>10.1f}{stats['p95']:>10.1f}"
+              f"{stats['p99']:>10.1f}{stats['max']:>10.1f}")
+    print(f"Firestore: {results['firestore']}")
+    print(f"Telegram: {results['telegram']}")
+    print(f"AI: {results['ai']}")
+    if results['scheduler']:
+        print(f"Планувальник: {results['scheduler']}")
+
+
+def find_regressions(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Порівнює пропускну здатність і p99 з попереднім запуском"""
+    regressions = []
+    if results['throughput'] < baseline['throughput'] * (1 - tolerance):
+        regressions.append(f"пропускна здатність {results['throughput']:,.0f} "
+                           f"< {baseline['throughput']:,.0f} оновлень/с")
+    for kind, stats in results['latency_ms'].items():
+        before = baseline['latency_ms'].get(kind)
+        if before and before['count'] and stats['p99'] > before['p99'] * (1 + tolerance):
+            regressions.append(f"{kind}: p99 {stats['p99']:.1f} мс "
+                               f"> {before['p99']:.1f} мс")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=100,
+                        help='одночасно оброблюваних оновлень')
+    parser.add_argument('--max-concurrency', type=int, default=SCHEDULER_MAX_CONCURRENCY,
+                        help='ліміт планувальника оновлень; 0 - без планувальника')
+    parser.add_argument('--max-backlog', type=int, default=SCHEDULER_MAX_BACKLOG)
+    parser.add_argument('--stats-share', type=float, default=0.1)
+    parser.add_argument('--summary-share', type=float, default=0.1)
+    parser.add_argument('--unique-share', type=float, default=0.05,
+                        help='частка активностей з новим текстом для AI')
+    parser.add_argument('--db-latency', type=float, default=0.005,
+                        help='затримка одного RPC до Firestore, с')
+    parser.add_argument('--ai-latency', type=float, default=0.3,
+                        help='затримка відповіді AI, с')
+    parser.add_argument('--ai-error-rate', type=float, default=0.0)
+    parser.add_argument('--telegram-latency', type=float, default=0.02,
+                        help='затримка запиту до Bot API, с')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='зберегти результати у JSON файл')
+    parser.add_argument('--baseline', help='JSON файл попереднього запуску')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='допустиме погіршення відносно baseline')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(run(args))
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = find_regressions(results, json.load(baseline_file),
+                                           args.tolerance)
+        for regression in regressions:
+            print(f"Регресія: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
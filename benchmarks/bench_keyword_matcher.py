@@ -0,0 +1,158 @@
+"""Мікробенчмарк швидкого шляху визначення активності
+
+Порівнює попередній алгоритм (кілька проходів по тексту з text.lower() у
+кожному методі) з KeywordMatcher, що знаходить усі слова за один прохід і
+зводить слова до основ. Для кожного набору виводяться частка повідомлень,
+розпізнаних без AI, і час на повідомлення; для набору без активностей
+розпізнане повідомлення - хибне спрацювання.
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.bench_keyword_matcher [--rounds N]
+"""
+import argparse
+import re
+import time
+
+from benchmarks.corpus import INFLECTED_MESSAGES, MESSAGES, NEGATIVE_MESSAGES
+from modules.activity_tracker import ActivityTracker
+
+LEGACY_ACTIVITY_TYPES = {
+    'meal': ['їм', 'обід', 'сніданок', 'вечеря', 'перекус', 'готую', 'роблю обід'],
+    'work': ['робота', 'працюю', 'зустріч', 'мітинг', 'проект', 'завдання'],
+    'exercise': ['спорт', 'тренування', 'біг', 'присідання', 'віджимання', 'зал'],
+    'rest': ['відпочинок', 'перерва', 'дивлюся', 'читаю', 'слухаю'],
+    'cleaning': ['прибирання', 'миття', 'прання', 'порядок'],
+    'meeting': ['зустріч з', 'бачився з', 'розмова з'],
+    'drink': ['п\'ю', 'випив', 'кава', 'чай', 'вода'],
+    'sleep': ['спати', 'лягаю спати', 'йду спати', 'сон', 'відпочивати', 'засинаю']
+}
+
+
+def legacy_detect(text: str):
+    """Копія попереднього швидкого шляху ActivityTracker для порівняння"""
+    text_lower = text.lower()
+    for activity_type, keywords in LEGACY_ACTIVITY_TYPES.items():
+        for keyword in keywords:
+            if keyword in text_lower:
+                details = legacy_details(text, activity_type)
+                return {
+                    'type': activity_type,
+                    'subtype': details.get('subtype', ''),
+                    'details': details,
+                    'auto_detected': True
+                }
+    return None
+
+
+def legacy_details(text: str, activity_type: str) -> dict:
+    details = {'description': text}
+    if activity_type == 'meal':
+        common_foods = ['курка', 'макарон', 'рис', 'картопля', 'м\'ясо', 'риба', 'овочі']
+        details['food_items'] = [food for food in common_foods if food in text.lower()]
+        text_lower = text.lower()
+        if any(word in text_lower for word in ['сніданок', 'ранок']):
+            details['subtype'] = 'breakfast'
+        elif any(word in text_lower for word in ['обід', 'ланч']):
+            details['subtype'] = 'lunch'
+        elif any(word in text_lower for word in ['вечеря', 'вечір']):
+            details['subtype'] = 'dinner'
+        else:
+            details['subtype'] = 'snack'
+    elif activity_type == 'exercise':
+        numbers = re.findall(r'\d+', text)
+        exercise_type = 'general'
+        for ukr_name, eng_name in {'присідання': 'squats', 'віджимання': 'push-ups',
+                                   'біг': 'running', 'планка': 'plank'}.items():
+            if ukr_name in text.lower():
+                exercise_type = eng_name
+                break
+        details.update({'exercise_type': exercise_type,
+                        'repetitions': int(numbers[0]) if numbers else 0})
+    elif activity_type == 'meeting':
+        people = []
+        if ' з ' in text.lower():
+            parts = text.lower().split(' з ')
+            if len(parts) > 1 and parts[1].split():
+                people.append(parts[1].split()[0])
+        details['people'] = people
+    elif activity_type == 'drink':
+        drink_type = 'water'
+        for ukr_name, eng_name in {'вода': 'water', 'кава': 'coffee', 'чай': 'tea'}.items():
+            if ukr_name in text.lower():
+                drink_type = eng_name
+                break
+        numbers = re.findall(r'\d+', text)
+        details.update({'drink_type': drink_type,
+                        'amount': int(numbers[0]) if numbers else 1})
+    elif activity_type == 'sleep':
+        details['subtype'] = 'sleep'
+    return details
+
+
+def measure(func, messages, rounds: int, repeat: int = 5) -> float:
+    """Повертає мікросекунди на повідомлення (найкращий з repeat запусків)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in messages:
+                func(text)
+        best = min(best, time.perf_counter() - start)
+    return best / (rounds * len(messages)) * 1e6
+
+
+def hit_rate(func, messages) -> float:
+    return sum(func(text) is not None for text in messages) / len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=2000)
+    args = parser.parse_args()
+
+    tracker = ActivityTracker()
+
+    # Повідомлення, які старий алгоритм розпізнавав, мають зберегти свій тип
+    changed = []
+    for text in MESSAGES + INFLECTED_MESSAGES:
+        before, after = legacy_detect(text), tracker.detect_by_keywords(text)
+        if before is not None and (after is None or after['type'] != before['type']):
+            changed.append((text, before['type'], after and after['type']))
+    if changed:
+        print(f"Увага: змінився тип для {len(changed)} повідомлень:")
+        for text, before, after in changed:
+            print(f"  {text!r}: {before} -> {after}")
+
+    # Повідомлення без активності не повинні розпізнаватися швидким шляхом
+    false_hits = []
+    for text in NEGATIVE_MESSAGES:
+        after = tracker.detect_by_keywords(text)
+        if after is not None:
+            false_hits.append((text, after['type']))
+    if false_hits:
+        print(f"Увага: хибно розпізнано {len(false_hits)} повідомлень без активності:")
+        for text, activity_type in false_hits:
+            print(f"  {text!r}: {activity_type}")
+
+    recognized = [text for text in MESSAGES if legacy_detect(text) is not None]
+    unrecognized = [text for text in MESSAGES if legacy_detect(text) is None]
+
+    print(f"Корпус: {len(MESSAGES)} + {len(INFLECTED_MESSAGES)} + "
+          f"{len(NEGATIVE_MESSAGES)} повідомлень "
+          f"x {args.rounds} раундів")
+    print(f"{'набір':<16}{'без AI до':>11}{'після':>8}"
+          f"{'до, мкс':>10}{'після, мкс':>12}{'прискорення':>14}")
+    for name, messages in (('весь корпус', MESSAGES),
+                           ('розпізнані', recognized),
+                           ('нерозпізнані', unrecognized),
+                           ('словоформи', INFLECTED_MESSAGES),
+                           ('без активності', NEGATIVE_MESSAGES)):
+        before = measure(legacy_detect, messages, args.rounds)
+        after = measure(tracker.detect_by_keywords, messages, args.rounds)
+        print(f"{name:<16}{hit_rate(legacy_detect, messages):11.0%}"
+              f"{hit_rate(tracker.detect_by_keywords, messages):8.0%}"
+              f"{before:10.2f}{after:12.2f}{before / after:13.2f}x")
+
+
+if __name__ == '__main__':
+    main()
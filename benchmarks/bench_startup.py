@@ -0,0 +1,135 @@
+"""Холодний старт бота: імпорт модулів і ініціалізація застосунку
+
+Кожен запуск - окремий процес Python, тож кеш імпортів не впливає на
+результат. Процес імпортує modules.app, створює застосунок з локальним
+сховищем SQLite у тимчасовій папці, виконує startup() і shutdown(), а
+тривалості етапів зі StartupReport повертає батьківському процесу.
+Мережа і Firebase не потрібні.
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.bench_startup [--runs N]
+
+З --output результати (медіани етапів) зберігаються у JSON; з --baseline
+порівнюються з попереднім запуском, і команда завершується з кодом 1 при
+регресії. Деталі імпорту окремих пакетів: python -X importtime bot.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# Етапи, регресії яких перевіряються відносно baseline
+CHECKED_PHASES = ('interpreter', 'import_modules', 'init', 'total')
+
+
+async def _child_run(started: float) -> Dict:
+    from modules.startup import StartupReport
+    report = StartupReport(started)
+    with report.phase('import_modules'):
+        from modules.app import create_app
+    app = create_app(mode='polling', storage_backend='sqlite', report=report)
+    try:
+        await app.startup()
+        report.finish()
+    finally:
+        await app.shutdown()
+    return report.stats()
+
+
+def child():
+    started = time.perf_counter()
+    # Час від створення процесу батьком до виконання першого рядка
+    interpreter = time.time() - float(os.environ['BENCH_SPAWNED_AT'])
+    stats = asyncio.run(_child_run(started))
+    stats['interpreter_seconds'] = round(interpreter, 4)
+    stats['total_seconds'] = round(stats['total_seconds'] + interpreter, 4)
+    print(json.dumps(stats))
+
+
+def run_once(workdir: str) -> Dict[str, float]:
+    env = dict(os.environ,
+               SQLITE_PATH=os.path.join(workdir, 'bench.sqlite3'),
+               REMINDER_STATE_PATH=os.path.join(workdir, 'reminders.json'),
+               CLASSIFICATION_CACHE_PATH=os.path.join(workdir, 'cache.sqlite3'),
+               BENCH_SPAWNED_AT=repr(time.time()))
+    completed = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_startup', '--child'],
+        env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Запуск завершився з кодом {completed.returncode}:\n"
+                           f"{completed.stderr}")
+    stats = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {key[:-len('_seconds')]: value for key, value in stats.items()}
+
+
+def run(args) -> Dict:
+    samples: Dict[str, List[float]] = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for _ in range(args.runs):
+            for phase, seconds in run_once(workdir).items():
+                samples.setdefault(phase, []).append(seconds)
+    return {
+        'runs': args.runs,
+        'median_ms': {phase: statistics.median(values) * 1000
+                      for phase, values in samples.items()},
+        'max_ms': {phase: max(values) * 1000 for phase, values in samples.items()},
+    }
+
+
+def print_results(results: Dict):
+    print(f"Запусків: {results['runs']}")
+    print(f"{'етап':<22}{'медіана, мс':>13}{'max, мс':>10}")
+    for phase, median in results['median_ms'].items():
+        print(f"{phase:<22}{median:>13.1f}{results['max_ms'][phase]:>10.1f}")
+
+
+def find_regressions(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Порівнює медіани основних етапів з попереднім запуском"""
+    regressions = []
+    for phase in CHECKED_PHASES:
+        now = results['median_ms'].get(phase)
+        before = baseline['median_ms'].get(phase)
+        if now is not None and before and now > before * (1 + tolerance):
+            regressions.append(f"{phase}: {now:.1f} мс > {before:.1f} мс")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', help='зберегти результати у JSON файл')
+    parser.add_argument('--baseline', help='JSON файл попереднього запуску')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='допустиме погіршення відносно baseline')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    results = run(args)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = find_regressions(results, json.load(baseline_file),
+                                           args.tolerance)
+        for regression in regressions:
+            print(f"Регресія: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
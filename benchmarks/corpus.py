@@ -0,0 +1,113 @@
+"""Фіксований набір повідомлень для бенчмарків, схожий на реальний трафік"""
+
+MESSAGES = [
+    "12:45 роблю обід, курку і макарон",
+    "14:00 почав роботу над проектом",
+    "15:30 зробив 20 присідань",
+    "8:00 сніданок, вівсянка і кава",
+    "випив 2 склянки води",
+    "п'ю чай з лимоном",
+    "йду спати",
+    "23:30 лягаю спати",
+    "зустріч з Олегом в кафе",
+    "мітинг з командою о 10",
+    "прибирання на кухні",
+    "прання білизни",
+    "дивлюся серіал",
+    "читаю книжку",
+    "слухаю подкаст про історію",
+    "перерва на 15 хвилин",
+    "тренування в залі, 40 хвилин",
+    "біг 5 км",
+    "30 віджимань",
+    "планка 2 хвилини",
+    "вечеря: риба і овочі",
+    "перекус яблуком",
+    "готую рис з м'ясом",
+    "їм картоплю з куркою",
+    "кава з молоком",
+    "вода 3 склянки",
+    "завдання по роботі на сьогодні",
+    "працюю з документами",
+    "бачився з Марією",
+    "розмова з мамою по телефону",
+    "засинаю",
+    "денний сон 30 хвилин",
+    "йду гуляти",
+    "дивлюсь серіал",
+    "пила воду",
+    "прибрав у кімнаті",
+    "вечеряю з сім'єю",
+    "зробив 20 присідань",
+    "гуляю з собакою",
+    "їду на роботу",
+    "шопінг у торговому центрі",
+    "граю в настолки з друзями",
+    "медитація 10 хвилин",
+    "катаюсь на велосипеді",
+    "ремонт у ванній",
+    "10:15 поливаю квіти",
+    "17:40 забрав дитину зі школи",
+    "19:00 вчу англійську",
+    "пишу звіт",
+    "ланч у кафе",
+    "ранкова пробіжка",
+    "вечір, відпочиваю",
+    "миття посуду",
+    "порядок у шафі",
+    "спорт 1 година",
+    "їм суп",
+    "22:10 вечірній чай",
+    "обід: рис, риба, овочі",
+    "13:00 проект для клієнта, нове завдання",
+    "випив каву",
+]
+
+# Відмінкові форми і форми дієслів для слів зі словників ActivityTracker
+INFLECTED_MESSAGES = [
+    "зробив 30 присідань",
+    "50 віджимань зранку",
+    "пила воду",
+    "випила склянку води",
+    "п'є каву",
+    "пив чай з медом",
+    "прибрала на балконі",
+    "прибираю квартиру",
+    "вечеряю",
+    "обідаю з колегами",
+    "снідаю вівсянкою",
+    "був на тренуванні",
+    "після тренувань болять ноги",
+    "в спортзалі",
+    "бігав у парку",
+    "працювала до вечора",
+    "на роботі до шостої",
+    "завдань сьогодні багато",
+    "дивилася фільм",
+    "читала статтю",
+    "слухала музику",
+    "відпочиваю на дивані",
+    "сплю після обіду",
+    "лягаю спатоньки",
+    "миття вікон",
+    "прання речей",
+    "поїла рису з куркою",
+    "з'їв картоплю",
+    "курку з овочами на вечерю",
+    "зустрілась з подругою",
+    "на мітингу з командою",
+    "закінчив проекти",
+]
+
+# Повідомлення без активності, схожі на ключові слова початком слова чи
+# омонімом: швидкий шлях не повинен їх розпізнавати
+NEGATIVE_MESSAGES = [
+    "водій запізнився",
+    "їду до водоспаду",
+    "пила дерево в гаражі",
+    "спала температура",
+    "чайка над морем",
+    "сонце світить",
+    "обідрана шпалера",
+    "кавун на столі",
+]
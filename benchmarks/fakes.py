@@ -0,0 +1,354 @@
+"""Локальні замінники зовнішніх сервісів для навантажувальних тестів
+
+FakeFirestore реалізує ту частину асинхронного клієнта Firestore, якою
+користується FirestoreRepository, FakeTelegramSession підміняє HTTP сесію
+aiogram, а FakeAbacusServer - це справжній aiohttp сервер на localhost з
+API у форматі Abacus ChatLLM. Затримку кожного сервісу можна налаштувати.
+"""
+import asyncio
+import copy
+import json
+import random
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage
+from aiogram.types import Chat, Message
+from aiohttp import web
+from google.api_core.exceptions import AlreadyExists
+from google.cloud.firestore import Increment
+
+from config import WRITE_BATCH_SIZE
+
+
+def _deep_merge(target: Dict, data: Dict):
+    for key, value in data.items():
+        if isinstance(value, Increment):
+            target[key] = target.get(key, 0) + value.value
+        elif isinstance(value, dict):
+            nested = target.get(key)
+            if not isinstance(nested, dict):
+                nested = target[key] = {}
+            _deep_merge(nested, value)
+        else:
+            target[key] = copy.deepcopy(value)
+
+
+def _resolve(data: Dict) -> Dict:
+    """Значення, яке Firestore зберіг би для set() без merge"""
+    resolved = {}
+    _deep_merge(resolved, data)
+    return resolved
+
+
+def _project(data: Dict, fields: List[str]) -> Dict:
+    """Проекція select() з підтримкою вкладених шляхів через крапку"""
+    projected = {}
+    for field in fields:
+        *parents, leaf = field.split('.')
+        source, target = data, projected
+        for part in parents:
+            source = source.get(part) if isinstance(source, dict) else None
+            target = target.setdefault(part, {})
+        if isinstance(source, dict) and leaf in source:
+            target[leaf] = copy.deepcopy(source[leaf])
+    return projected
+
+
+class FakeSnapshot:
+    def __init__(self, reference: 'FakeDocumentReference', data: Optional[Dict]):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str):
+        value = self._data
+        for part in field.split('.'):
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+
+
+class FakeDocumentReference:
+    def __init__(self, db: 'FakeFirestore', collection_path: str, document_id: str):
+        self._db = db
+        self._collection_path = collection_path
+        self.id = document_id
+        self.path = f'{collection_path}/{document_id}'
+
+    def collection(self, name: str) -> 'FakeCollectionReference':
+        return FakeCollectionReference(self._db, f'{self.path}/{name}')
+
+    def _snapshot(self) -> FakeSnapshot:
+        return FakeSnapshot(self, self._db._documents(self._collection_path).get(self.id))
+
+    def _write(self, data: Dict, merge: bool = False):
+        documents = self._db._documents(self._collection_path)
+        if merge and self.id in documents:
+            _deep_merge(documents[self.id], data)
+        else:
+            documents[self.id] = _resolve(data)
+
+    async def get(self) -> FakeSnapshot:
+        await self._db._rpc('reads')
+        return self._snapshot()
+
+    async def set(self, data: Dict, merge: bool = False):
+        await self._db._rpc('writes')
+        self._write(data, merge)
+
+    async def update(self, field_updates: Dict):
+        await self._db._rpc('writes')
+        documents = self._db._documents(self._collection_path)
+        if self.id not in documents:
+            raise KeyError(f'Документ {self.path} не існує')
+        for dotted, value in field_updates.items():
+            *parents, leaf = dotted.split('.')
+            target = documents[self.id]
+            for part in parents:
+                target = target.setdefault(part, {})
+            target[leaf] = copy.deepcopy(value)
+
+
+class FakeQuery:
+    """Фільтри where, select, order_by, limit і start_after над колекцією"""
+
+    _OPERATORS = {
+        '==': lambda a, b: a == b,
+        '<': lambda a, b: a < b,
+        '<=': lambda a, b: a <= b,
+        '>': lambda a, b: a > b,
+        '>=': lambda a, b: a >= b,
+    }
+
+    def __init__(self, collection: 'FakeCollectionReference', filters=(),
+                 fields=None, order=None, limit_count=None, cursor=None):
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._fields = fields
+        self._order = order
+        self._limit = limit_count
+        self._cursor = cursor
+
+    def _copy(self, **changes) -> 'FakeQuery':
+        state = dict(filters=self._filters, fields=self._fields, order=self._order,
+                     limit_count=self._limit, cursor=self._cursor)
+        state.update(changes)
+        return FakeQuery(self._collection, **state)
+
+    def where(self, field: str, op: str, value) -> 'FakeQuery':
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def select(self, fields: List[str]) -> 'FakeQuery':
+        return self._copy(fields=list(fields))
+
+    def order_by(self, field: str) -> 'FakeQuery':
+        return self._copy(order=field)
+
+    def limit(self, count: int) -> 'FakeQuery':
+        return self._copy(limit_count=count)
+
+    def start_after(self, snapshot: FakeSnapshot) -> 'FakeQuery':
+        return self._copy(cursor=snapshot)
+
+    @staticmethod
+    def _value(document_id: str, data: Dict, field: str):
+        if field == '__name__':
+            return document_id
+        return data.get(field)
+
+    def _matches(self, document_id: str, data: Dict) -> bool:
+        for field, op, value in self._filters:
+            if isinstance(value, FakeDocumentReference):
+                value = value.id
+            actual = self._value(document_id, data, field)
+            if actual is None or not self._OPERATORS[op](actual, value):
+                return False
+        return True
+
+    async def stream(self):
+        db = self._collection._db
+        await db._rpc('queries')
+        documents = db._documents(self._collection.path)
+        order = self._order or '__name__'
+        rows = sorted(((document_id, data) for document_id, data in documents.items()
+                       if self._matches(document_id, data)),
+                      key=lambda row: (self._value(row[0], row[1], order), row[0]))
+        if self._cursor is not None:
+            after = (self._value(self._cursor.id, self._cursor._data or {}, order),
+                     self._cursor.id)
+            rows = [row for row in rows
+                    if (self._value(row[0], row[1], order), row[0]) > after]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+
+        for document_id, data in rows:
+            if self._fields is not None:
+                data = _project(data, self._fields)
+            db.counters['documents_read'] += 1
+            yield FakeSnapshot(self._collection.document(document_id), data)
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, db: 'FakeFirestore', path: str):
+        self._db = db
+        self.path = path
+        super().__init__(self)
+
+    def document(self, document_id: Optional[str] = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self._db, self.path,
+                                     document_id or f'{random.getrandbits(80):020x}')
+
+
+class FakeWriteBatch:
+    def __init__(self, db: 'FakeFirestore'):
+        self._db = db
+        self._operations = []
+        self._creates = []
+
+    def set(self, reference: FakeDocumentReference, data: Dict, merge: bool = False):
+        self._operations.append((reference, data, merge))
+
+    def update(self, reference: FakeDocumentReference, data: Dict):
+        self._operations.append((reference, data, True))
+
+    def delete(self, reference: FakeDocumentReference):
+        self._operations.append((reference, None, False))
+
+    def create(self, reference: FakeDocumentReference, data: Dict):
+        self._operations.append((reference, data, False))
+        self._creates.append(reference)
+
+    async def commit(self):
+        if len(self._operations) > WRITE_BATCH_SIZE:
+            raise ValueError(f'WriteBatch має {len(self._operations)} операцій, '
+                             f'ліміт {WRITE_BATCH_SIZE}')
+        await self._db._rpc('commits')
+        # Пакет атомарний: create() існуючого документа відхиляє весь пакет
+        for reference in self._creates:
+            if reference._snapshot().exists:
+                raise AlreadyExists(f'Документ {reference.path} уже існує')
+        self._db.counters['writes'] += len(self._operations)
+        for reference, data, merge in self._operations:
+            if data is None:
+                self._db._documents(reference._collection_path).pop(reference.id, None)
+            else:
+                reference._write(data, merge)
+
+
+class FakeFirestore:
+    """Документи в пам'яті; кожен RPC чекає latency секунд"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.counters = Counter()
+        self._collections: Dict[str, Dict[str, Dict]] = {}
+
+    def _documents(self, collection_path: str) -> Dict[str, Dict]:
+        return self._collections.setdefault(collection_path, {})
+
+    async def _rpc(self, kind: str):
+        self.counters[kind] += 1
+        await asyncio.sleep(self.latency)
+
+    def collection(self, name: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, name)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    async def get_all(self, references: List[FakeDocumentReference]):
+        await self._rpc('reads')
+        for reference in references:
+            self.counters['documents_read'] += 1
+            yield reference._snapshot()
+
+
+class FakeTelegramSession(BaseSession):
+    """Сесія aiogram, що відповідає на запити Bot API без мережі"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.requests = Counter()
+        self._message_id = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests[type(method).__name__] += 1
+        await asyncio.sleep(self.latency)
+        if isinstance(method, SendMessage):
+            self._message_id += 1
+            return Message(message_id=self._message_id, date=datetime.now(),
+                           chat=Chat(id=method.chat_id, type='private'),
+                           text=method.text)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30,
+                             chunk_size=65536, raise_for_status=True):
+        raise NotImplementedError
+        yield b''
+
+    async def close(self):
+        pass
+
+
+class FakeAbacusServer:
+    """HTTP сервер у форматі Abacus ChatLLM на випадковому порту localhost"""
+
+    TEXT_RE = re.compile(r'Текст: "(.*)"')
+    # Рядок пакетного запиту: номер і текст у JSON лапках
+    BATCH_ITEM_RE = re.compile(r'^\s*(\d+)\. (".*")\s*$', re.MULTILINE)
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = Counter()
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ''
+
+    async def _chat(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        await asyncio.sleep(self.latency)
+        if random.random() < self.error_rate:
+            self.requests['errors'] += 1
+            return web.Response(status=503)
+
+        self.requests['ok'] += 1
+        prompt = payload['messages'][0]['content']
+        batch = self.BATCH_ITEM_RE.findall(prompt)
+        if batch:
+            self.requests['batched_items'] += len(batch)
+            answer = [{'index': int(index), 'type': 'other', 'subtype': '',
+                       'details': {'description': json.loads(text)}}
+                      for index, text in batch]
+        else:
+            match = self.TEXT_RE.search(prompt)
+            answer = {'type': 'other', 'subtype': '',
+                      'details': {'description': match.group(1) if match else ''}}
+        content = json.dumps(answer, ensure_ascii=False)
+        return web.json_response({'choices': [{'message': {'content': content}}]})
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post('/chatllm/v1/chat', self._chat)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f'http://127.0.0.1:{port}/chatllm/v1/chat'
+        return self.url
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
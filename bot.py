@@ -1,171 +1,59 @@
-import asyncio
-import logging
-from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command
-from aiogram.types import Message
-import firebase_admin
-from firebase_admin import credentials, firestore
-
-# Імпорти конфігурації
-from config import TELEGRAM_BOT_TOKEN, FIREBASE_KEY_PATH
-
-# Налаштування логування
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-# Ініціалізація Firebase
-cred = credentials.Certificate(FIREBASE_KEY_PATH)
-firebase_admin.initialize_app(cred)
-db = firestore.client()
-
-# Імпорти модулів (після ініціалізації Firebase)
-from modules.activity_tracker import ActivityTracker
-from modules.keyboard_manager import KeyboardManager
-from modules.summary_manager import SummaryManager
-from modules.user_manager import UserManager, init_db
-
-# Ініціалізуємо базу даних для модулів
-init_db(db)
-
-# Ініціалізація бота
-bot = Bot(token=TELEGRAM_BOT_TOKEN)
-dp = Dispatcher()
-
-# Ініціалізація трекера
-tracker = ActivityTracker()
-
-
-@dp.message(Command("start"))
-async def cmd_start(message: Message):
-    """Команда /start"""
-    user = await UserManager.get_or_create_user(message.from_user)
-
-    welcome_text = f"""
-🤖 Привіт, {user['first_name']}!
-
-Я твій особистий асистент для відстеження активностей.
-
-Просто пиши мені, що ти робиш, наприклад:
-• "12:45 роблю обід, курку і макарон"
-• "14:00 почав роботу над проектом"
-• "15:30 зробив 20 присідань"
-
-Команди:
-/help - допомога
-/summary - підсумок дня
-/stats - статистика
-/settings - налаштування
-    """
-
-    await message.answer(welcome_text,
-                         reply_markup=KeyboardManager.main_menu())
-
+"""Точка входу бота
 
-@dp.message(Command("help"))
-async def cmd_help(message: Message):
-    """Команда /help"""
-    help_text = """
-📋 **Доступні команди:**
+Імпорт цього файлу нічого не ініціалізує: застосунок створює
+modules.app.create_app(), а важкі залежності піднімаються в run().
 
-/start - почати роботу з ботом
-/summary - підсумок дня/тижня
-/stats - детальна статистика
-/diet - аналіз раціону
-/exercise - аналіз фізичних вправ
-/settings - налаштування бота
-/help - ця довідка
+    python bot.py               # запуск у режимі BOT_MODE
+    python bot.py healthcheck   # проба готовності для Docker HEALTHCHECK
+"""
+import time
 
-**Як користуватися:**
-Просто пиши свої активності у вільній формі!
-    """
+_IMPORT_STARTED = time.perf_counter()
 
-    await message.answer(help_text, parse_mode="Markdown")
-
-
-
-@dp.message(Command("summary"))
-async def cmd_summary(message: Message):
-    user_id = str(message.from_user.id)
-    # За замовчуванням — підсумок дня
-    summary, total, start_date, end_date = SummaryManager.get_summary(user_id, db, period="day")
-    text = SummaryManager.format_summary(summary, total, start_date, end_date)
-    await message.answer(text)
-
-@dp.message(Command("weeksummary"))
-async def cmd_week_summary(message: Message):
-    user_id = str(message.from_user.id)
-    summary, total, start_date, end_date = SummaryManager.get_summary(user_id, db, period="week")
-    text = SummaryManager.format_summary(summary, total, start_date, end_date)
-    await message.answer(text)
-
-
-@dp.message(Command("stats"))
-async def cmd_stats(message: Message):
-    user_id = str(message.from_user.id)
-    stats, total = await UserManager.get_daily_stats(user_id, db)
-    if total == 0:
-        await message.answer("Сьогодні ще немає жодної активності.")
-        return
+import asyncio
+import logging
+import sys
+import urllib.request
 
-    stat_lines = [f"Всього активностей: {total}"]
-    for act_type, count in stats.items():
-        emoji = {
-            "meal": "🍽",
-            "exercise": "💪",
-            "sleep": "😴",
-            "work": "🏢",
-            "rest": "🛋",
-            "drink": "💧",
-            "cleaning": "🧹",
-            "meeting": "👥",
-            "other": "❓"
-        }.get(act_type, "❓")
-        stat_lines.append(f"{emoji} {act_type}: {count}")
+from config import (LOG_LEVEL, METRICS_HOST, METRICS_PORT,
+                    STARTUP_REPORT_PATH)
 
-    await message.answer("\n".join(stat_lines))
+logger = logging.getLogger(__name__)
 
 
-@dp.message()
-async def handle_activity(message: Message):
-    """Обробка звичайних повідомлень як активностей"""
+def healthcheck() -> int:
+    """0, якщо бот у цьому контейнері готовий приймати оновлення"""
+    host = '127.0.0.1' if METRICS_HOST in ('0.0.0.0', '') else METRICS_HOST
     try:
-        user = await UserManager.get_or_create_user(message.from_user)
-        activity_data = await tracker.detect_activity_type(message.text)
+        with urllib.request.urlopen(f'http://{host}:{METRICS_PORT}/ready',
+                                    timeout=3) as response:
+            return 0 if response.status == 200 else 1
+    except OSError:
+        return 1
 
-        await UserManager.save_activity(str(message.from_user.id),
-                                        activity_data, message.text)
 
-        response = f"✅ Записав: {activity_data['type']}"
-        if activity_data['subtype']:
-            response += f" ({activity_data['subtype']})"
-
-        if activity_data['type'] == 'meal' and activity_data['details'].get(
-                'food_items'):
-            foods = ', '.join(activity_data['details']['food_items'])
-            response += f"\n🍽 Продукти: {foods}"
-
-        elif activity_data['type'] == 'exercise':
-            if activity_data['details'].get('repetitions'):
-                response += f"\n💪 {activity_data['details']['repetitions']} повторень"
-
-        elif activity_data['type'] == 'drink':
-            drink_type = activity_data['details'].get('drink_type', 'напій')
-            amount = activity_data['details'].get('amount', 1)
-            response += f"\n🥤 {amount} {drink_type}"
-
-        await message.answer(response)
+async def main():
+    """Запуск бота"""
+    from modules.startup import StartupReport
+    report = StartupReport(_IMPORT_STARTED)
+    report.phases['import_config'] = _IMPORT_FINISHED - _IMPORT_STARTED
+    with report.phase('import_modules'):
+        from modules.app import create_app
 
-    except Exception as e:
-        logger.error(f"Помилка при обробці активності: {e}")
-        await message.answer(
-            "❌ Виникла помилка при збереженні активності. Спробуй ще раз.")
+    app = create_app(report=report)
+    try:
+        await app.run()
+    finally:
+        if STARTUP_REPORT_PATH and report.total is not None:
+            report.save(STARTUP_REPORT_PATH)
 
 
-async def main():
-    """Запуск бота"""
-    logger.info("Запускаю бота...")
-    await dp.start_polling(bot)
+_IMPORT_FINISHED = time.perf_counter()
 
 
 if __name__ == "__main__":
+    if sys.argv[1:] == ['healthcheck']:
+        sys.exit(healthcheck())
+    # Налаштування логування
+    logging.basicConfig(level=LOG_LEVEL)
     asyncio.run(main())
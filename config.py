@@ -16,6 +16,56 @@ ABACUS_API_URL = "https://api.abacus.ai/chatllm/v1/chat"
 # Firebase
 FIREBASE_KEY_PATH = os.getenv("FIREBASE_KEY_PATH", "serviceAccountKey.json")
 
+# Режим роботи: polling, webhook (прийом оновлень і розподіл по воркерах)
+# або worker (один воркер за фронтом webhook)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Публічна адреса для setWebhook; порожня - webhook налаштовано окремо
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Кількість локальних воркерів, які фронт запускає сам
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+WEBHOOK_WORKER_BASE_PORT = int(os.getenv("WEBHOOK_WORKER_BASE_PORT", "8081"))
+# Адреси воркерів в інших контейнерах через кому; замінюють локальних
+WEBHOOK_WORKER_URLS = [url.strip() for url in
+                       os.getenv("WEBHOOK_WORKER_URLS", "").split(",") if url.strip()]
+WEBHOOK_FORWARD_BATCH = 100  # оновлень в одному запиті до воркера
+WEBHOOK_FORWARD_MAX_PENDING = 10000  # оновлень у черзі одного воркера
+
+# Планувальник оновлень: черга FIFO на користувача і спільний ліміт
+SCHEDULER_MAX_CONCURRENCY = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "50"))
+SCHEDULER_MAX_BACKLOG = int(os.getenv("SCHEDULER_MAX_BACKLOG", "1000"))  # оновлень
+SCHEDULER_MAX_USER_BACKLOG = 20  # оновлень одного користувача
+SCHEDULER_MAX_WAIT = 30  # секунд у черзі, після яких оновлення відкидається
+# Що робити з відкинутою активністю: defer - записати без аналізу,
+# reply - лише попросити повторити пізніше
+SHED_POLICY = os.getenv("SHED_POLICY", "defer")
+
+# Ліміти Telegram для розсилок: загальний і для одного чату. Загальний - на
+# весь бот, у режимі webhook він ділиться між фронтом і воркерами
+TELEGRAM_GLOBAL_RATE = 25  # повідомлень за секунду (ліміт Telegram - 30)
+TELEGRAM_CHAT_INTERVAL = 1.0  # секунд між повідомленнями в один чат
+OUTBOX_MAX_PENDING = 100000  # повідомлень у черзі розсилки
+
+# Щоденні підсумки о settings.daily_summary_time за часовим поясом користувача
+SUMMARY_BROADCAST_ENABLED = os.getenv("SUMMARY_BROADCAST_ENABLED", "1") == "1"
+SUMMARY_REFRESH_INTERVAL = 6 * 3600  # секунд між повними перечитуваннями розкладу
+SUMMARY_CHUNK_SIZE = 300  # агрегатів в одному пакетному читанні
+
+# Нагадування кожні settings.reminder_interval хвилин без активності
+REMINDER_ENABLED = os.getenv("REMINDER_ENABLED", "1") == "1"
+REMINDER_STATE_PATH = os.getenv("REMINDER_STATE_PATH", "reminders.json")
+REMINDER_SAVE_INTERVAL = 60  # секунд між збереженнями стану
+REMINDER_ACTIVE_DAYS = 3  # днів без активності, після яких нагадування припиняються
+REMINDER_QUIET_HOURS = (22, 8)  # місцевий час без нагадувань: з 22:00 до 8:00
+
+# Сховище даних: firestore, sqlite або sqlite+firestore (локальне
+# основне сховище з фоновою реплікацією у Firestore)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "elina.sqlite3")
+
 # Налаштування за замовчуванням
 DEFAULT_TIMEZONE = "Europe/Kiev"
 DEFAULT_LANGUAGE = "uk"
@@ -23,12 +73,81 @@ DEFAULT_REMINDER_INTERVAL = 60  # хвилин
 DEFAULT_WATER_GOAL = 8  # склянок на день
 DEFAULT_SUMMARY_TIME = "23:00"
 
+# Пакетний запис активностей у Firestore
+WRITE_BATCH_SIZE = 500  # максимум операцій в одному WriteBatch (ліміт Firestore)
+WRITE_FLUSH_INTERVAL = 0.25  # секунд
+WRITE_BUFFER_MAX_PENDING = 5000  # документів у черзі до backpressure
+# Маркери записаних пакетів (для повторів після збою) зберігаються стільки днів;
+# видаляє їх TTL-політика на полі expires_at колекції write_batches з
+# firestore.indexes.json (`firebase deploy --only firestore:indexes`)
+WRITE_MARKER_TTL_DAYS = 7
+
+# Журнал дня в одному повідомленні: до стількох записів, один пакет запису
+DAY_LOG_MAX_ENTRIES = 50
+
+# Читати стару плоску колекцію activities для користувачів, яких
+# `python manage.py migrate-layout` ще не позначив перенесеними
+LEGACY_ACTIVITIES_FALLBACK = os.getenv("LEGACY_ACTIVITIES_FALLBACK", "1") == "1"
+
+# Кеш профілів користувачів
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "50000"))
+USER_CACHE_TTL = 600  # секунд
+
+# Останні дні активностей у пам'яті для /stats і /summary; ліміт записів
+# на процес (запис - близько 200 байт разом з ідентифікатором), 0 вимикає
+TIMELINE_DAYS = 8  # вікно покриває поточний тиждень
+TIMELINE_MAX_RECORDS = int(os.getenv("TIMELINE_MAX_RECORDS", "500000"))
+TIMELINE_USER_MAX_RECORDS = 2000
+
+# Метрики у форматі Prometheus на локальному порту; 0 вимикає сервер.
+# Локальні воркери webhook отримують порти METRICS_PORT + 1 + номер
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+# Ендпоінти /profile для семплюючого профайлера (вмикається запитом)
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+
+# Запуск: ліміт на ініціалізацію залежностей і JSON звіт про тривалість
+# етапів (порожній шлях - лише в лог і метрики bot_startup_*)
+STARTUP_TIMEOUT = int(os.getenv("STARTUP_TIMEOUT", "60"))  # секунд
+STARTUP_REPORT_PATH = os.getenv("STARTUP_REPORT_PATH", "")
+
+# Експорт історії: /export і `python manage.py export`. Файли більші за
+# EXPORT_MAX_FILE_SIZE діляться на частини (ліміт документа Bot API - 50 МБ)
+EXPORT_CHUNK_SIZE = 64 * 1024  # байт виводу, що накопичуються перед записом
+EXPORT_MAX_FILE_SIZE = 45 * 1024 * 1024  # байт
+EXPORT_MAX_CONCURRENCY = int(os.getenv("EXPORT_MAX_CONCURRENCY", "2"))
+EXPORT_TMP_DIR = os.getenv("EXPORT_TMP_DIR", "")  # порожній - системна тимчасова папка
+
 # Налаштування логування
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
 # Налаштування AI
 AI_MODEL = "claude-3-sonnet"
 AI_TIMEOUT = 30  # секунд
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "10"))  # одночасних запитів
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "2"))
+AI_RETRY_BASE_DELAY = 0.5  # секунд, база для експоненційної затримки
+# Мікропакети нерозпізнаних текстів: до AI_BATCH_SIZE текстів за запит;
+# 1 вимикає пакетування
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", "10"))
+AI_BATCH_WINDOW = 0.05  # секунд очікування інших текстів для пакета
+
+# Запобіжник AI: після AI_BREAKER_FAILURES невдач або відповідей, довших за
+# AI_BREAKER_SLOW_CALL, поспіль запити не надсилаються AI_BREAKER_RESET секунд
+AI_BREAKER_FAILURES = 5
+AI_BREAKER_RESET = 30  # секунд
+AI_BREAKER_SLOW_CALL = 10  # секунд
+
+# Локальна модель (`python manage.py train-classifier`): відповідає замість AI,
+# якщо впевнена не менше за поріг, і замінює AI, поки той недоступний
+LOCAL_CLASSIFIER_PATH = os.getenv("LOCAL_CLASSIFIER_PATH", "classifier.json")
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.9"))
+
+# Кеш результатів AI класифікації
+CLASSIFICATION_CACHE_SIZE = int(os.getenv("CLASSIFICATION_CACHE_SIZE", "10000"))
+CLASSIFICATION_CACHE_TTL = 7 * 24 * 3600  # секунд
+# Шлях до SQLite файлу; порожній рядок вимикає дисковий рівень
+CLASSIFICATION_CACHE_PATH = os.getenv("CLASSIFICATION_CACHE_PATH", "")
 
 
 class Config:
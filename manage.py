@@ -0,0 +1,350 @@
+"""Адміністративні команди бота
+
+Запуск:
+    python manage.py backfill-aggregates [--user USER_ID] [--page-size N]
+    python manage.py migrate-layout [--chunk-size N] [--keep-source] [--limit N]
+    python manage.py export --user USER_ID [--format ndjson|csv] [--gzip] [--output PATH]
+    python manage.py train-classifier [--output PATH] [--holdout 0.1] [--min-count N]
+                                      [--include-untagged]
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+import firebase_admin
+from firebase_admin import credentials, firestore_async
+
+from config import (FIREBASE_KEY_PATH, LOCAL_CLASSIFIER_PATH,
+                    LOCAL_CLASSIFIER_THRESHOLD, WRITE_BATCH_SIZE)
+from google.cloud.firestore import SERVER_TIMESTAMP
+
+from modules.aggregates import activity_increments, merge_increments
+from modules.firestore_repository import to_firestore_increments
+from modules.layout import (LAYOUT_MIGRATED_FIELD, LEGACY_ACTIVITIES_COLLECTION,
+                            USERS_COLLECTION, day_activities_ref, day_ref, days_ref,
+                            user_ref)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Стан довгих міграцій для продовження після перерви
+MIGRATIONS_COLLECTION = 'migrations'
+
+
+def init_firestore():
+    """Ініціалізує Firebase так само, як бот"""
+    cred = credentials.Certificate(FIREBASE_KEY_PATH)
+    firebase_admin.initialize_app(cred)
+    return firestore_async.client()
+
+
+async def iter_keys(query, page_size: int):
+    """Посторінково повертає ідентифікатори документів запиту"""
+    query = query.select(['__name__']).order_by('__name__').limit(page_size)
+    last_doc = None
+    while True:
+        page = query.start_after(last_doc) if last_doc is not None else query
+        docs = [doc async for doc in page.stream()]
+        if not docs:
+            return
+        for doc in docs:
+            yield doc.id
+        last_doc = docs[-1]
+
+
+async def single(value):
+    yield value
+
+
+async def backfill_aggregates(db, user_id: str = None, page_size: int = 500):
+    """Перебудовує денні агрегати users/{id}/days з активностей кожного дня
+
+    Агрегати перезаписуються повністю, тому запускати варто, коли бот не
+    приймає повідомлень, інакше інкременти за час роботи команди загубляться.
+    """
+    if user_id:
+        user_ids = single(user_id)
+    else:
+        user_ids = iter_keys(db.collection(USERS_COLLECTION), page_size)
+
+    batch = db.batch()
+    pending = users = days = processed = 0
+    async for doc_user_id in user_ids:
+        async for day in iter_keys(days_ref(db, doc_user_id), page_size):
+            aggregate = {}
+            # Для агрегатів потрібні лише ці поля, решту документа не передаємо
+            query = day_activities_ref(db, doc_user_id, day).select(
+                ['type', 'subtype', 'details'])
+            async for doc in query.stream():
+                merge_increments(aggregate, activity_increments(doc.to_dict()))
+                processed += 1
+
+            aggregate['date'] = day
+            batch.set(day_ref(db, doc_user_id, day), aggregate)
+            pending += 1
+            days += 1
+            if pending == WRITE_BATCH_SIZE:
+                await batch.commit()
+                batch = db.batch()
+                pending = 0
+
+        users += 1
+        if users % 100 == 0:
+            logger.info(f"Користувачів: {users}, днів: {days}, активностей: {processed}")
+
+    if pending:
+        await batch.commit()
+
+    logger.info(f"Перебудовано {days} денних агрегатів {users} користувачів "
+                f"з {processed} активностей")
+
+
+async def migrate_layout(db, chunk_size: int = 150, keep_source: bool = False,
+                         limit: int = None):
+    """Переносить плоску колекцію activities у users/{id}/days/{дата}/activities
+
+    Документи читаються посторінково за курсором. Кожна порція разом з
+    інкрементами денних агрегатів, видаленням оригіналів і позицією
+    курсора записується одним WriteBatch, тому перерваний перенос можна
+    безпечно продовжити повторним запуском. Після повного переносу всі
+    користувачі позначаються прапорцем LAYOUT_MIGRATED_FIELD, і бот
+    перестає читати для них стару колекцію.
+    """
+    # set + delete (чи позначка) на документ, інкремент дня і запис стану мають
+    # влізти в пакет
+    chunk_size = min(chunk_size, (WRITE_BATCH_SIZE - 1) // 3)
+
+    state_ref = db.collection(MIGRATIONS_COLLECTION).document('activities_layout')
+    state = (await state_ref.get()).to_dict() or {}
+    migrated = state.get('migrated', 0)
+
+    source = db.collection(LEGACY_ACTIVITIES_COLLECTION)
+    query = source.order_by('__name__').limit(chunk_size)
+    cursor = None
+    if keep_source and state.get('last_doc_id'):
+        # Без видалення оригіналів продовжуємо з останнього перенесеного
+        snapshot = await source.document(state['last_doc_id']).get()
+        if snapshot.exists:
+            cursor = snapshot
+            logger.info(f"Продовжую після документа {snapshot.id}")
+
+    started = time.monotonic()
+    moved_this_run = skipped = 0
+    while limit is None or moved_this_run < limit:
+        page = query.start_after(cursor) if cursor is not None else query
+        docs = [doc async for doc in page.stream()]
+        if not docs:
+            break
+
+        batch = db.batch()
+        daily_increments = {}
+        moved = 0
+        for doc in docs:
+            data = doc.to_dict()
+            doc_user_id, day = data.get('user_id'), data.get('date')
+            if not doc_user_id or not day:
+                skipped += 1
+                continue
+            if data.get(LAYOUT_MIGRATED_FIELD):
+                # Скопійовано попереднім запуском з --keep-source
+                continue
+
+            # Той самий ідентифікатор робить повторний запис ідемпотентним
+            batch.set(day_activities_ref(db, doc_user_id, day).document(doc.id), data)
+            merge_increments(daily_increments.setdefault((doc_user_id, day), {}),
+                             activity_increments(data))
+            if keep_source:
+                # Позначений оригінал бот уже не рахує разом з копією
+                batch.update(doc.reference, {LAYOUT_MIGRATED_FIELD: True})
+            else:
+                batch.delete(doc.reference)
+            moved += 1
+
+        for (doc_user_id, day), increments in daily_increments.items():
+            update = to_firestore_increments(increments)
+            update['date'] = day
+            batch.set(day_ref(db, doc_user_id, day), update, merge=True)
+
+        cursor = docs[-1]
+        migrated += moved
+        moved_this_run += moved
+        batch.set(state_ref, {
+            'last_doc_id': cursor.id,
+            'migrated': migrated,
+            'updated_at': SERVER_TIMESTAMP
+        }, merge=True)
+        await batch.commit()
+
+        elapsed = time.monotonic() - started
+        logger.info(f"Перенесено: {moved_this_run} за цей запуск, {migrated} всього "
+                    f"({moved_this_run / elapsed:.0f} док/с), пропущено: {skipped}")
+
+    if limit is not None and moved_this_run >= limit:
+        logger.info(f"Досягнуто ліміту: {moved_this_run} документів за цей запуск")
+        return
+
+    logger.info(f"Перенос завершено: {moved_this_run} документів за цей запуск, "
+                f"пропущено без user_id/date: {skipped}")
+    await mark_users_migrated(db)
+    await state_ref.set({'completed': True, 'updated_at': SERVER_TIMESTAMP}, merge=True)
+
+
+async def mark_users_migrated(db, page_size: int = 500):
+    """Ставить усім користувачам прапорець перенесених активностей
+
+    Після цього бот не читає для них стару плоску колекцію activities.
+    """
+    batch = db.batch()
+    pending = users = 0
+    async for user_id in iter_keys(db.collection(USERS_COLLECTION), page_size):
+        batch.set(user_ref(db, user_id), {LAYOUT_MIGRATED_FIELD: True}, merge=True)
+        pending += 1
+        users += 1
+        if pending == WRITE_BATCH_SIZE:
+            await batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        await batch.commit()
+    logger.info(f"Позначено перенесеними {users} користувачів")
+
+
+async def export_user(user_id: str, fmt: str = 'ndjson', compress: bool = False,
+                      output: str = '-'):
+    """Вивантажує історію активностей користувача у файл або stdout
+
+    Сховище обирається за STORAGE_BACKEND, як у бота; активності пишуться
+    потоково, тож пам'ять не залежить від розміру історії.
+    """
+    from modules.app import create_repository
+    from modules.exporter import EXPORT_FIELDS, FIRST_DAY, LAST_DAY, export_activities
+
+    repository = await asyncio.to_thread(create_repository)
+    sink = sys.stdout.buffer if output == '-' else open(output, 'wb')
+    try:
+        rows = await export_activities(
+            repository.iter_activities(user_id, FIRST_DAY, LAST_DAY, EXPORT_FIELDS),
+            sink, fmt, compress)
+    finally:
+        if sink is not sys.stdout.buffer:
+            sink.close()
+        await repository.close()
+    logger.info(f"Експортовано {rows} активностей користувача {user_id}")
+
+
+async def train_classifier(output: str = LOCAL_CLASSIFIER_PATH, holdout: float = 0.1,
+                           min_count: int = 2, include_untagged: bool = False):
+    """Навчає локальну модель на raw_text і type активностей усіх користувачів
+
+    Беруться лише типи від ключових слів і AI (TRAINING_SOURCES), а не
+    прогнози самої моделі. Активності без source записані до появи цього
+    поля; include_untagged додає і їх - це безпечно, лише якщо тоді
+    локальна модель ще не працювала.
+
+    Частина прикладів відкладається для перевірки: у лог ідуть точність і
+    частка текстів, для яких модель упевнена не менше за поріг. Збережена
+    модель навчена на всіх прикладах; бот підхоплює її після перезапуску.
+    """
+    from modules.app import create_repository
+    from modules.exporter import FIRST_DAY, LAST_DAY
+    from modules.local_classifier import NaiveBayesClassifier, TRAINING_SOURCES
+
+    repository = await asyncio.to_thread(create_repository)
+    samples = []
+    skipped = 0
+    try:
+        async for user_id, _ in repository.iter_users(['telegram_id']):
+            async for activity in repository.iter_activities(
+                    user_id, FIRST_DAY, LAST_DAY, ['raw_text', 'type', 'source']):
+                if not activity.get('raw_text') or not activity.get('type'):
+                    continue
+                source = activity.get('source')
+                if source in TRAINING_SOURCES or (include_untagged and not source):
+                    samples.append((activity['raw_text'], activity['type']))
+                else:
+                    skipped += 1
+    finally:
+        await repository.close()
+    logger.info(f"Прикладів для навчання: {len(samples)}, пропущено за source: {skipped}")
+
+    # Кожен n-й приклад - перевірочний, щоб розподіл за часом був однаковим
+    step = round(1 / holdout) if holdout else 0
+    if step:
+        train = [sample for index, sample in enumerate(samples) if index % step]
+        test = samples[::step]
+        model = NaiveBayesClassifier.fit(train, min_count=min_count)
+        predictions = [(model.predict(text), label) for text, label in test]
+        confident = [(prediction[0], label) for prediction, label in predictions
+                     if prediction and prediction[1] >= LOCAL_CLASSIFIER_THRESHOLD]
+        correct = sum(predicted == label for predicted, label in confident)
+        logger.info(f"Перевірка на {len(test)} прикладах: впевнених "
+                    f"{len(confident) / max(len(test), 1):.1%}, точність серед них "
+                    f"{correct / max(len(confident), 1):.1%} "
+                    f"(поріг {LOCAL_CLASSIFIER_THRESHOLD})")
+
+    model = NaiveBayesClassifier.fit(samples, min_count=min_count)
+    model.save(output)
+    logger.info(f"Модель з {len(model.labels)} типами і {len(model.feature_log_probs)} "
+                f"n-грамами збережено в {output}")
+
+
+async def run(args):
+    if args.command == 'export':
+        await export_user(args.user, args.format, args.gzip, args.output)
+        return
+    if args.command == 'train-classifier':
+        await train_classifier(args.output, args.holdout, args.min_count,
+                               args.include_untagged)
+        return
+
+    # Клієнт створюється всередині event loop, у якому він працюватиме
+    db = init_firestore()
+
+    if args.command == 'backfill-aggregates':
+        await backfill_aggregates(db, args.user, args.page_size)
+    elif args.command == 'migrate-layout':
+        await migrate_layout(db, args.chunk_size, args.keep_source, args.limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Адміністративні команди бота")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backfill = commands.add_parser('backfill-aggregates',
+                                   help="перебудувати денні агрегати users/{id}/days")
+    backfill.add_argument('--user', help="лише для одного користувача")
+    backfill.add_argument('--page-size', type=int, default=500)
+
+    migrate = commands.add_parser('migrate-layout',
+                                  help="перенести плоску activities у users/{id}/days")
+    migrate.add_argument('--chunk-size', type=int, default=150)
+    migrate.add_argument('--keep-source', action='store_true',
+                         help="не видаляти оригінальні документи, лише позначити "
+                              "перенесеними")
+    migrate.add_argument('--limit', type=int, help="максимум документів за запуск")
+
+    export = commands.add_parser('export', help="вивантажити історію користувача")
+    export.add_argument('--user', required=True)
+    export.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    export.add_argument('--gzip', action='store_true', help="стиснути вивід")
+    export.add_argument('--output', default='-', help="шлях до файлу, - для stdout")
+
+    train = commands.add_parser('train-classifier',
+                                help="навчити локальну модель класифікації")
+    train.add_argument('--output', default=LOCAL_CLASSIFIER_PATH)
+    train.add_argument('--holdout', type=float, default=0.1,
+                       help="частка прикладів для перевірки, 0 - без перевірки")
+    train.add_argument('--min-count', type=int, default=2,
+                       help="мінімальна частота n-грами")
+    train.add_argument('--include-untagged', action='store_true',
+                       help="вчити і на активностях без source (записаних до "
+                            "появи поля), якщо локальна модель тоді не працювала")
+
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,40 @@
-import re
+import asyncio
 import json
-import requests
-from config import Config
 import logging
+import time
+from typing import List, Optional
+
+from config import (AI_BATCH_SIZE, AI_BATCH_WINDOW, AI_BREAKER_FAILURES,
+                    AI_BREAKER_RESET, AI_BREAKER_SLOW_CALL, LOCAL_CLASSIFIER_THRESHOLD)
+from modules.ai_client import AIClient
+from modules.batcher import MicroBatcher
+from modules.circuit_breaker import CircuitBreaker
+from modules.classification_cache import ClassificationCache
+from modules.day_log import TIME_RE
+from modules.keyword_matcher import KeywordHits, KeywordMatcher
+from modules.local_classifier import NaiveBayesClassifier
+from modules.metrics import AI_ANALYZE_SECONDS, CLASSIFICATIONS
+from modules.stemmer import normalize
 
 logger = logging.getLogger(__name__)
 
 class ActivityTracker:
-    def __init__(self):
+    def __init__(self, ai_client: AIClient = None,
+                 cache: ClassificationCache = None,
+                 batch_size: int = AI_BATCH_SIZE,
+                 batch_window: float = AI_BATCH_WINDOW,
+                 classifier: Optional[NaiveBayesClassifier] = None,
+                 local_threshold: float = LOCAL_CLASSIFIER_THRESHOLD):
+        self.ai_client = ai_client or AIClient()
+        self.cache = cache
+        # Локальна модель відповідає без AI, коли впевнена в типі
+        self.classifier = classifier
+        self.local_threshold = local_threshold
+        self.breaker = CircuitBreaker(AI_BREAKER_FAILURES, AI_BREAKER_RESET,
+                                      AI_BREAKER_SLOW_CALL)
+        # Нерозпізнані тексти з короткого вікна йдуть до AI одним запитом
+        self.batcher = (MicroBatcher(self._request_ai_batch, batch_size, batch_window)
+                        if batch_size > 1 else None)
         self.activity_types = {
             'meal': ['їм', 'обід', 'сніданок', 'вечеря', 'перекус', 'готую', 'роблю обід'],
             'work': ['робота', 'працюю', 'зустріч', 'мітинг', 'проект', 'завдання'],
@@ -18,46 +45,129 @@ class ActivityTracker:
             'drink': ['п\'ю', 'випив', 'кава', 'чай', 'вода'],
             'sleep': ['спати', 'лягаю спати', 'йду спати', 'сон', 'відпочивати', 'засинаю']  # ДОДАНО
         }
+        self.common_foods = ['курка', 'макарон', 'рис', 'картопля', 'м\'ясо', 'риба', 'овочі']
+        self.meal_types = {
+            'breakfast': ['сніданок', 'ранок'],
+            'lunch': ['обід', 'ланч'],
+            'dinner': ['вечеря', 'вечір']
+        }
+        self.exercise_types = {
+            'присідання': 'squats',
+            'віджимання': 'push-ups',
+            'біг': 'running',
+            'планка': 'plank'
+        }
+        self.drink_types = {
+            'вода': 'water',
+            'кава': 'coffee',
+            'чай': 'tea'
+        }
+
+        self._type_priority = {activity_type: priority for priority, activity_type
+                               in enumerate(self.activity_types)}
+
+        # Усі словники компілюються один раз і перевіряються за один прохід;
+        # відмінкові форми і форми дієслів зводяться до основ
+        self.matcher = KeywordMatcher({
+            'activity': {keyword: activity_type
+                         for activity_type, keywords in self.activity_types.items()
+                         for keyword in keywords},
+            'food': {food: food for food in self.common_foods},
+            'meal': {keyword: meal_type
+                     for meal_type, keywords in self.meal_types.items()
+                     for keyword in keywords},
+            'exercise': self.exercise_types,
+            'drink': self.drink_types
+        }, normalize=normalize)
 
     async def detect_activity_type(self, text: str) -> dict:
-        """Визначає тип активності з тексту"""
-        text_lower = text.lower()
-
-        # Простий парсинг за ключовими словами
-        for activity_type, keywords in self.activity_types.items():
-            for keyword in keywords:
-                if keyword in text_lower:
-                    details = await self._extract_details(text, activity_type)
-                    return {
-                        'type': activity_type,
-                        'subtype': details.get('subtype', ''),
-                        'details': details,
-                        'auto_detected': True
-                    }
+        """Визначає тип активності з тексту
+
+        source у результаті - звідки тип: keyword, local, cache, ai,
+        local_fallback або fallback. Локальна модель навчається лише на
+        keyword, cache і ai (local_classifier.TRAINING_SOURCES).
+        """
+        result = self.detect_by_keywords(text)
+        if result is not None:
+            CLASSIFICATIONS.inc(source='keyword')
+            return {**result, 'source': 'keyword'}
+
+        started = time.perf_counter()
+        result = self.detect_locally(text, self.local_threshold)
+        if result is not None:
+            self._observe_analyze('local', started)
+            return {**result, 'source': 'local'}
 
         # Якщо не вдалося визначити - використовуємо AI
         ai_result = await self._analyze_with_ai(text)
         return ai_result
 
-    async def _extract_details(self, text: str, activity_type: str) -> dict:
+    def detect_by_keywords(self, text: str):
+        """Швидкий шлях: тип за ключовими словами або None"""
+        text_lower = self._strip_time(text.lower())
+        hits = self.matcher.scan(text_lower)
+
+        found_types = hits.get('activity')
+        if not found_types:
+            return None
+
+        # Пріоритет типів - порядок словника activity_types
+        if len(found_types) == 1:
+            (activity_type,) = found_types
+        else:
+            activity_type = min(found_types, key=self._type_priority.__getitem__)
+        details = self._extract_details(text, text_lower, activity_type, hits)
+        return {
+            'type': activity_type,
+            'subtype': details.get('subtype', ''),
+            'details': details,
+            'auto_detected': True
+        }
+
+    def detect_locally(self, text: str, threshold: float):
+        """Тип за локальною моделлю, якщо її впевненість не нижча за поріг"""
+        if self.classifier is None:
+            return None
+        prediction = self.classifier.predict(text)
+        if prediction is None or prediction[1] < threshold:
+            return None
+
+        activity_type = prediction[0]
+        text_lower = self._strip_time(text.lower())
+        details = self._extract_details(text, text_lower, activity_type,
+                                        self.matcher.scan(text_lower))
+        return {
+            'type': activity_type,
+            'subtype': details.get('subtype', ''),
+            'details': details,
+            'auto_detected': True
+        }
+
+    @staticmethod
+    def _strip_time(text_lower: str) -> str:
+        """Без HH:MM на початку, щоб години не стали кількістю повторень"""
+        match = TIME_RE.match(text_lower)
+        return text_lower[match.end():] if match else text_lower
+
+    def _extract_details(self, text: str, text_lower: str, activity_type: str,
+                         hits: KeywordHits) -> dict:
         """Витягує деталі залежно від типу активності"""
         details = {'description': text}
 
         if activity_type == 'meal':
-            food_items = await self._extract_food_items(text)
-            details['food_items'] = food_items
-            details['subtype'] = self._detect_meal_type(text)
+            details['food_items'] = self._extract_food_items(hits)
+            details['subtype'] = self._detect_meal_type(hits)
 
         elif activity_type == 'exercise':
-            exercise_info = await self._extract_exercise_info(text)
+            exercise_info = self._extract_exercise_info(hits)
             details.update(exercise_info)
 
         elif activity_type == 'meeting':
-            people = self._extract_people(text)
+            people = self._extract_people(text_lower)
             details['people'] = people
 
         elif activity_type == 'drink':
-            drink_info = self._extract_drink_info(text)
+            drink_info = self._extract_drink_info(hits)
             details.update(drink_info)
 
         elif activity_type == 'sleep':  # ДОДАНО
@@ -66,44 +176,27 @@ class ActivityTracker:
 
         return details
 
-    async def _extract_food_items(self, text: str) -> list:
+    def _extract_food_items(self, hits: KeywordHits) -> list:
         """Витягує продукти з тексту"""
-        common_foods = ['курка', 'макарон', 'рис', 'картопля', 'м\'ясо', 'риба', 'овочі']
-        found_foods = []
-
-        for food in common_foods:
-            if food in text.lower():
-                found_foods.append(food)
-
-        return found_foods
+        found = hits.get('food')
+        return [food for food in self.common_foods if food in found]
 
-    def _detect_meal_type(self, text: str) -> str:
+    def _detect_meal_type(self, hits: KeywordHits) -> str:
         """Визначає тип прийому їжі"""
-        text_lower = text.lower()
-        if any(word in text_lower for word in ['сніданок', 'ранок']):
-            return 'breakfast'
-        elif any(word in text_lower for word in ['обід', 'ланч']):
-            return 'lunch'
-        elif any(word in text_lower for word in ['вечеря', 'вечір']):
-            return 'dinner'
-        else:
-            return 'snack'
+        found = hits.get('meal')
+        for meal_type in self.meal_types:
+            if meal_type in found:
+                return meal_type
+        return 'snack'
 
-    async def _extract_exercise_info(self, text: str) -> dict:
+    def _extract_exercise_info(self, hits: KeywordHits) -> dict:
         """Витягує інформацію про вправи"""
-        numbers = re.findall(r'\d+', text)
-        repetitions = int(numbers[0]) if numbers else 0
-
-        exercise_types = {
-            'присідання': 'squats',
-            'віджимання': 'push-ups',
-            'біг': 'running',
-            'планка': 'plank'
-        }
+        repetitions = hits.numbers[0] if hits.numbers else 0
 
+        found = hits.get('exercise')
         exercise_type = 'general'
-        for ukr_name, eng_name in exercise_types.items():
-            if ukr_name in text.lower():
+        for eng_name in self.exercise_types.values():
+            if eng_name in found:
                 exercise_type = eng_name
                 break
 
@@ -112,33 +205,27 @@ class ActivityTracker:
             'repetitions': repetitions
         }
 
-    def _extract_people(self, text: str) -> list:
+    def _extract_people(self, text_lower: str) -> list:
         """Витягує імена людей з тексту"""
         people = []
-        if ' з ' in text.lower():
-            parts = text.lower().split(' з ')
-            if len(parts) > 1:
+        if ' з ' in text_lower:
+            parts = text_lower.split(' з ')
+            if len(parts) > 1 and parts[1].split():
                 person = parts[1].split()[0]
                 people.append(person)
 
         return people
 
-    def _extract_drink_info(self, text: str) -> dict:
+    def _extract_drink_info(self, hits: KeywordHits) -> dict:
         """Витягує інформацію про напої"""
-        drink_types = {
-            'вода': 'water',
-            'кава': 'coffee',
-            'чай': 'tea'
-        }
-
+        found = hits.get('drink')
         drink_type = 'water'
-        for ukr_name, eng_name in drink_types.items():
-            if ukr_name in text.lower():
+        for eng_name in self.drink_types.values():
+            if eng_name in found:
                 drink_type = eng_name
                 break
 
-        numbers = re.findall(r'\d+', text)
-        amount = int(numbers[0]) if numbers else 1
+        amount = hits.numbers[0] if hits.numbers else 1
 
         return {
             'drink_type': drink_type,
@@ -146,6 +233,64 @@ class ActivityTracker:
         }
 
     async def _analyze_with_ai(self, text: str) -> dict:
+        """Класифікує текст через AI, спершу перевіряючи кеш"""
+        started = time.perf_counter()
+        if self.cache is not None:
+            cached = self.cache.get(text)
+            if cached is not None:
+                self._observe_analyze('cache', started)
+                return {**cached, 'source': 'cache'}
+
+        result = None
+        # Поки AI недоступний або надто повільний, запити до нього не йдуть
+        if self.breaker.allow():
+            try:
+                if self.batcher is not None:
+                    result = await self.batcher.submit(text)
+                else:
+                    result = await self._request_ai(text)
+            except Exception as e:
+                logger.error(f"Помилка класифікації через AI: {e!r}")
+
+        if result is None:
+            # Без AI краще невпевнений прогноз моделі, ніж тип other
+            local_result = self.detect_locally(text, 0.0)
+            if local_result is not None:
+                self._observe_analyze('local_fallback', started)
+                return {**local_result, 'source': 'local_fallback'}
+            self._observe_analyze('fallback', started)
+            # Fallback
+            return {
+                'type': 'other',
+                'subtype': '',
+                'details': {'description': text},
+                'auto_detected': False,
+                'source': 'fallback'
+            }
+
+        self._observe_analyze('ai', started)
+        result['source'] = 'ai'
+        if self.cache is not None:
+            self.cache.set(text, result)
+        return result
+
+    @staticmethod
+    def _observe_analyze(source: str, started: float):
+        CLASSIFICATIONS.inc(source=source)
+        AI_ANALYZE_SECONDS.observe(time.perf_counter() - started, source=source)
+
+    async def _chat(self, prompt: str) -> Optional[str]:
+        """Один запит до AI; його результат записується в запобіжник"""
+        started = time.monotonic()
+        content = None
+        try:
+            content = await self.ai_client.chat(prompt)
+            return content
+        finally:
+            # Помилка чи скасування запиту - теж невдача
+            self.breaker.record(content is not None, started)
+
+    async def _request_ai(self, text: str):
         """Використовує Abacus ChatLLM API для аналізу складних активностей"""
         try:
             prompt = f"""
@@ -165,35 +310,111 @@ class ActivityTracker:
             }}
             """
 
-            response = requests.post(
-                Config.ABACUS_API_URL,
-                headers={
-                    'Authorization': f'Bearer {Config.ABACUS_API_KEY}',
-                    'Content-Type': 'application/json'
-                },
-                json={
-                    'messages': [{'role': 'user', 'content': prompt}],
-                    'model': 'claude-3-sonnet'
-                }
-            )
-
-            if response.status_code == 200:
-                ai_response = response.json()
-                content = ai_response['choices'][0]['message']['content']
+            content = await self._chat(prompt)
 
+            if content is not None:
                 try:
-                    result = json.loads(content)
-                    return result
+                    result = self._validate_ai_result(json.loads(content), text)
+                    if result is not None:
+                        return result
+                    logger.error(f"AI відповідь без типу активності: {content}")
                 except json.JSONDecodeError:
                     logger.error(f"Не вдалося парсити AI відповідь: {content}")
 
         except Exception as e:
             logger.error(f"Помилка при виклику AI API: {e}")
 
-        # Fallback
-        return {
-            'type': 'other',
-            'subtype': '',
-            'details': {'description': text},
-            'auto_detected': False
-        }
\ No newline at end of file
+        return None
+
+    async def _request_ai_batch(self, texts: List[str]) -> List[Optional[dict]]:
+        """Класифікує кілька текстів одним запитом до AI
+
+        Елементи, для яких відповідь неповна або зіпсована, запитуються
+        повторно поодинці. Якщо AI недоступний, повторів немає.
+        """
+        if len(texts) == 1:
+            return [await self._request_ai(texts[0])]
+
+        numbered = '\n'.join(f'{index}. {json.dumps(text, ensure_ascii=False)}'
+                             for index, text in enumerate(texts, 1))
+        prompt = f"""
+            Проаналізуй кожну з активностей користувача і визнач:
+            1. Тип активності (meal, work, rest, meeting, cleaning, exercise, drink, sleep, other)
+            2. Підтип (якщо є)
+            3. Деталі активності
+
+            Тексти:
+{numbered}
+
+            Відповідь дай у форматі JSON масиву, по одному об'єкту на кожен текст:
+            [
+            {{"index": номер_тексту, "type": "тип_активності", "subtype": "підтип",
+              "details": {{"description": "опис", "додаткові_поля": "значення"}}}}
+            ]
+            """
+
+        try:
+            content = await self._chat(prompt)
+        except Exception as e:
+            logger.error(f"Помилка при виклику AI API: {e}")
+            content = None
+        if content is None:
+            return [None] * len(texts)
+
+        results = self._parse_ai_batch(content, texts)
+        failed = [index for index, result in enumerate(results) if result is None]
+        # Поки запобіжник не закритий, окремі повтори - зайві запити до AI
+        if failed and self.breaker.state == 'closed':
+            logger.warning(f"AI не класифікував {len(failed)} з {len(texts)} текстів "
+                           f"пакета, повторюю поодинці")
+            retried = await asyncio.gather(*(self._request_ai(texts[index])
+                                             for index in failed))
+            for index, result in zip(failed, retried):
+                results[index] = result
+        return results
+
+    def _parse_ai_batch(self, content: str, texts: List[str]) -> List[Optional[dict]]:
+        """Розкладає JSON масив відповіді по текстах; None для неповних елементів"""
+        results = [None] * len(texts)
+        try:
+            items = json.loads(content)
+        except json.JSONDecodeError:
+            # Модель могла обгорнути масив у пояснення або markdown
+            start, end = content.find('['), content.rfind(']')
+            try:
+                items = json.loads(content[start:end + 1]) if 0 <= start < end else None
+            except json.JSONDecodeError:
+                items = None
+        if not isinstance(items, list):
+            logger.error(f"Не вдалося парсити пакетну AI відповідь: {content}")
+            return results
+
+        positional = len(items) == len(texts)
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            index = item.pop('index', None)
+            if isinstance(index, int) and 1 <= index <= len(texts):
+                slot = index - 1
+            elif positional:
+                slot = position
+            else:
+                continue
+            if results[slot] is None:
+                results[slot] = self._validate_ai_result(item, texts[slot])
+        return results
+
+    @staticmethod
+    def _validate_ai_result(result, text: str) -> Optional[dict]:
+        """Доповнює відповідь AI або повертає None, якщо в ній немає типу"""
+        if not isinstance(result, dict) or not result.get('type'):
+            return None
+        result.setdefault('subtype', '')
+        result.setdefault('details', {'description': text})
+        result['auto_detected'] = False
+        return result
+
+    async def close(self):
+        """Дочікується відповідей на зібрані пакети"""
+        if self.batcher is not None:
+            await self.batcher.close()
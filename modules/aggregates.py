@@ -0,0 +1,76 @@
+import re
+from datetime import date, timedelta
+from typing import Dict, Iterable, List
+
+from modules.repository import Repository
+
+# Символи, які не можна безпечно використовувати в назвах полів Firestore
+FIELD_KEY_RE = re.compile(r'[.`\[\]*~/]')
+
+
+def field_key(value) -> str:
+    """Перетворює тип/підтип на безпечний ключ поля"""
+    key = FIELD_KEY_RE.sub('_', str(value or '').strip())[:64]
+    return key or 'other'
+
+
+def activity_increments(activity_doc: Dict) -> Dict:
+    """Дельти денного агрегату для однієї активності"""
+    act_type = field_key(activity_doc.get('type'))
+    details = activity_doc.get('details') or {}
+    increments = {
+        'total': 1,
+        'types': {act_type: 1}
+    }
+
+    subtype = activity_doc.get('subtype')
+    if subtype:
+        increments['subtypes'] = {act_type: {field_key(subtype): 1}}
+
+    if act_type == 'drink':
+        amount = details.get('amount')
+        if isinstance(amount, (int, float)):
+            increments['drinks'] = {field_key(details.get('drink_type', 'water')): amount}
+
+    elif act_type == 'exercise':
+        repetitions = details.get('repetitions')
+        if isinstance(repetitions, (int, float)) and repetitions:
+            increments['exercise_reps'] = {
+                field_key(details.get('exercise_type', 'general')): repetitions}
+
+    return increments
+
+
+def merge_increments(target: Dict, increments: Dict) -> Dict:
+    """Додає дельти до накопиченого агрегату (на місці)"""
+    for key, value in increments.items():
+        if isinstance(value, dict):
+            merge_increments(target.setdefault(key, {}), value)
+        else:
+            target[key] = target.get(key, 0) + value
+    return target
+
+
+def period_days(start_date: date, end_date: date) -> List[str]:
+    """Усі дати періоду у форматі YYYY-MM-DD"""
+    return [(start_date + timedelta(days=offset)).strftime('%Y-%m-%d')
+            for offset in range((end_date - start_date).days + 1)]
+
+
+async def load_period_stats(repository: Repository, user_id: str,
+                            start_date: date, end_date: date):
+    """Кількість активностей за типами за період: (stats, total)"""
+    days = period_days(start_date, end_date)
+    daily = await repository.get_daily_aggregates(user_id, days)
+    return stats_from_aggregates(daily[day] for day in days if day in daily)
+
+
+def stats_from_aggregates(aggregates: Iterable[Dict]):
+    """Сумує денні агрегати: (кількість за типами, загальна кількість)"""
+    stats = {}
+    total = 0
+    for aggregate in aggregates:
+        for act_type, count in aggregate.get('types', {}).items():
+            stats[act_type] = stats.get(act_type, 0) + count
+        total += aggregate.get('total', 0)
+    return stats, total
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import random
+from typing import Optional
+
+import aiohttp
+from yarl import URL
+
+from config import (ABACUS_API_KEY, ABACUS_API_URL, AI_MODEL, AI_TIMEOUT,
+                    AI_MAX_CONCURRENCY, AI_MAX_RETRIES, AI_RETRY_BASE_DELAY)
+
+logger = logging.getLogger(__name__)
+
+# Статуси, після яких є сенс повторити запит
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AIClient:
+    """Асинхронний клієнт Abacus ChatLLM зі спільним пулом з'єднань"""
+
+    def __init__(self, api_url: str = ABACUS_API_URL,
+                 api_key: str = ABACUS_API_KEY, model: str = AI_MODEL,
+                 timeout: float = AI_TIMEOUT,
+                 max_concurrency: int = AI_MAX_CONCURRENCY,
+                 max_retries: int = AI_MAX_RETRIES,
+                 retry_base_delay: float = AI_RETRY_BASE_DELAY):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Створює сесію ліниво, вже всередині запущеного event loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={
+                    'Authorization': f'Bearer {self.api_key}',
+                    'Content-Type': 'application/json'
+                })
+        return self._session
+
+    def _backoff(self, attempt: int) -> float:
+        """Експоненційна затримка з повним jitter"""
+        return random.uniform(0, self.retry_base_delay * (2 ** attempt))
+
+    async def chat(self, prompt: str) -> Optional[str]:
+        """Надсилає prompt і повертає текст відповіді або None"""
+        payload = {
+            'messages': [{'role': 'user', 'content': prompt}],
+            'model': self.model
+        }
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    session = self._get_session()
+                    async with session.post(self.api_url,
+                                            json=payload) as response:
+                        if response.status == 200:
+                            ai_response = await response.json(content_type=None)
+                            return ai_response['choices'][0]['message']['content']
+
+                        if response.status not in RETRYABLE_STATUSES:
+                            logger.error(
+                                f"AI API повернув статус {response.status}")
+                            return None
+
+                        logger.warning(
+                            f"AI API повернув статус {response.status}, "
+                            f"спроба {attempt + 1}")
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Помилка з'єднання з AI API "
+                               f"(спроба {attempt + 1}): {e!r}")
+            except (KeyError, IndexError, TypeError, ValueError) as e:
+                logger.error(f"Неочікуваний формат відповіді AI API: {e!r}")
+                return None
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt))
+
+        logger.error("AI API недоступний після всіх спроб")
+        return None
+
+    async def warm_up(self, timeout: float = 5.0):
+        """Відкриває з'єднання з API заздалегідь, щоб перший запит не чекав
+        на DNS і TLS; помилка прогріву не заважає запуску"""
+        origin = str(URL(self.api_url).origin())
+        try:
+            async with self._get_session().head(
+                    origin, timeout=aiohttp.ClientTimeout(total=timeout)):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Не вдалося прогріти з'єднання з AI API: {e!r}")
+
+    async def close(self):
+        """Закриває пул з'єднань"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,320 @@
+"""Аналітика активностей за довільний період на масивах NumPy
+
+Активності користувача за період читаються один раз і складаються у
+стовпці (день, година, тип, повторення, вода). Усі зрізи - кількість за
+типами по днях, теплова карта годин, повторення вправ, вода відносно
+water_goal і серії днів - рахуються векторно через bincount і матричні операції, без
+циклів по документах, тож рік історії агрегується за мілісекунди.
+"""
+import functools
+import html
+from datetime import date, datetime, timedelta
+from typing import AsyncIterable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pytz
+
+from config import DEFAULT_TIMEZONE, DEFAULT_WATER_GOAL
+from modules.repository import Repository
+
+# Коди типів активностей; невідомі типи отримують коди після них
+ACTIVITY_TYPES = ('meal', 'work', 'exercise', 'rest', 'cleaning', 'meeting',
+                  'drink', 'sleep', 'other')
+ACTIVITY_FIELDS = ['date', 'timestamp', 'type', 'details']
+MAX_PERIOD_DAYS = 366
+WEEKDAYS = ('Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Нд')
+EPOCH = date(1970, 1, 1)
+OFFSET_BUCKET = 900  # секунд, крок обчислення зсуву часового поясу
+
+
+class ActivityColumns:
+    """Активності одного користувача у стовпцях NumPy
+
+    day - номер дня від 1970-01-01, second - секунди від епохи (UTC) або
+    NaN, type_code - індекс у types, reps - повторення вправ, water -
+    склянки води.
+    """
+
+    __slots__ = ('day', 'second', 'type_code', 'exercise_code', 'reps', 'water',
+                 'types', 'exercises')
+
+    def __init__(self, day: np.ndarray, second: np.ndarray, type_code: np.ndarray,
+                 exercise_code: np.ndarray, reps: np.ndarray, water: np.ndarray,
+                 types: List[str], exercises: List[str]):
+        self.day = day
+        self.second = second
+        self.type_code = type_code
+        self.exercise_code = exercise_code
+        self.reps = reps
+        self.water = water
+        self.types = types
+        self.exercises = exercises
+
+    def __len__(self):
+        return len(self.day)
+
+    @classmethod
+    def from_activities(cls, activities: Iterable[Dict]) -> 'ActivityColumns':
+        """Один прохід по документах: лише розбір полів у списки"""
+        types = {name: code for code, name in enumerate(ACTIVITY_TYPES)}
+        exercises: Dict[str, int] = {}
+        day, second, type_code, exercise_code, reps, water = [], [], [], [], [], []
+        nan = float('nan')
+
+        for activity in activities:
+            try:
+                day.append((date.fromisoformat(activity['date']) - EPOCH).days)
+            except (KeyError, TypeError, ValueError):
+                continue
+            timestamp = activity.get('timestamp')
+            if isinstance(timestamp, datetime):
+                # Бот пише мітки часу в UTC з поясом; наївні - зі старих
+                # документів, їх вважаємо UTC
+                if timestamp.tzinfo is None:
+                    timestamp = timestamp.replace(tzinfo=pytz.utc)
+                second.append(timestamp.timestamp())
+            else:
+                second.append(nan)
+
+            act_type = activity.get('type') or 'other'
+            type_code.append(types.setdefault(act_type, len(types)))
+            details = activity.get('details') or {}
+            repetitions = details.get('repetitions') if act_type == 'exercise' else None
+            if isinstance(repetitions, (int, float)) and repetitions > 0:
+                exercise = details.get('exercise_type') or 'general'
+                exercise_code.append(exercises.setdefault(exercise, len(exercises)))
+                reps.append(repetitions)
+            else:
+                exercise_code.append(-1)
+                reps.append(0)
+            amount = details.get('amount') if act_type == 'drink' else None
+            if (isinstance(amount, (int, float))
+                    and details.get('drink_type', 'water') == 'water'):
+                water.append(amount)
+            else:
+                water.append(0)
+
+        return cls(np.array(day, dtype=np.int32), np.array(second, dtype=np.float64),
+                   np.array(type_code, dtype=np.int16),
+                   np.array(exercise_code, dtype=np.int16),
+                   np.array(reps, dtype=np.float32), np.array(water, dtype=np.float32),
+                   sorted(types, key=types.get), sorted(exercises, key=exercises.get))
+
+    @classmethod
+    async def load(cls, repository: Repository, user_id: str,
+                   start_date: date, end_date: date) -> 'ActivityColumns':
+        return cls.from_activities(await _collect(repository.iter_activities(
+            user_id, start_date.isoformat(), end_date.isoformat(), ACTIVITY_FIELDS)))
+
+
+async def _collect(activities: AsyncIterable[Dict]) -> List[Dict]:
+    return [activity async for activity in activities]
+
+
+def _runs(mask: np.ndarray) -> Tuple[int, int]:
+    """Серії True: (найдовша, поточна)
+
+    Поточна серія закінчується останнім або передостаннім днем: сьогоднішній
+    день ще не завершено, тож серія не переривається до його кінця.
+    """
+    if not mask.size:
+        return 0, 0
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if not starts.size:
+        return 0, 0
+    longest = int((ends - starts).max())
+    current = int(ends[-1] - starts[-1]) if ends[-1] >= mask.size - 1 else 0
+    return longest, current
+
+
+def _weekly_slopes(counts: np.ndarray) -> np.ndarray:
+    """Нахил лінійного тренду кожного рядка counts (тип x день) за тиждень"""
+    days = counts.shape[1]
+    if days < 2:
+        return np.zeros(counts.shape[0])
+    x = np.arange(days, dtype=np.float64)
+    x -= x.mean()
+    centered = counts - counts.mean(axis=1, keepdims=True)
+    return centered @ x / (x @ x) * 7
+
+
+@functools.lru_cache(maxsize=65536)
+def _bucket_offset(timezone: str, bucket: float) -> float:
+    moment = datetime.fromtimestamp(bucket * OFFSET_BUCKET, pytz.utc)
+    return moment.astimezone(pytz.timezone(timezone)).utcoffset().total_seconds()
+
+
+def _utc_offsets(seconds: np.ndarray, timezone: str) -> np.ndarray:
+    """Зсув від UTC для кожної мітки часу, з переходами на літній час
+
+    Переходи відбуваються на межах чверті години, тож пояс запитується
+    один раз на кожні 15 хвилин, у які потрапили активності.
+    """
+    buckets, inverse = np.unique(np.floor_divide(seconds, OFFSET_BUCKET),
+                                 return_inverse=True)
+    offsets = np.array([_bucket_offset(timezone, float(bucket)) for bucket in buckets],
+                       dtype=np.float64)
+    return offsets[inverse]
+
+
+def analyze(columns: ActivityColumns, start_date: date, end_date: date,
+            water_goal: float = DEFAULT_WATER_GOAL,
+            timezone: str = DEFAULT_TIMEZONE) -> Dict:
+    """Звіт за період [start_date, end_date] з уже завантажених стовпців"""
+    first = (start_date - EPOCH).days
+    days = (end_date - start_date).days + 1
+    in_range = (columns.day >= first) & (columns.day < first + days)
+    day = columns.day[in_range] - first
+    type_code = columns.type_code[in_range].astype(np.int64)
+    type_count = len(columns.types)
+
+    # Кількість за типами по днях: одна матриця тип x день
+    per_type_day = np.bincount(type_code * days + day,
+                               minlength=type_count * days).reshape(type_count, days)
+    type_totals = per_type_day.sum(axis=1)
+    slopes = _weekly_slopes(per_type_day.astype(np.float64))
+    present = np.flatnonzero(type_totals)
+    order = present[np.argsort(-type_totals[present], kind='stable')]
+    types = {columns.types[code]: {'count': int(type_totals[code]),
+                                   'per_week': float(type_totals[code] / days * 7),
+                                   'trend_per_week': float(slopes[code])}
+             for code in order}
+
+    # Теплова карта день тижня x година за місцевим часом
+    if timezone not in pytz.all_timezones_set:
+        timezone = DEFAULT_TIMEZONE
+    seconds = columns.second[in_range]
+    seconds = seconds[~np.isnan(seconds)]
+    local = seconds + _utc_offsets(seconds, timezone)
+    local_days = np.floor_divide(local, 86400).astype(np.int64)
+    hours = (np.floor_divide(local, 3600) % 24).astype(np.int64)
+    # 1970-01-01 - четвер, тож понеділок має номер 0 після зсуву на 3
+    weekdays = (local_days + 3) % 7
+    heatmap = np.bincount(weekdays * 24 + hours, minlength=7 * 24).reshape(7, 24)
+
+    # Повторення вправ за типом вправи
+    exercise_code = columns.exercise_code[in_range].astype(np.int64)
+    with_reps = exercise_code >= 0
+    reps = np.bincount(exercise_code[with_reps],
+                       weights=columns.reps[in_range][with_reps],
+                       minlength=len(columns.exercises))
+
+    # Вода по днях відносно мети
+    water = np.bincount(day, weights=columns.water[in_range], minlength=days)
+    goal_met = water >= water_goal if water_goal > 0 else np.zeros(days, dtype=bool)
+
+    active = np.bincount(day, minlength=days) > 0
+    longest, current = _runs(active)
+    water_longest, water_current = _runs(goal_met)
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'days': days,
+        'total': int(type_totals.sum()),
+        'active_days': int(active.sum()),
+        'types': types,
+        'heatmap': heatmap,
+        'busiest_hour': int(heatmap.sum(axis=0).argmax()) if heatmap.any() else None,
+        'exercise_reps': {columns.exercises[code]: int(reps[code])
+                          for code in np.flatnonzero(reps)},
+        'water': {
+            'goal': water_goal,
+            'total': float(water.sum()),
+            'average': float(water.mean()),
+            'days_goal_met': int(goal_met.sum()),
+            'goal_streak_longest': water_longest,
+            'goal_streak_current': water_current,
+        },
+        'streak_longest': longest,
+        'streak_current': current,
+    }
+
+
+def parse_period(args: str, today: date) -> Tuple[date, date]:
+    """Період з аргументів команди: week, month, число днів або дві дати
+
+    Без аргументів - останні 30 днів. ValueError для некоректного періоду.
+    """
+    parts = args.split()
+    if not parts or parts == ['month']:
+        return today - timedelta(days=29), today
+    if parts == ['week']:
+        return today - timedelta(days=6), today
+    if len(parts) == 1 and parts[0].isdigit():
+        days = int(parts[0])
+        if not 1 <= days <= MAX_PERIOD_DAYS:
+            raise ValueError(f"Кількість днів має бути від 1 до {MAX_PERIOD_DAYS}")
+        return today - timedelta(days=days - 1), today
+    if len(parts) == 2:
+        start, end = (date.fromisoformat(part) for part in parts)
+        if start > end:
+            start, end = end, start
+        if (end - start).days >= MAX_PERIOD_DAYS:
+            raise ValueError(f"Період не може бути довшим за {MAX_PERIOD_DAYS} днів")
+        return start, end
+    raise ValueError("Невідомий період")
+
+
+class AnalyticsManager:
+    def __init__(self, repository: Repository):
+        self.repository = repository
+
+    async def get_report(self, user_id: str, start_date: date, end_date: date,
+                         settings: Optional[Dict] = None) -> Dict:
+        """Звіт за період з налаштуваннями користувача (water_goal, timezone)"""
+        settings = settings or {}
+        columns = await ActivityColumns.load(self.repository, user_id,
+                                             start_date, end_date)
+        water_goal = settings.get('water_goal')
+        return analyze(columns, start_date, end_date,
+                       water_goal if isinstance(water_goal, (int, float))
+                       else DEFAULT_WATER_GOAL,
+                       settings.get('timezone') or DEFAULT_TIMEZONE)
+
+    @staticmethod
+    def format_report(report: Dict) -> str:
+        """Текст звіту для надсилання з parse_mode HTML"""
+        period = (f"{report['start_date'].strftime('%d.%m.%Y')} – "
+                  f"{report['end_date'].strftime('%d.%m.%Y')}")
+        if report['total'] == 0:
+            return f"За {period} не було жодної активності."
+
+        lines = [f"📊 Аналітика за {period} ({report['days']} дн.)",
+                 f"Всього активностей: {report['total']}, "
+                 f"активних днів: {report['active_days']}",
+                 f"🔥 Серія: зараз {report['streak_current']} дн., "
+                 f"найдовша {report['streak_longest']} дн.", ""]
+        for act_type, stats in report['types'].items():
+            trend = stats['trend_per_week']
+            arrow = '↗' if trend > 0.5 else '↘' if trend < -0.5 else '→'
+            lines.append(f"{html.escape(act_type)}: {stats['count']} "
+                         f"({stats['per_week']:.1f}/тиж. {arrow})")
+
+        if report['busiest_hour'] is not None:
+            heatmap = report['heatmap']
+            busiest_day = int(heatmap.sum(axis=1).argmax())
+            lines += ["", f"🕐 Найактивніша година: {report['busiest_hour']:02d}:00, "
+                          f"день: {WEEKDAYS[busiest_day]}"]
+            blocks = ' ▁▂▃▄▅▆▇█'
+            # Кожна клітинка - 3 години, щоб рядок вмістився в екран
+            coarse = heatmap.reshape(7, 8, 3).sum(axis=2)
+            levels = np.ceil(coarse / coarse.max() * (len(blocks) - 1)).astype(int)
+            lines.append("<code>   00:00 → 24:00</code>")
+            for weekday, row in zip(WEEKDAYS, levels):
+                lines.append(f"<code>{weekday} {''.join(blocks[level] for level in row)}</code>")
+
+        if report['exercise_reps']:
+            reps = ', '.join(f"{html.escape(name)}: {count}"
+                             for name, count in report['exercise_reps'].items())
+            lines += ["", f"💪 Повторення: {reps}"]
+
+        water = report['water']
+        if water['total']:
+            lines += ["", f"💧 Вода: {water['average']:.1f} склянок на день "
+                          f"(мета {water['goal']:g}), мета досягнута "
+                          f"{water['days_goal_met']} дн., серія {water['goal_streak_current']} "
+                          f"(найдовша {water['goal_streak_longest']})"]
+        return "\n".join(lines)
@@ -0,0 +1,317 @@
+"""Фабрика застосунку бота
+
+create_app() лише збирає конфігурацію і нічого не відкриває, тож модуль
+можна імпортувати в тестах і бенчмарках без Firebase і мережі. Важкі
+залежності (firebase_admin, клієнт Firestore, з'єднання з AI, дисковий
+кеш класифікацій, локальна модель класифікації) створюються в startup()
+паралельно, а тривалість кожного етапу потрапляє у StartupReport. Фронт
+webhook з них потребує лише сховища для розсилки підсумків.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from config import (BOT_MODE, CLASSIFICATION_CACHE_PATH, CLASSIFICATION_CACHE_SIZE,
+                    CLASSIFICATION_CACHE_TTL, FIREBASE_KEY_PATH,
+                    LOCAL_CLASSIFIER_PATH, METRICS_HOST,
+                    METRICS_PORT, PROFILER_ENABLED, REMINDER_ENABLED,
+                    REMINDER_STATE_PATH, SCHEDULER_MAX_BACKLOG,
+                    SCHEDULER_MAX_CONCURRENCY, SCHEDULER_MAX_USER_BACKLOG,
+                    SCHEDULER_MAX_WAIT, SQLITE_PATH, STARTUP_TIMEOUT,
+                    STORAGE_BACKEND, SUMMARY_BROADCAST_ENABLED,
+                    TELEGRAM_BOT_TOKEN, TELEGRAM_GLOBAL_RATE, WEBHOOK_PORT,
+                    WEBHOOK_WORKER_URLS, WEBHOOK_WORKERS)
+from modules.activity_tracker import ActivityTracker
+from modules.ai_client import AIClient
+from modules.analytics import AnalyticsManager
+from modules.classification_cache import ClassificationCache
+from modules.exporter import ExportManager
+from modules.local_classifier import NaiveBayesClassifier, load_classifier
+from modules.handlers import create_dispatcher, used_update_types
+from modules.metrics import REGISTRY, start_metrics_server
+from modules.outbox import MessageOutbox
+from modules.profiler import SamplingProfiler
+from modules.reminders import ReminderEngine
+from modules.replicated_repository import ReplicatedRepository
+from modules.repository import Repository
+from modules.scheduler import UpdateScheduler
+from modules.sqlite_repository import SqliteRepository
+from modules.startup import StartupReport
+from modules.summary_broadcaster import SummaryBroadcaster
+from modules.summary_manager import SummaryManager
+from modules.user_manager import UserManager
+from modules.webhook import run_front, run_worker
+
+logger = logging.getLogger(__name__)
+
+
+def create_repository(backend: str = STORAGE_BACKEND,
+                      report: Optional[StartupReport] = None) -> Repository:
+    """Створює сховище згідно з backend; блокує, тому викликається в потоці"""
+    report = report or StartupReport()
+    if backend == 'sqlite':
+        return SqliteRepository(SQLITE_PATH)
+
+    # Firebase і клієнт Firestore імпортуються лише тоді, коли вони потрібні
+    with report.phase('import_firebase'):
+        import firebase_admin
+        from firebase_admin import credentials, firestore_async
+
+        from modules.firestore_repository import FirestoreRepository
+    with report.phase('firebase_init'):
+        cred = credentials.Certificate(FIREBASE_KEY_PATH)
+        firebase_admin.initialize_app(cred)
+        firestore_repository = FirestoreRepository(firestore_async.client())
+
+    if backend == 'firestore':
+        return firestore_repository
+    if backend == 'sqlite+firestore':
+        return ReplicatedRepository(SqliteRepository(SQLITE_PATH), firestore_repository)
+    raise ValueError(f"Невідоме сховище: {backend}")
+
+
+def outbox_rate(mode: str) -> float:
+    """Частка загального ліміту Telegram для черги розсилок цього процесу
+
+    Ліміт рахується на токен бота, а у webhook розсилають і фронт
+    (підсумки), і кожен воркер (нагадування), тож він ділиться на всі
+    процеси. Зовнішнім воркерам теж має бути задано WEBHOOK_WORKER_URLS.
+    """
+    if mode == 'polling':
+        return TELEGRAM_GLOBAL_RATE
+    workers = len(WEBHOOK_WORKER_URLS) or WEBHOOK_WORKERS
+    return TELEGRAM_GLOBAL_RATE / (workers + 1)
+
+
+class BotApp:
+    """Сервіси бота з явним порядком запуску і зупинки
+
+    Роутер обробників підключається до одного диспетчера, тому на процес
+    створюється один BotApp.
+    """
+
+    def __init__(self, mode: str = BOT_MODE, storage_backend: str = STORAGE_BACKEND,
+                 report: Optional[StartupReport] = None):
+        self.mode = mode
+        self.storage_backend = storage_backend
+        self.report = report or StartupReport()
+        self.ready = False
+        self.repository: Optional[Repository] = None
+        self.ai_client: Optional[AIClient] = None
+        self.classification_cache: Optional[ClassificationCache] = None
+        self.classifier: Optional[NaiveBayesClassifier] = None
+        self.user_manager: Optional[UserManager] = None
+        self.summary_manager: Optional[SummaryManager] = None
+        self.analytics_manager: Optional[AnalyticsManager] = None
+        self.export_manager: Optional[ExportManager] = None
+        self.tracker: Optional[ActivityTracker] = None
+        self.scheduler: Optional[UpdateScheduler] = None
+        self.bot: Optional[Bot] = None
+        self.dp: Optional[Dispatcher] = None
+        self.outbox: Optional[MessageOutbox] = None
+        self.broadcaster: Optional[SummaryBroadcaster] = None
+        self.reminders: Optional[ReminderEngine] = None
+        self._metrics_runner: Optional[web.AppRunner] = None
+        self._warm_up_task: Optional[asyncio.Task] = None
+
+    async def _create_repository(self):
+        with self.report.phase('repository'):
+            self.repository = await asyncio.to_thread(
+                create_repository, self.storage_backend, self.report)
+
+    async def _create_classification_cache(self):
+        # Дисковий рівень кешу відкриває SQLite і чистить прострочені записи
+        with self.report.phase('classification_cache'):
+            self.classification_cache = await asyncio.to_thread(
+                ClassificationCache, CLASSIFICATION_CACHE_SIZE,
+                CLASSIFICATION_CACHE_TTL, CLASSIFICATION_CACHE_PATH)
+
+    async def _load_classifier(self):
+        with self.report.phase('local_classifier'):
+            self.classifier = await asyncio.to_thread(load_classifier,
+                                                      LOCAL_CLASSIFIER_PATH)
+        if self.classifier is None and LOCAL_CLASSIFIER_PATH:
+            logger.info("Локальна модель класифікації ще не навчена: "
+                        "python manage.py train-classifier")
+
+    async def _warm_up_ai(self):
+        with self.report.phase('ai_warm_up'):
+            await self.ai_client.warm_up()
+
+    async def startup(self):
+        """Ініціалізує залежності; незалежні етапи виконуються одночасно
+
+        З'єднання з AI прогрівається у фоні: перше повідомлення для AI
+        може прийти не одразу, і чекати на нього з готовністю не варто.
+        """
+        if self.mode == 'webhook':
+            await self._startup_front()
+            return
+
+        with self.report.phase('init'):
+            self.ai_client = AIClient()
+            self._warm_up_task = asyncio.create_task(self._warm_up_ai())
+            await asyncio.gather(self._create_repository(),
+                                 self._create_classification_cache(),
+                                 self._load_classifier())
+
+            # Менеджери даних отримують сховище явно
+            self.user_manager = UserManager(self.repository)
+            self.summary_manager = SummaryManager(self.repository,
+                                                  self.user_manager.timeline)
+            self.analytics_manager = AnalyticsManager(self.repository)
+            self.tracker = ActivityTracker(self.ai_client, self.classification_cache,
+                                           classifier=self.classifier)
+
+            # Черги користувачів і спільний ліміт одночасної обробки оновлень
+            self.scheduler = UpdateScheduler(SCHEDULER_MAX_CONCURRENCY,
+                                             SCHEDULER_MAX_BACKLOG,
+                                             SCHEDULER_MAX_USER_BACKLOG,
+                                             SCHEDULER_MAX_WAIT)
+
+            # Залежності передаються в обробники через workflow data
+            self.bot = Bot(token=TELEGRAM_BOT_TOKEN)
+            self.export_manager = ExportManager(self.repository, self.bot)
+            self.dp = create_dispatcher(self.user_manager, self.summary_manager,
+                                        self.tracker, self.scheduler,
+                                        self.analytics_manager, self.export_manager)
+
+            # Розсилки йдуть через спільну чергу з лімітами Telegram
+            self.outbox = MessageOutbox(self.bot, rate=outbox_rate(self.mode))
+            self.broadcaster = SummaryBroadcaster(self.repository, self.outbox)
+            self.user_manager.settings_listeners.append(self.broadcaster.schedule_user)
+
+            # Нагадування ведуться там, де обробляються активності: у кожного
+            # воркера webhook свої користувачі, тож і свій файл стану
+            self.reminders = ReminderEngine(
+                self.outbox, self.user_manager.get_settings,
+                f'{REMINDER_STATE_PATH}.{WEBHOOK_PORT}' if self.mode == 'worker'
+                else REMINDER_STATE_PATH)
+            self.user_manager.activity_listeners.append(self.reminders.record_activity)
+            self.user_manager.settings_listeners.append(self.reminders.update_settings)
+
+            self._register_stats()
+
+    async def _startup_front(self):
+        """Фронт webhook лише пересилає оновлення воркерам і розсилає підсумки
+
+        Обробники, AI, кеші і модель класифікації працюють у воркерах, а
+        сховище фронту потрібне тільки для розкладу підсумків.
+        """
+        with self.report.phase('init'):
+            self.bot = Bot(token=TELEGRAM_BOT_TOKEN)
+            self.outbox = MessageOutbox(self.bot, rate=outbox_rate(self.mode))
+            if SUMMARY_BROADCAST_ENABLED:
+                await self._create_repository()
+                self.broadcaster = SummaryBroadcaster(self.repository, self.outbox)
+            self._register_stats()
+
+    def _register_stats(self):
+        # Глибина черг і влучання кешів читаються з stats() під час запиту /metrics
+        REGISTRY.add_stats('bot_outbox', self.outbox.stats)
+        if self.broadcaster is not None:
+            REGISTRY.add_stats('bot_summaries', self.broadcaster.stats)
+        if self.mode == 'webhook':
+            return
+
+        REGISTRY.add_stats('bot_scheduler', self.scheduler.stats)
+        REGISTRY.add_stats('bot_write_buffer', self.user_manager.activity_buffer.stats)
+        REGISTRY.add_stats('bot_user_cache', self.user_manager.user_cache.stats)
+        if self.user_manager.timeline is not None:
+            REGISTRY.add_stats('bot_timeline', self.user_manager.timeline.stats)
+        REGISTRY.add_stats('bot_classification_cache', self.classification_cache.stats)
+        REGISTRY.add_stats('bot_ai_breaker', self.tracker.breaker.stats)
+        if self.tracker.batcher is not None:
+            REGISTRY.add_stats('bot_ai_batcher', self.tracker.batcher.stats)
+        if isinstance(self.repository, ReplicatedRepository):
+            REGISTRY.add_stats('bot_replication', self.repository.stats)
+        REGISTRY.add_stats('bot_reminders', self.reminders.stats)
+        REGISTRY.add_stats('bot_exports', self.export_manager.stats)
+
+    def is_ready(self) -> bool:
+        return self.ready
+
+    async def run(self):
+        """Запускає бота в режимі mode і зупиняє всі сервіси після виходу
+
+        Сервер метрик з пробами піднімається першим, тож поки залежності
+        ініціалізуються, /health уже відповідає, а /ready - ні.
+        """
+        logger.info(f"Запускаю бота в режимі {self.mode}...")
+        if METRICS_PORT:
+            REGISTRY.add_stats('bot_startup', self.report.stats)
+            self._metrics_runner = await start_metrics_server(
+                METRICS_HOST, METRICS_PORT,
+                profiler=SamplingProfiler() if PROFILER_ENABLED else None,
+                ready=self.is_ready)
+        try:
+            await asyncio.wait_for(self.startup(), STARTUP_TIMEOUT)
+            self.report.finish()
+            self.report.log()
+
+            # Розсилкою займається один процес: воркери webhook її не запускають
+            if SUMMARY_BROADCAST_ENABLED and self.mode != 'worker':
+                self.broadcaster.start()
+            if REMINDER_ENABLED and self.mode != 'webhook':
+                self.reminders.start()
+
+            self.ready = True
+            if self.mode == 'polling':
+                await self.dp.start_polling(self.bot)
+            elif self.mode == 'webhook':
+                await run_front(self.bot, used_update_types())
+            elif self.mode == 'worker':
+                await run_worker(self.dp, self.bot)
+            else:
+                raise ValueError(f"Невідомий режим: {self.mode}")
+        finally:
+            self.ready = False
+            await self.shutdown()
+
+    async def shutdown(self):
+        """Зупиняє все, що встигло запуститися, у зворотному до даних порядку"""
+        if self.broadcaster is not None:
+            await self.broadcaster.close()
+        if self.reminders is not None:
+            await self.reminders.close()
+        if self.scheduler is not None:
+            await self.scheduler.close()
+            logger.info(f"Планувальник оновлень: {self.scheduler.stats()}")
+        if self.export_manager is not None:
+            # Експорти читають сховище, тому зупиняються до його закриття
+            await self.export_manager.close()
+        if self.user_manager is not None:
+            await self.user_manager.close()
+        if self.repository is not None:
+            await self.repository.close()
+        if self.tracker is not None:
+            await self.tracker.close()
+            logger.info(f"Пакети AI: "
+                        f"{self.tracker.batcher.stats() if self.tracker.batcher else {}}")
+        if self._warm_up_task is not None:
+            self._warm_up_task.cancel()
+            await asyncio.gather(self._warm_up_task, return_exceptions=True)
+        if self.ai_client is not None:
+            await self.ai_client.close()
+        if self.classification_cache is not None:
+            logger.info(f"Кеш класифікацій: {self.classification_cache.stats()}")
+            self.classification_cache.close()
+        if self.outbox is not None:
+            await self.outbox.close()
+            logger.info(f"Розсилки: {self.broadcaster.stats() if self.broadcaster else {}}, "
+                        f"нагадування: {self.reminders.stats() if self.reminders else {}}, "
+                        f"черга: {self.outbox.stats()}")
+        if self.bot is not None:
+            await self.bot.session.close()
+        if self._metrics_runner is not None:
+            await self._metrics_runner.cleanup()
+            self._metrics_runner = None
+
+
+def create_app(mode: str = BOT_MODE, storage_backend: str = STORAGE_BACKEND,
+               report: Optional[StartupReport] = None) -> BotApp:
+    """Застосунок без побічних ефектів: усе важке створюється в run()"""
+    return BotApp(mode, storage_backend, report)
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Збирає одиночні запити в пакети і повертає кожному його результат
+
+    Пакет відправляється, коли набралося max_batch елементів або минуло
+    window секунд від першого елемента. process отримує список елементів і
+    повертає список результатів у тому ж порядку. Однакові елементи в
+    одному вікні обробляються один раз.
+    """
+
+    def __init__(self, process: Callable[[List], Awaitable[List]],
+                 max_batch: int = 10, window: float = 0.05):
+        self.process = process
+        self.max_batch = max_batch
+        self.window = window
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.batches = 0
+        self.items = 0
+        self.coalesced = 0
+
+    async def submit(self, item: Hashable):
+        future = self._pending.get(item)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            loop = asyncio.get_running_loop()
+            future = self._pending[item] = loop.create_future()
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._flush)
+        # shield: скасування одного з очікувачів не скасовує спільний результат
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[Hashable, asyncio.Future]):
+        items = list(batch)
+        self.batches += 1
+        self.items += len(items)
+        try:
+            results = await self.process(items)
+            if len(results) != len(items):
+                raise ValueError(f"Очікувалось {len(items)} результатів, "
+                                 f"отримано {len(results)}")
+        except Exception as e:
+            logger.error(f"Помилка обробки пакета з {len(items)} елементів: {e!r}")
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for item, result in zip(items, results):
+            future = batch[item]
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'coalesced': self.coalesced,
+            'avg_batch': self.items / self.batches if self.batches else 0.0,
+        }
+
+    async def close(self):
+        """Відправляє незібраний пакет і дочікується всіх відповідей"""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,77 @@
+import time
+
+
+class CircuitBreaker:
+    """Запобіжник для зовнішнього сервісу: closed → open → half-open
+
+    Після failure_threshold невдач або надто повільних відповідей поспіль
+    виклики припиняються на reset_timeout секунд. Потім пропускається один
+    пробний виклик: успіх закриває запобіжник, невдача знову відкриває.
+    Результат записується на кожен запит до сервісу, а не на кожного, хто
+    чекає на його відповідь.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float,
+                 slow_call: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call = slow_call
+        self.failures = 0
+        self._opened_at = None
+        self._probe_started = None
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self) -> bool:
+        """Чи можна звертатися до сервісу зараз"""
+        state = self.state
+        if state == 'closed':
+            return True
+        now = time.monotonic()
+        # Пробний виклик, що не дав результату за reset_timeout (наприклад,
+        # скасований ще до запиту), не блокує наступну пробу
+        if state == 'half_open' and (self._probe_started is None
+                                     or now - self._probe_started >= self.reset_timeout):
+            self._probe_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, success: bool, started: float):
+        """Результат запиту, що почався в started (time.monotonic())
+
+        Повільний успіх рахується як невдача. Запити, що почалися до
+        відкриття запобіжника, на нього вже не впливають: закрити відкритий
+        запобіжник може лише пробний виклик.
+        """
+        if self._opened_at is not None and started < self._opened_at:
+            return
+        self._probe_started = None
+        duration = time.monotonic() - started
+        if success and duration < self.slow_call:
+            self.failures = 0
+            self._opened_at = None
+            return
+
+        self.failures += 1
+        if self._opened_at is not None or self.failures >= self.failure_threshold:
+            if self._opened_at is None:
+                self.opened += 1
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        state = self.state
+        return {
+            'open': int(state != 'closed'),
+            'failures': self.failures,
+            'opened': self.opened,
+            'rejected': self.rejected,
+        }
@@ -0,0 +1,161 @@
+import copy
+import json
+import logging
+import re
+import sqlite3
+import time
+from typing import Dict, Optional
+
+from modules.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Час на початку повідомлення не впливає на класифікацію
+LEADING_TIME_RE = re.compile(r'^\d{1,2}[:.]\d{2}\s*')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """Приводить текст до ключа кешу: без часу, регістру і зайвих пробілів"""
+    text = LEADING_TIME_RE.sub('', text.strip().lower())
+    text = WHITESPACE_RE.sub(' ', text)
+    return text.strip(' .,!?;…')
+
+
+class ClassificationCache:
+    """Кеш результатів AI класифікації: LRU у пам'яті + опційно SQLite"""
+
+    def __init__(self, maxsize: int, ttl: float, path: str = "",
+                 max_disk_entries: int = 100000):
+        self.memory = TTLCache(maxsize, ttl)
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_writes = 0
+
+        if path:
+            self._open_disk(path)
+
+    def _open_disk(self, path: str):
+        """Відкриває SQLite файл і прибирає прострочені записи"""
+        try:
+            # Кеш можна відкрити в окремому потоці під час запуску, а далі
+            # ним користується лише event loop
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS classifications (
+                    key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_classifications_expires '
+                         'ON classifications (expires_at)')
+            conn.execute('DELETE FROM classifications WHERE expires_at <= ?',
+                         (time.time(),))
+            conn.commit()
+            self._conn = conn
+        except sqlite3.Error as e:
+            logger.error(f"Не вдалося відкрити кеш класифікацій {path}: {e}")
+
+    def get(self, text: str) -> Optional[Dict]:
+        """Повертає збережений результат для тексту або None"""
+        key = normalize_text(text)
+        result = self.memory.get(key)
+
+        if result is None and self._conn is not None:
+            result = self._get_from_disk(key)
+
+        if result is None:
+            return None
+
+        # Опис завжди має відповідати саме цьому повідомленню
+        result = copy.deepcopy(result)
+        result.setdefault('details', {})['description'] = text
+        return result
+
+    def set(self, text: str, result: Dict):
+        """Зберігає результат класифікації"""
+        key = normalize_text(text)
+        result = copy.deepcopy(result)
+        self.memory.set(key, result)
+
+        if self._conn is not None:
+            self._set_on_disk(key, result)
+
+    def _get_from_disk(self, key: str) -> Optional[Dict]:
+        try:
+            row = self._conn.execute(
+                'SELECT result, expires_at FROM classifications WHERE key = ?',
+                (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Помилка читання кешу класифікацій: {e}")
+            return None
+
+        if row is None or row[1] <= time.time():
+            return None
+
+        result = json.loads(row[0])
+        self.disk_hits += 1
+        # Прогріваємо пам'ять, щоб наступний запит не йшов на диск
+        self.memory.set(key, result, ttl=row[1] - time.time())
+        return result
+
+    def _set_on_disk(self, key: str, result: Dict):
+        try:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO classifications (key, result, expires_at) '
+                'VALUES (?, ?, ?)',
+                (key, json.dumps(result, ensure_ascii=False),
+                 time.time() + self.ttl))
+            self._conn.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.error(f"Помилка запису кешу класифікацій: {e}")
+            return
+
+        self._disk_writes += 1
+        if self._disk_writes % 1000 == 0:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        """Обмежує розмір файлу, видаляючи записи, що спливають першими"""
+        try:
+            self._conn.execute('DELETE FROM classifications WHERE expires_at <= ?',
+                               (time.time(),))
+            (count,) = self._conn.execute(
+                'SELECT COUNT(*) FROM classifications').fetchone()
+            excess = count - self.max_disk_entries
+            if excess > 0:
+                self._conn.execute(
+                    'DELETE FROM classifications WHERE key IN ('
+                    'SELECT key FROM classifications ORDER BY expires_at LIMIT ?)',
+                    (excess,))
+                self.disk_evictions += excess
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Помилка очищення кешу класифікацій: {e}")
+
+    def stats(self) -> dict:
+        """Лічильники влучань, промахів і витіснень"""
+        memory = self.memory.stats()
+        hits = memory['hits'] + self.disk_hits
+        misses = memory['misses'] - self.disk_hits
+        return {
+            'size': memory['size'],
+            'hits': hits,
+            'memory_hits': memory['hits'],
+            'disk_hits': self.disk_hits,
+            'misses': misses,
+            'evictions': memory['evictions'] + self.disk_evictions,
+            'expirations': memory['expirations'],
+            'disk_enabled': self._conn is not None,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
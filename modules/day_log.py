@@ -0,0 +1,36 @@
+"""Розбір повідомлення з журналом дня: одна активність на рядок з часом
+
+    08:00 сніданок, вівсянка і кава
+    12:45 обід
+    з колегами
+    19:00 тренування
+
+Рядок без часу продовжує попередній запис. Кожен запис починається з
+HH:MM, тож UserManager бере час активності з нього, як і для звичайного
+повідомлення.
+"""
+import re
+from typing import Iterator, List
+
+TIME_RE = re.compile(r'^(?:[01]?\d|2[0-3]):[0-5]\d(?!\d)')
+
+
+def iter_entries(text: str) -> Iterator[str]:
+    """Записи журналу по черзі; рядки без часу доклеюються до попереднього"""
+    current: List[str] = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if current and TIME_RE.match(line):
+            yield ' '.join(current)
+            current = []
+        current.append(line)
+    if current:
+        yield ' '.join(current)
+
+
+def split_day_log(text: str) -> List[str]:
+    """Записи журналу дня; повідомлення з одним записом повертається як є"""
+    entries = list(iter_entries(text))
+    return entries if len(entries) > 1 else [text]
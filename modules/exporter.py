@@ -0,0 +1,234 @@
+"""Потоковий експорт історії активностей у NDJSON або CSV
+
+Активності читаються сторінками через Repository.iter_activities, рядки
+збираються в буфер фіксованого розміру, а стиснення і запис на диск
+виконуються в окремому потоці. У пам'яті одночасно перебувають лише одна
+сторінка сховища і один шматок виводу, тож пікова пам'ять не залежить від
+довжини історії.
+"""
+import asyncio
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import tempfile
+from datetime import date, datetime
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.types import FSInputFile
+
+from config import (EXPORT_CHUNK_SIZE, EXPORT_MAX_CONCURRENCY, EXPORT_MAX_FILE_SIZE,
+                    EXPORT_TMP_DIR)
+from modules.repository import FIRST_DAY, LAST_DAY, Repository
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FIELDS = ['date', 'timestamp', 'type', 'subtype', 'details', 'raw_text',
+                 'mood', 'auto_detected', 'created_at']
+CSV_COLUMNS = ['id'] + EXPORT_FIELDS
+FORMATS = ('ndjson', 'csv')
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+    return '' if value is None else value
+
+
+class ExportWriter:
+    """Пише активності в бінарний sink шматками приблизно по chunk_size байт"""
+
+    def __init__(self, sink: BinaryIO, fmt: str = 'ndjson', compress: bool = False,
+                 chunk_size: int = EXPORT_CHUNK_SIZE):
+        if fmt not in FORMATS:
+            raise ValueError(f"Невідомий формат експорту: {fmt}")
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self._sink = sink
+        self._gzip = gzip.GzipFile(fileobj=sink, mode='wb') if compress else None
+        self._buffer = io.StringIO()
+        self._csv = csv.writer(self._buffer) if fmt == 'csv' else None
+        if self._csv is not None:
+            self._csv.writerow(CSV_COLUMNS)
+        self.rows = 0
+
+    def _row(self, activity: Dict):
+        if self._csv is not None:
+            self._csv.writerow([_csv_value(activity.get(column))
+                                for column in CSV_COLUMNS])
+        else:
+            self._buffer.write(json.dumps(activity, ensure_ascii=False,
+                                          default=_json_default))
+            self._buffer.write('\n')
+        self.rows += 1
+
+    def _write_chunk(self, chunk: bytes):
+        (self._gzip or self._sink).write(chunk)
+
+    async def _flush(self):
+        chunk = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        if chunk:
+            await asyncio.to_thread(self._write_chunk, chunk)
+
+    async def write(self, activity: Dict):
+        self._row(activity)
+        if self._buffer.tell() >= self.chunk_size:
+            await self._flush()
+
+    async def finish(self):
+        """Дописує залишок буфера і завершує gzip; sink не закривається"""
+        await self._flush()
+        if self._gzip is not None:
+            await asyncio.to_thread(self._gzip.close)
+        await asyncio.to_thread(self._sink.flush)
+
+    @property
+    def size(self) -> int:
+        """Байтів уже записано в sink (без ще не стиснутого залишку gzip)"""
+        return self._sink.tell()
+
+
+async def export_activities(activities: AsyncIterator[Dict], sink: BinaryIO,
+                            fmt: str = 'ndjson', compress: bool = False) -> int:
+    """Пише всі активності в один sink, наприклад, у stdout; повертає к-сть рядків"""
+    writer = ExportWriter(sink, fmt, compress)
+    async for activity in activities:
+        await writer.write(activity)
+    await writer.finish()
+    return writer.rows
+
+
+class ExportManager:
+    """Експорт історії користувача файлами-документами в Telegram
+
+    Експорт іде у фоновій задачі, щоб не тримати чергу оновлень
+    користувача, а одночасних експортів не більше max_concurrency. Файли
+    більші за max_file_size діляться на частини, бо Bot API приймає
+    документи до 50 МБ.
+    """
+
+    def __init__(self, repository: Repository, bot: Bot,
+                 max_concurrency: int = EXPORT_MAX_CONCURRENCY,
+                 max_file_size: int = EXPORT_MAX_FILE_SIZE,
+                 directory: str = EXPORT_TMP_DIR):
+        self.repository = repository
+        self.bot = bot
+        self.max_file_size = max_file_size
+        self.directory = directory or None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._active: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.exported = 0
+        self.failed = 0
+
+    def start(self, user_id: str, chat_id: int, fmt: str = 'ndjson',
+              compress: bool = False) -> bool:
+        """Ставить експорт у роботу; False, якщо для користувача він уже йде"""
+        if user_id in self._active:
+            return False
+        self._active.add(user_id)
+        task = asyncio.create_task(self._run(user_id, chat_id, fmt, compress))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _run(self, user_id: str, chat_id: int, fmt: str, compress: bool):
+        parts: List[Tuple[str, int]] = []
+        try:
+            async with self._semaphore:
+                parts = await self.export_to_files(user_id, fmt, compress)
+                rows = sum(count for _, count in parts)
+                if not rows:
+                    await self.bot.send_message(chat_id, "Історія активностей порожня.")
+                    return
+                extension = f"{fmt}.gz" if compress else fmt
+                for number, (path, count) in enumerate(parts, 1):
+                    suffix = f"-{number}" if len(parts) > 1 else ""
+                    await self.bot.send_document(
+                        chat_id,
+                        FSInputFile(path, filename=f"activities-{user_id}{suffix}.{extension}"),
+                        caption=f"📦 Експорт: {count} активностей"
+                                + (f" (частина {number} з {len(parts)})"
+                                   if len(parts) > 1 else ""))
+                self.exported += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Помилка експорту користувача {user_id}: {e!r}")
+            try:
+                await self.bot.send_message(
+                    chat_id, "❌ Не вдалося підготувати експорт. Спробуй пізніше.")
+            except Exception as send_error:
+                logger.error(f"Не вдалося повідомити про помилку експорту: {send_error!r}")
+        finally:
+            self._active.discard(user_id)
+            for path, _ in parts:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    async def export_to_files(self, user_id: str, fmt: str = 'ndjson',
+                              compress: bool = False) -> List[Tuple[str, int]]:
+        """Тимчасові файли частин експорту: [(шлях, кількість рядків)]"""
+        parts: List[Tuple[str, int]] = []
+        sink: Optional[BinaryIO] = None
+        writer: Optional[ExportWriter] = None
+
+        async def close_part():
+            await writer.finish()
+            await asyncio.to_thread(sink.close)
+            parts[-1] = (parts[-1][0], writer.rows)
+
+        try:
+            async for activity in self.repository.iter_activities(
+                    user_id, FIRST_DAY, LAST_DAY, EXPORT_FIELDS):
+                if writer is not None and writer.size >= self.max_file_size:
+                    await close_part()
+                    writer = None
+                if writer is None:
+                    descriptor, path = tempfile.mkstemp(prefix='export-',
+                                                        dir=self.directory)
+                    sink = os.fdopen(descriptor, 'wb')
+                    parts.append((path, 0))
+                    writer = ExportWriter(sink, fmt, compress)
+                await writer.write(activity)
+            if writer is not None:
+                await close_part()
+        except BaseException:
+            if sink is not None and not sink.closed:
+                sink.close()
+            for path, _ in parts:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            raise
+        return parts
+
+    def stats(self) -> dict:
+        return {
+            'active': len(self._active),
+            'exported': self.exported,
+            'failed': self.failed,
+        }
+
+    async def close(self):
+        """Скасовує незавершені експорти; тимчасові файли видаляються"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
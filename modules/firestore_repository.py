@@ -0,0 +1,342 @@
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from google.api_core.exceptions import AlreadyExists
+from google.cloud.firestore import SERVER_TIMESTAMP, AsyncClient, Increment
+
+from config import LEGACY_ACTIVITIES_FALLBACK, WRITE_BATCH_SIZE, WRITE_MARKER_TTL_DAYS
+from modules.aggregates import activity_increments, merge_increments
+from modules.layout import (LAYOUT_MIGRATED_FIELD, LEGACY_ACTIVITIES_COLLECTION,
+                            USERS_COLLECTION, WRITE_MARKERS_COLLECTION,
+                            day_activities_ref, day_ref, days_ref, user_ref)
+from modules.metrics import STORAGE_SECONDS, timed
+from modules.repository import Repository
+
+logger = logging.getLogger(__name__)
+
+
+def to_firestore_increments(increments: Dict) -> Dict:
+    """Замінює числа на атомарні Increment для set(merge=True)"""
+    return {key: to_firestore_increments(value) if isinstance(value, dict)
+            else Increment(value)
+            for key, value in increments.items()}
+
+
+def batch_marker_id(activity_docs: List[Dict]) -> Optional[str]:
+    """Ідентифікатор пакета за ідентифікаторами його активностей
+
+    Повтор того самого пакета дає той самий ідентифікатор. Якщо хоч одна
+    активність без id, повтор однаково створив би нові документи, тож
+    маркера немає.
+    """
+    ids = [doc.get('id') for doc in activity_docs]
+    if not ids or not all(ids):
+        return None
+    return hashlib.sha1('\n'.join(sorted(ids)).encode()).hexdigest()
+
+
+async def merge_by_day(first: AsyncIterator[Tuple[str, Dict]],
+                       second: AsyncIterator[Tuple[str, Dict]]
+                       ) -> AsyncIterator[Tuple[str, Dict]]:
+    """Зливає два потоки (день, активність), впорядковані за днем"""
+    left, right = await anext(first, None), await anext(second, None)
+    while left is not None or right is not None:
+        if right is None or (left is not None and left[0] <= right[0]):
+            yield left
+            left = await anext(first, None)
+        else:
+            yield right
+            right = await anext(second, None)
+
+
+class FirestoreRepository(Repository):
+    """Сховище у Firestore з розкладкою users/{id}/days/{дата}/activities"""
+
+    def __init__(self, db: AsyncClient, page_size: int = 500,
+                 day_concurrency: int = 8):
+        self.db = db
+        self.page_size = page_size
+        # Скільки днів iter_activities читає одночасно
+        self.day_concurrency = day_concurrency
+        # Користувачі з прапорцем LAYOUT_MIGRATED_FIELD; прапорець не знімається,
+        # тож їхні профілі для цього більше не читаються
+        self._migrated_users = set()
+
+    @timed(STORAGE_SECONDS, backend='firestore', operation='get_user')
+    async def get_user(self, user_id: str) -> Optional[Dict]:
+        user_doc = await user_ref(self.db, user_id).get()
+        return user_doc.to_dict() if user_doc.exists else None
+
+    @timed(STORAGE_SECONDS, backend='firestore', operation='create_user')
+    async def create_user(self, user_id: str, user_data: Dict):
+        # У нового користувача немає активностей у старій плоскій колекції
+        await user_ref(self.db, user_id).set({**user_data, LAYOUT_MIGRATED_FIELD: True})
+
+    @timed(STORAGE_SECONDS, backend='firestore', operation='update_user_settings')
+    async def update_user_settings(self, user_id: str, settings: Dict):
+        await user_ref(self.db, user_id).update(
+            {f'settings.{key}': value for key, value in settings.items()})
+
+    @timed(STORAGE_SECONDS, backend='firestore', operation='add_activities')
+    async def add_activities(self, activity_docs: List[Dict]):
+        """Записує активності і оновлення агрегатів WriteBatch-ами
+
+        Кожна активність - це до двох операцій (документ і інкремент дня),
+        а ще одна операція - маркер пакета, тому в один пакет потрапляє менше
+        половини ліміту операцій.
+        """
+        chunk_size = (WRITE_BATCH_SIZE - 1) // 2
+        for offset in range(0, len(activity_docs), chunk_size):
+            await self._commit_chunk(activity_docs[offset:offset + chunk_size])
+
+    async def _commit_chunk(self, activity_docs: List[Dict]):
+        batch = self.db.batch()
+        daily_increments = {}
+        for activity_doc in activity_docs:
+            data = dict(activity_doc)
+            activity_id = data.pop('id', None)
+            user_id, day = data['user_id'], data['date']
+            activities = day_activities_ref(self.db, user_id, day)
+            batch.set(activities.document(activity_id) if activity_id
+                      else activities.document(), data)
+            merge_increments(daily_increments.setdefault((user_id, day), {}),
+                             activity_increments(data))
+
+        # Один атомарний Increment на документ дня у межах пакета
+        for (user_id, day), increments in daily_increments.items():
+            update = to_firestore_increments(increments)
+            update['date'] = day
+            batch.set(day_ref(self.db, user_id, day), update, merge=True)
+
+        # Маркер пакета створюється в тому ж WriteBatch. Якщо попередня спроба
+        # записала пакет, але відповідь загубилася, create() не пройде і весь
+        # пакет відхиляється, тож Increment не застосовується вдруге
+        marker_id = batch_marker_id(activity_docs)
+        if marker_id is not None:
+            marker = self.db.collection(WRITE_MARKERS_COLLECTION).document(marker_id)
+            batch.create(marker, {
+                'activities': len(activity_docs),
+                'created_at': SERVER_TIMESTAMP,
+                'expires_at': (datetime.now(timezone.utc)
+                               + timedelta(days=WRITE_MARKER_TTL_DAYS)),
+            })
+
+        try:
+            await batch.commit()
+        except AlreadyExists:
+            if marker_id is None:
+                raise
+            logger.info(f"Пакет {marker_id} уже записано, повтор пропущено")
+
+    @timed(STORAGE_SECONDS, backend='firestore', operation='get_daily_aggregates')
+    async def get_daily_aggregates(self, user_id: str,
+                                   days: Iterable[str]) -> Dict[str, Dict]:
+        """Читає документи днів одним пакетним запитом get_all
+
+        Для користувача, чиї активності ще не перенесено, тим самим запитом
+        читається профіль, а до документів днів додаються активності зі
+        старої колекції: під час переносу частина активностей дня може бути
+        вже в users/{id}/days, а частина - ще ні. Після переносу день без
+        документа - це день без активностей.
+        """
+        days = list(days)
+        refs = [day_ref(self.db, user_id, day) for day in days]
+        check_migrated = (LEGACY_ACTIVITIES_FALLBACK
+                          and str(user_id) not in self._migrated_users)
+        profile = user_ref(self.db, user_id)
+        if check_migrated:
+            refs.append(profile)
+
+        found = {}
+        migrated = not check_migrated
+        async for snapshot in self.db.get_all(refs):
+            if snapshot.reference.path == profile.path:
+                migrated = self._check_migrated(user_id, snapshot)
+            elif snapshot.exists:
+                found[snapshot.id] = snapshot.to_dict()
+
+        if days and not migrated:
+            legacy = await self._count_legacy_activities(user_id, days)
+            for day, increments in legacy.items():
+                merge_increments(found.setdefault(day, {'date': day}), increments)
+        return found
+
+    async def _is_migrated(self, user_id: str) -> bool:
+        if not LEGACY_ACTIVITIES_FALLBACK or str(user_id) in self._migrated_users:
+            return True
+        return self._check_migrated(user_id, await user_ref(self.db, user_id).get())
+
+    def _check_migrated(self, user_id: str, snapshot) -> bool:
+        """Чи перенесено активності користувача за знімком його профілю"""
+        if snapshot.exists and (snapshot.to_dict() or {}).get(LAYOUT_MIGRATED_FIELD):
+            self._migrated_users.add(str(user_id))
+            return True
+        return False
+
+    @timed(STORAGE_SECONDS, backend='firestore', operation='get_daily_aggregates_bulk')
+    async def get_daily_aggregates_bulk(
+            self, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict]:
+        """Документи днів багатьох користувачів пакетами get_all
+
+        Стара плоска колекція тут не читається: дні без документа вважаються
+        днями без активностей.
+        """
+        keys = list(keys)
+        found = {}
+        for offset in range(0, len(keys), self.page_size):
+            chunk = keys[offset:offset + self.page_size]
+            refs = {day_ref(self.db, user_id, day).path: (str(user_id), day)
+                    for user_id, day in chunk}
+            async for snapshot in self.db.get_all(
+                    [day_ref(self.db, user_id, day) for user_id, day in chunk]):
+                if snapshot.exists:
+                    found[refs[snapshot.reference.path]] = snapshot.to_dict()
+        return found
+
+    async def iter_users(self, fields: Optional[List[str]] = None
+                         ) -> AsyncIterator[Tuple[str, Dict]]:
+        query = self.db.collection(USERS_COLLECTION)
+        if fields:
+            query = query.select(fields)
+        query = query.order_by('__name__').limit(self.page_size)
+
+        last_doc = None
+        while True:
+            page = query.start_after(last_doc) if last_doc is not None else query
+            docs = [doc async for doc in page.stream()]
+            if not docs:
+                return
+            for doc in docs:
+                yield doc.id, doc.to_dict()
+            last_doc = docs[-1]
+
+    @timed(STORAGE_SECONDS, backend='firestore', operation='count_legacy_activities')
+    async def _count_legacy_activities(self, user_id: str,
+                                       days: List[str]) -> Dict[str, Dict]:
+        """Агрегати днів за ще не перенесеними активностями старої колекції"""
+        wanted = set(days)
+        found = {}
+        async for data in self._iter_legacy(user_id, min(days), max(days),
+                                            ['type', 'subtype', 'details']):
+            day = data['date']
+            if day in wanted:
+                merge_increments(found.setdefault(day, {}), activity_increments(data))
+        return found
+
+    async def _iter_legacy_days(self, user_id: str, start_day: str, end_day: str,
+                                fields: Optional[List[str]]
+                                ) -> AsyncIterator[Tuple[str, Dict]]:
+        keep_date = not fields or 'date' in fields
+        async for activity in self._iter_legacy(user_id, start_day, end_day, fields):
+            yield activity['date'] if keep_date else activity.pop('date'), activity
+
+    async def _iter_legacy(self, user_id: str, start_day: str, end_day: str,
+                           fields: Optional[List[str]] = None) -> AsyncIterator[Dict]:
+        """Ще не перенесені активності старої плоскої колекції в порядку дат
+
+        Діапазон дат фільтрує сам Firestore (складений індекс user_id + date у
+        firestore.indexes.json). Документи, які migrate-layout скопіював з
+        --keep-source, позначені LAYOUT_MIGRATED_FIELD і пропускаються.
+        """
+        query = (self.db.collection(LEGACY_ACTIVITIES_COLLECTION)
+                 .where('user_id', '==', user_id)
+                 .where('date', '>=', start_day)
+                 .where('date', '<=', end_day))
+        if fields:
+            query = query.select(list({*fields, 'date', LAYOUT_MIGRATED_FIELD}))
+        query = query.order_by('date').limit(self.page_size)
+
+        last_doc = None
+        while True:
+            page = query.start_after(last_doc) if last_doc is not None else query
+            docs = [doc async for doc in page.stream()]
+            if not docs:
+                return
+            for doc in docs:
+                data = doc.to_dict()
+                if data.pop(LAYOUT_MIGRATED_FIELD, False):
+                    continue
+                data['id'] = doc.id
+                yield data
+            last_doc = docs[-1]
+
+    async def iter_activities(self, user_id: str, start_day: str, end_day: str,
+                              fields: Optional[List[str]] = None) -> AsyncIterator[Dict]:
+        """Активності періоду в порядку днів
+
+        Поки активності користувача не перенесено, до users/{id}/days
+        домішуються активності старої колекції за ті самі дні.
+        """
+        activities = self._iter_days(user_id, start_day, end_day, fields)
+        if not await self._is_migrated(user_id):
+            activities = merge_by_day(activities, self._iter_legacy_days(
+                user_id, start_day, end_day, fields))
+        async for _, activity in activities:
+            yield activity
+
+    async def _iter_days(self, user_id: str, start_day: str, end_day: str,
+                         fields: Optional[List[str]]) -> AsyncIterator[Tuple[str, Dict]]:
+        """(день, активність) з users/{id}/days у порядку днів
+
+        Дні обходяться за курсором, а до day_concurrency днів сторінки
+        читаються паралельно, тож запит на день не чекає на попередній.
+        """
+        days_query = (days_ref(self.db, user_id)
+                      .where('__name__', '>=', day_ref(self.db, user_id, start_day))
+                      .where('__name__', '<=', day_ref(self.db, user_id, end_day))
+                      .select(['__name__'])
+                      .order_by('__name__')
+                      .limit(self.page_size))
+
+        last_day = None
+        while True:
+            page = days_query.start_after(last_day) if last_day is not None else days_query
+            day_docs = [doc async for doc in page.stream()]
+            if not day_docs:
+                return
+
+            pending = deque()
+            try:
+                for day_doc in day_docs:
+                    pending.append((day_doc.id, asyncio.ensure_future(
+                        self._read_day(user_id, day_doc.id, fields))))
+                    if len(pending) >= self.day_concurrency:
+                        day, task = pending.popleft()
+                        for activity in await task:
+                            yield day, activity
+                while pending:
+                    day, task = pending.popleft()
+                    for activity in await task:
+                        yield day, activity
+            finally:
+                # Споживач міг зупинитися раніше: незабрані дні не потрібні
+                for _, task in pending:
+                    task.cancel()
+            last_day = day_docs[-1]
+
+    async def _read_day(self, user_id: str, day: str,
+                        fields: Optional[List[str]]) -> List[Dict]:
+        return [activity async for activity in self._iter_day(user_id, day, fields)]
+
+    async def _iter_day(self, user_id: str, day: str,
+                        fields: Optional[List[str]]) -> AsyncIterator[Dict]:
+        query = day_activities_ref(self.db, user_id, day)
+        if fields:
+            query = query.select(fields)
+        query = query.order_by('__name__').limit(self.page_size)
+
+        last_doc = None
+        while True:
+            page = query.start_after(last_doc) if last_doc is not None else query
+            docs = [doc async for doc in page.stream()]
+            if not docs:
+                return
+            for doc in docs:
+                data = doc.to_dict()
+                data['id'] = doc.id
+                yield data
+            last_doc = docs[-1]
@@ -0,0 +1,291 @@
+"""Обробники повідомлень бота
+
+Залежності (user_manager, summary_manager, analytics_manager,
+export_manager, tracker) приходять з workflow data диспетчера, тому
+роутер можна підключити до будь-якого Dispatcher, зокрема з тестовими
+замінниками сервісів.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from aiogram import Dispatcher, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message, Update
+
+from config import DAY_LOG_MAX_ENTRIES, SHED_POLICY
+from modules.activity_tracker import ActivityTracker
+from modules.analytics import AnalyticsManager, parse_period
+from modules.day_log import TIME_RE, split_day_log
+from modules.exporter import ExportManager
+from modules.keyboard_manager import KeyboardManager
+from modules.local_time import local_today, user_timezone
+from modules.metrics import HANDLER_ERRORS, HandlerMetricsMiddleware
+from modules.scheduler import SchedulerMiddleware, UpdateScheduler
+from modules.summary_manager import SummaryManager
+from modules.user_manager import UserManager
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+router.message.middleware(HandlerMetricsMiddleware())
+
+
+def create_dispatcher(user_manager: UserManager, summary_manager: SummaryManager,
+                      tracker: ActivityTracker,
+                      scheduler: Optional[UpdateScheduler] = None,
+                      analytics_manager: Optional[AnalyticsManager] = None,
+                      export_manager: Optional[ExportManager] = None) -> Dispatcher:
+    """Диспетчер з обробниками бота; роутер можна підключити лише один раз
+
+    ExportManager надсилає файли через Bot, тому без нього /export вимкнено.
+    """
+    if analytics_manager is None:
+        analytics_manager = AnalyticsManager(summary_manager.repository)
+    dp = Dispatcher(user_manager=user_manager, summary_manager=summary_manager,
+                    analytics_manager=analytics_manager,
+                    export_manager=export_manager, tracker=tracker)
+    if scheduler is not None:
+        dp.update.outer_middleware(SchedulerMiddleware(scheduler, shed_update))
+    dp.include_router(router)
+    return dp
+
+
+def used_update_types() -> List[str]:
+    """Типи оновлень, які обробляє бот; фронту webhook диспетчер не потрібен"""
+    return router.resolve_used_update_types()
+
+
+async def shed_update(update: Update, data: Dict[str, Any]):
+    """Дешева відповідь на оновлення, відкинуте через перевантаження"""
+    message = update.message
+    if message is None or message.from_user is None:
+        return
+
+    if SHED_POLICY == 'defer' and message.text and not message.text.startswith('/'):
+        # Зберігаємо текст без класифікації, щоб запис не загубився. Повідомлення
+        # користувача ще можуть чекати в черзі, тож час береться з message.date.
+        # Сховище тут не читаємо: пояс береться з кешу профілів або типовий,
+        # а запис іде через буфер
+        user_manager = data['user_manager']
+        user_id = str(message.from_user.id)
+        entries = split_day_log(message.text)
+        if len(entries) > DAY_LOG_MAX_ENTRIES:
+            entries = [message.text]
+        await user_manager.save_activities(
+            user_id,
+            [({'type': 'other', 'subtype': '', 'details': {'description': entry},
+               'auto_detected': False, 'source': 'deferred'}, entry)
+             for entry in entries],
+            at=message.date, tz=user_timezone(user_manager.cached_settings(user_id)))
+        await message.answer("⏳ Зараз багато повідомлень, тому записав без аналізу.")
+        return
+
+    await message.answer("⏳ Зараз забагато повідомлень. Спробуй ще раз за хвилину.")
+
+
+@router.message(Command("start"))
+async def cmd_start(message: Message, user_manager: UserManager):
+    """Команда /start"""
+    user = await user_manager.get_or_create_user(message.from_user)
+
+    welcome_text = f"""
+🤖 Привіт, {user['first_name']}!
+
+Я твій особистий асистент для відстеження активностей.
+
+Просто пиши мені, що ти робиш, наприклад:
+• "12:45 роблю обід, курку і макарон"
+• "14:00 почав роботу над проектом"
+• "15:30 зробив 20 присідань"
+
+Команди:
+/help - допомога
+/summary - підсумок дня
+/stats - статистика
+/settings - налаштування
+    """
+
+    await message.answer(welcome_text,
+                         reply_markup=KeyboardManager.main_menu())
+
+
+@router.message(Command("help"))
+async def cmd_help(message: Message):
+    """Команда /help"""
+    help_text = """
+📋 **Доступні команди:**
+
+/start - почати роботу з ботом
+/summary - підсумок дня/тижня
+/stats - детальна статистика
+/analytics - аналітика за місяць (або week, 90, 2024-01-01 2024-03-31)
+/export - уся історія файлом (csv або ndjson, gz - стиснути)
+/diet - аналіз раціону
+/exercise - аналіз фізичних вправ
+/settings - налаштування бота
+/help - ця довідка
+
+**Як користуватися:**
+Просто пиши свої активності у вільній формі!
+    """
+
+    await message.answer(help_text, parse_mode="Markdown")
+
+
+
+@router.message(Command("summary"))
+async def cmd_summary(message: Message, user_manager: UserManager,
+                      summary_manager: SummaryManager):
+    user_id = str(message.from_user.id)
+    # За замовчуванням — підсумок дня
+    summary, total, start_date, end_date = await summary_manager.get_summary(
+        user_id, period="day", settings=await user_manager.get_settings(user_id))
+    text = SummaryManager.format_summary(summary, total, start_date, end_date)
+    await message.answer(text)
+
+@router.message(Command("analytics"))
+async def cmd_analytics(message: Message, command: CommandObject,
+                        user_manager: UserManager,
+                        analytics_manager: AnalyticsManager):
+    """Аналітика за період: /analytics [week|month|N днів|дата дата]"""
+    user_id = str(message.from_user.id)
+    settings = await user_manager.get_settings(user_id)
+    try:
+        start_date, end_date = parse_period(command.args or '', local_today(settings))
+    except ValueError:
+        await message.answer("Період: week, month, кількість днів (до 366) "
+                             "або дві дати у форматі YYYY-MM-DD.")
+        return
+
+    report = await analytics_manager.get_report(user_id, start_date, end_date, settings)
+    await message.answer(AnalyticsManager.format_report(report), parse_mode="HTML")
+
+
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject,
+                     export_manager: Optional[ExportManager] = None):
+    """Експорт усієї історії: /export [csv|ndjson] [gz]"""
+    if export_manager is None:
+        await message.answer("Експорт зараз недоступний.")
+        return
+
+    options = (command.args or '').lower().split()
+    fmt = 'csv' if 'csv' in options else 'ndjson'
+    compress = bool({'gz', 'gzip'} & set(options))
+    if set(options) - {'csv', 'ndjson', 'json', 'gz', 'gzip'}:
+        await message.answer("Формат: /export [csv|ndjson] [gz]")
+        return
+
+    # Файл готується у фоні, щоб не тримати чергу повідомлень користувача
+    if export_manager.start(str(message.from_user.id), message.chat.id, fmt, compress):
+        await message.answer("⏳ Готую експорт, надішлю файл, щойно він буде готовий.")
+    else:
+        await message.answer("Експорт уже готується, зачекай трохи.")
+
+
+@router.message(Command("weeksummary"))
+async def cmd_week_summary(message: Message, user_manager: UserManager,
+                           summary_manager: SummaryManager):
+    user_id = str(message.from_user.id)
+    summary, total, start_date, end_date = await summary_manager.get_summary(
+        user_id, period="week", settings=await user_manager.get_settings(user_id))
+    text = SummaryManager.format_summary(summary, total, start_date, end_date)
+    await message.answer(text)
+
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message, user_manager: UserManager):
+    user_id = str(message.from_user.id)
+    stats, total = await user_manager.get_daily_stats(user_id)
+    if total == 0:
+        await message.answer("Сьогодні ще немає жодної активності.")
+        return
+
+    stat_lines = [f"Всього активностей: {total}"]
+    for act_type, count in stats.items():
+        emoji = {
+            "meal": "🍽",
+            "exercise": "💪",
+            "sleep": "😴",
+            "work": "🏢",
+            "rest": "🛋",
+            "drink": "💧",
+            "cleaning": "🧹",
+            "meeting": "👥",
+            "other": "❓"
+        }.get(act_type, "❓")
+        stat_lines.append(f"{emoji} {act_type}: {count}")
+
+    await message.answer("\n".join(stat_lines))
+
+
+def format_activity(activity_data: dict) -> List[str]:
+    """Тип активності і, якщо є, рядок з деталями"""
+    parts = [activity_data['type']]
+    if activity_data['subtype']:
+        parts[0] += f" ({activity_data['subtype']})"
+
+    if activity_data['type'] == 'meal' and activity_data['details'].get(
+            'food_items'):
+        foods = ', '.join(activity_data['details']['food_items'])
+        parts.append(f"🍽 Продукти: {foods}")
+
+    elif activity_data['type'] == 'exercise':
+        if activity_data['details'].get('repetitions'):
+            parts.append(f"💪 {activity_data['details']['repetitions']} повторень")
+
+    elif activity_data['type'] == 'drink':
+        drink_type = activity_data['details'].get('drink_type', 'напій')
+        amount = activity_data['details'].get('amount', 1)
+        parts.append(f"🥤 {amount} {drink_type}")
+
+    return parts
+
+
+@router.message()
+async def handle_activity(message: Message, user_manager: UserManager,
+                          tracker: ActivityTracker):
+    """Обробка звичайних повідомлень як активностей"""
+    try:
+        entries = split_day_log(message.text)
+        if len(entries) > 1:
+            await handle_day_log(message, entries, user_manager, tracker)
+            return
+
+        user = await user_manager.get_or_create_user(message.from_user)
+        activity_data = await tracker.detect_activity_type(message.text)
+
+        await user_manager.save_activity(str(message.from_user.id),
+                                        activity_data, message.text)
+
+        await message.answer("✅ Записав: " + "\n".join(format_activity(activity_data)))
+
+    except Exception as e:
+        HANDLER_ERRORS.inc(handler='handle_activity')
+        logger.exception(f"Помилка при обробці активності: {e}")
+        await message.answer(
+            "❌ Виникла помилка при збереженні активності. Спробуй ще раз.")
+
+
+async def handle_day_log(message: Message, entries: List[str],
+                         user_manager: UserManager, tracker: ActivityTracker):
+    """Журнал дня: записи класифікуються одночасно, тож нерозпізнані рядки
+    потрапляють в один пакет до AI, а зберігаються одним пакетом запису"""
+    if len(entries) > DAY_LOG_MAX_ENTRIES:
+        await message.answer(f"Забагато записів в одному повідомленні: до "
+                             f"{DAY_LOG_MAX_ENTRIES}. Надішли журнал частинами.")
+        return
+
+    await user_manager.get_or_create_user(message.from_user)
+    activities = await asyncio.gather(*(tracker.detect_activity_type(entry)
+                                        for entry in entries))
+    await user_manager.save_activities(str(message.from_user.id),
+                                       list(zip(activities, entries)))
+
+    lines = [f"✅ Записав активностей: {len(entries)}"]
+    for entry, activity_data in zip(entries, activities):
+        time_match = TIME_RE.match(entry)
+        prefix = f"{time_match.group()} " if time_match else ""
+        lines.append(f"• {prefix}{' · '.join(format_activity(activity_data))}")
+    await message.answer("\n".join(lines))
@@ -0,0 +1,123 @@
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+NUMBER_RE = re.compile(r'\d+')
+
+
+def _trie_pattern(words) -> str:
+    """Будує regex з префіксного дерева слів
+
+    Спільні префікси перевіряються один раз, тому вираз працює значно
+    швидше за плоске перерахування через '|'. Серед слів з однаковим
+    початком вибирається найдовше.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node) -> str:
+        branches = [re.escape(char) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        if '' in node:
+            # Слово закінчується тут, але жадібно пробуємо довше
+            body = f'(?:{body})?'
+        return body
+
+    return build(trie)
+
+
+class KeywordHits:
+    """Результат одного проходу по тексту
+
+    Групи розбираються ліниво: обробник типу активності запитує лише ті
+    словники, які йому потрібні.
+    """
+
+    __slots__ = ('_text', '_matches', '_expansions', '_numbers')
+
+    def __init__(self, text: str, matches: List[str],
+                 expansions: Dict[str, Dict[str, tuple]]):
+        self._text = text
+        self._matches = matches
+        self._expansions = expansions
+        self._numbers = None
+
+    def get(self, group: str) -> set:
+        """Множина значень, знайдених для групи"""
+        found = set()
+        for keyword in self._matches:
+            values = self._expansions[keyword].get(group)
+            if values:
+                found.update(values)
+        return found
+
+    @property
+    def numbers(self) -> List[int]:
+        """Усі числа в тексті в порядку появи"""
+        if self._numbers is None:
+            self._numbers = [int(number) for number in NUMBER_RE.findall(self._text)]
+        return self._numbers
+
+
+class KeywordMatcher:
+    """Компілює кілька словників ключових слів в один регулярний вираз
+
+    Словники мають вигляд {група: {ключове_слово: значення}}. Один виклик
+    scan() знаходить входження всіх слів з усіх словників за один прохід.
+
+    З normalize (наприклад, stemmer.normalize) ключові слова і текст
+    зводяться до основ, і ключове слово шукається лише цілими словами
+    тексту: інакше коротка основа знаходилася б усередині чи на початку
+    інших слів ("вод" у "водій").
+    """
+
+    def __init__(self, vocabularies: Dict[str, Dict[str, Any]],
+                 normalize: Optional[Callable[[str], str]] = None):
+        self.normalize = normalize
+        targets: Dict[str, list] = {}
+        for group, keywords in vocabularies.items():
+            for keyword, value in keywords.items():
+                if normalize is not None:
+                    keyword = normalize(keyword)
+                targets.setdefault(keyword, []).append((group, value))
+
+        # Regex поглинає знайдене слово, тому слова, що перетинаються кінцем
+        # одного з початком іншого, додаємо як склеєні пари
+        words = set(targets)
+        for first in targets:
+            for second in targets:
+                if first == second or second in first:
+                    continue
+                for overlap in range(min(len(first), len(second)) - 1, 0, -1):
+                    if first.endswith(second[:overlap]):
+                        words.add(first + second[overlap:])
+                        break
+
+        # Кожне слово розгортається в усі ключові слова, що містяться в ньому
+        self._expansions = {}
+        for word in words:
+            expansion = {}
+            for keyword, keyword_targets in targets.items():
+                if keyword in word:
+                    for group, value in keyword_targets:
+                        expansion.setdefault(group, []).append(value)
+            self._expansions[word] = {group: tuple(values)
+                                      for group, values in expansion.items()}
+
+        pattern = _trie_pattern(words)
+        if normalize is not None:
+            pattern = r'(?<!\S)' + pattern + r'(?!\S)'
+        self._pattern = re.compile(pattern)
+
+    def scan(self, text_lower: str) -> KeywordHits:
+        """Знаходить усі ключові слова за один прохід"""
+        if self.normalize is not None:
+            text_lower = self.normalize(text_lower)
+        return KeywordHits(text_lower, self._pattern.findall(text_lower),
+                           self._expansions)
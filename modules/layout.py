@@ -0,0 +1,40 @@
+"""Шляхи до документів Firestore
+
+Дані кожного користувача лежать під його документом і розбиті по днях:
+
+    users/{user_id}                              профіль і налаштування
+    users/{user_id}/days/{YYYY-MM-DD}            денний агрегат
+    users/{user_id}/days/{YYYY-MM-DD}/activities/{id}   активності дня
+
+Стара плоска колекція activities читається лише як резервне джерело для
+користувачів без прапорця layout_migrated у профілі. Прапорець ставиться
+новим користувачам і всім після завершення `python manage.py migrate-layout`.
+Колекція
+write_batches містить маркери вже записаних пакетів активностей.
+"""
+from google.cloud.firestore import AsyncClient
+
+USERS_COLLECTION = 'users'
+DAYS_COLLECTION = 'days'
+ACTIVITIES_COLLECTION = 'activities'
+# Плоска колекція попереднього формату
+LEGACY_ACTIVITIES_COLLECTION = 'activities'
+WRITE_MARKERS_COLLECTION = 'write_batches'
+# Поле профілю: усі активності користувача вже в users/{id}/days
+LAYOUT_MIGRATED_FIELD = 'layout_migrated'
+
+
+def user_ref(db: AsyncClient, user_id: str):
+    return db.collection(USERS_COLLECTION).document(str(user_id))
+
+
+def days_ref(db: AsyncClient, user_id: str):
+    return user_ref(db, user_id).collection(DAYS_COLLECTION)
+
+
+def day_ref(db: AsyncClient, user_id: str, day: str):
+    return days_ref(db, user_id).document(day)
+
+
+def day_activities_ref(db: AsyncClient, user_id: str, day: str):
+    return day_ref(db, user_id, day).collection(ACTIVITIES_COLLECTION)
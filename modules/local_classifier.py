@@ -0,0 +1,128 @@
+"""Локальний класифікатор типу активності за історією користувачів
+
+Мультиноміальний наївний Баєс на символьних n-грамах слів: n-грами
+стійкі до відмінків і друкарських помилок, а модель навчається за один
+прохід по історії і важить кілька мегабайт. Навчання -
+`python manage.py train-classifier`, модель зберігається у JSON.
+"""
+import json
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+WORD_RE = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*")
+NGRAM_SIZES = (3, 4)
+# Тип, який AI чи fallback ставить невпізнаним текстам, моделі не потрібен:
+# невпевнений прогноз і так іде до AI
+IGNORED_TYPES = {'other'}
+# Джерела типу активності (поле source), яким можна вчити модель: прогнози
+# самої моделі, зокрема невпевнені з local_fallback, лише закріпили б її помилки
+TRAINING_SOURCES = {'keyword', 'ai', 'cache'}
+
+
+def features(text: str) -> Dict[str, int]:
+    """Частоти символьних n-грам слів тексту, слова обрамлені пробілами"""
+    counts: Dict[str, int] = {}
+    for word in WORD_RE.findall(text.lower()):
+        padded = f' {word} '
+        for size in NGRAM_SIZES:
+            for start in range(max(len(padded) - size + 1, 1)):
+                gram = padded[start:start + size]
+                counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+class NaiveBayesClassifier:
+    """Класифікатор з логарифмами ймовірностей n-грам для кожного типу"""
+
+    def __init__(self, labels: List[str], class_log_priors: List[float],
+                 feature_log_probs: Dict[str, List[float]]):
+        self.labels = labels
+        self.class_log_priors = class_log_priors
+        # n-грами поза словником моделі під час прогнозу пропускаються
+        self.feature_log_probs = feature_log_probs
+
+    @classmethod
+    def fit(cls, samples: Iterable[Tuple[str, str]], alpha: float = 0.1,
+            min_count: int = 2) -> 'NaiveBayesClassifier':
+        """Навчає модель на парах (текст, тип)
+
+        n-грами, що зустрілися менше min_count разів, відкидаються: вони
+        майже не впливають на точність, а модель без них у рази менша.
+        """
+        class_counts: Dict[str, int] = {}
+        counts: Dict[str, Dict[str, int]] = {}
+        for text, label in samples:
+            if not text or not label or label in IGNORED_TYPES:
+                continue
+            class_counts[label] = class_counts.get(label, 0) + 1
+            for gram, count in features(text).items():
+                per_label = counts.setdefault(gram, {})
+                per_label[label] = per_label.get(label, 0) + count
+        if not class_counts:
+            raise ValueError("Немає прикладів для навчання")
+
+        labels = sorted(class_counts)
+        vocabulary = {gram: per_label for gram, per_label in counts.items()
+                      if sum(per_label.values()) >= min_count}
+        totals = {label: 0 for label in labels}
+        for per_label in vocabulary.values():
+            for label, count in per_label.items():
+                totals[label] += count
+
+        size = len(vocabulary)
+        denominators = [math.log(totals[label] + alpha * size) for label in labels]
+        samples_total = sum(class_counts.values())
+        return cls(
+            labels,
+            [math.log(class_counts[label] / samples_total) for label in labels],
+            {gram: [round(math.log(per_label.get(label, 0) + alpha) - denominator, 4)
+                    for label, denominator in zip(labels, denominators)]
+             for gram, per_label in vocabulary.items()})
+
+    def predict(self, text: str) -> Optional[Tuple[str, float]]:
+        """(тип, ймовірність) або None, якщо в тексті немає відомих n-грам"""
+        scores = list(self.class_log_priors)
+        known = False
+        for gram, count in features(text).items():
+            log_probs = self.feature_log_probs.get(gram)
+            if log_probs is None:
+                continue
+            known = True
+            for index, log_prob in enumerate(log_probs):
+                scores[index] += count * log_prob
+        if not known:
+            return None
+
+        best = max(range(len(scores)), key=scores.__getitem__)
+        # softmax лише для ймовірності найкращого типу
+        total = sum(math.exp(score - scores[best]) for score in scores)
+        return self.labels[best], 1.0 / total
+
+    def to_dict(self) -> Dict:
+        return {
+            'labels': self.labels,
+            'class_log_priors': self.class_log_priors,
+            'feature_log_probs': self.feature_log_probs,
+        }
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: str) -> 'NaiveBayesClassifier':
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        return cls(data['labels'], data['class_log_priors'],
+                   data['feature_log_probs'])
+
+
+def load_classifier(path: str) -> Optional[NaiveBayesClassifier]:
+    """Модель з файлу або None, якщо шлях порожній чи модель ще не навчена"""
+    if not path:
+        return None
+    try:
+        return NaiveBayesClassifier.load(path)
+    except FileNotFoundError:
+        return None
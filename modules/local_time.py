@@ -0,0 +1,28 @@
+"""Місцевий час користувача за його налаштуваннями
+
+Дата активності (поле date) - це день у поясі користувача, тож і "сьогодні"
+для /stats, /summary чи /analytics береться в тому ж поясі, а не за
+годинником сервера.
+"""
+from datetime import date, datetime
+from typing import Dict, Optional
+
+import pytz
+
+from config import DEFAULT_TIMEZONE
+
+# Пояс, у якому день починається найпізніше: його "сьогодні" не пізніше
+# за "сьогодні" будь-якого користувача
+LATEST_TIMEZONE = 'Etc/GMT+12'
+
+
+def user_timezone(settings: Optional[Dict]):
+    """Пояс з settings.timezone; DEFAULT_TIMEZONE, якщо його не задано чи він невідомий"""
+    timezone = (settings or {}).get('timezone')
+    return pytz.timezone(timezone if timezone in pytz.all_timezones_set
+                         else DEFAULT_TIMEZONE)
+
+
+def local_today(settings: Optional[Dict]) -> date:
+    """Сьогоднішня дата в поясі користувача"""
+    return datetime.now(user_timezone(settings)).date()
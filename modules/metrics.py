@@ -0,0 +1,319 @@
+"""Метрики бота у текстовому форматі Prometheus
+
+Лічильники і гістограми тут мінімальні й без зовнішніх залежностей:
+запис на гарячому шляху - це пошук у словнику і кілька додавань.
+Стан компонентів (черги, кеші) не дублюється в метриках, а читається з
+їхніх stats() у момент запиту /metrics через Registry.add_stats().
+"""
+import asyncio
+import functools
+import logging
+import math
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import SkipHandler
+from aiohttp import web
+
+from modules.profiler import SamplingProfiler
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Секунди: від швидких попадань у кеш до повільних запитів до AI
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...],
+            extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}',
+                f'# TYPE {self.name} {self.type}']
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        return [f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+                for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # На кожен набір міток: [лічильники кошиків (+Inf останній), сума]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def time(self, **labels) -> '_Timer':
+        """Контекстний менеджер, що записує тривалість блоку"""
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                bucket = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket'
+                             f'{_labels(self.labelnames, key, bucket)} {cumulative}')
+            labels = _labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_number(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, Any]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Registry:
+    """Набір метрик і джерел stats(), що віддаються одним текстом"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._stats: List[Tuple[str, Callable[[], dict]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} вже зареєстрована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str,
+                labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_stats(self, prefix: str, stats: Callable[[], dict]):
+        """Числові поля stats() компонента як gauge {prefix}_{поле}
+
+        Списки стають серіями з міткою index, булеві значення - 0 або 1.
+        """
+        self._stats.append((prefix, stats))
+
+    def _render_stats(self, prefix: str, stats: Callable[[], dict]) -> List[str]:
+        try:
+            values = stats()
+        except Exception as e:
+            logger.warning(f"Не вдалося прочитати stats() для {prefix}: {e!r}")
+            return []
+        lines = []
+        for field, value in values.items():
+            name = f'{prefix}_{field}'
+            if isinstance(value, (list, tuple)):
+                samples = [(f'{{index="{index}"}}', item)
+                           for index, item in enumerate(value)]
+            else:
+                samples = [('', value)]
+            samples = [(labels, float(item)) for labels, item in samples
+                       if isinstance(item, (int, float))]
+            if not samples:
+                continue
+            lines.append(f'# TYPE {name} gauge')
+            lines.extend(f'{name}{labels} {_number(item)}' for labels, item in samples)
+        return lines
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        for prefix, stats in self._stats:
+            lines.extend(self._render_stats(prefix, stats))
+        return '\n'.join(lines) + '\n'
+
+
+def timed(histogram: Histogram, **labels):
+    """Декоратор корутини, що записує тривалість кожного виклику"""
+    def decorator(function: Callable[..., Awaitable]):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, **labels)
+        return wrapper
+    return decorator
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.histogram(
+    'bot_handler_seconds', 'Тривалість обробників повідомлень', ['handler'])
+HANDLER_ERRORS = REGISTRY.counter(
+    'bot_handler_errors_total', 'Помилки в обробниках повідомлень', ['handler'])
+STORAGE_SECONDS = REGISTRY.histogram(
+    'bot_storage_operation_seconds', 'Тривалість операцій зі сховищем',
+    ['backend', 'operation'])
+CLASSIFICATIONS = REGISTRY.counter(
+    'bot_classifications_total',
+    'Класифікації активностей за джерелом: keyword, local, cache, ai, '
+    'local_fallback, fallback', ['source'])
+AI_ANALYZE_SECONDS = REGISTRY.histogram(
+    'bot_ai_analyze_seconds',
+    'Тривалість класифікації без ключових слів за джерелом результату',
+    ['source'])
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутрішній middleware: тривалість і помилки кожного обробника"""
+
+    async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+                       event: Any, data: Dict[str, Any]) -> Any:
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except SkipHandler:
+            raise
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, handler=name)
+
+
+def create_metrics_app(registry: Registry = REGISTRY,
+                       profiler: Optional[SamplingProfiler] = None,
+                       ready: Optional[Callable[[], bool]] = None) -> web.Application:
+    """GET /metrics, проби /health і /ready та, якщо передано profiler,
+    керування профілюванням
+
+    /health відповідає, поки процес живий, а /ready - лише коли ready()
+    повертає True, тобто після ініціалізації всіх залежностей.
+
+    POST /profile/start?interval=0.005 вмикає семплювання,
+    POST /profile/stop вимикає його, а GET /profile повертає зібрані стеки
+    у форматі collapsed stacks (для flamegraph.pl або speedscope).
+    """
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode(),
+                            headers={'Content-Type': CONTENT_TYPE})
+
+    async def health(request: web.Request) -> web.Response:
+        return web.Response(text='ok')
+
+    async def readiness(request: web.Request) -> web.Response:
+        if ready is not None and not ready():
+            return web.Response(status=503, text='starting')
+        return web.Response(text='ready')
+
+    app = web.Application()
+    app.router.add_get('/metrics', metrics)
+    app.router.add_get('/health', health)
+    app.router.add_get('/ready', readiness)
+    if profiler is None:
+        return app
+
+    async def profile_start(request: web.Request) -> web.Response:
+        try:
+            interval = float(request.query.get('interval', profiler.interval))
+        except ValueError:
+            return web.Response(status=400, text='interval має бути числом')
+        profiler.start(interval)
+        return web.json_response(profiler.stats())
+
+    async def profile_stop(request: web.Request) -> web.Response:
+        profiler.stop()
+        return web.json_response(profiler.stats())
+
+    async def profile(request: web.Request) -> web.Response:
+        try:
+            limit = int(request.query.get('limit', 0))
+        except ValueError:
+            return web.Response(status=400, text='limit має бути цілим')
+        text = await asyncio.to_thread(profiler.collapsed, limit or None)
+        return web.Response(text=text)
+
+    app.router.add_post('/profile/start', profile_start)
+    app.router.add_post('/profile/stop', profile_stop)
+    app.router.add_get('/profile', profile)
+    return app
+
+
+async def start_metrics_server(host: str, port: int, registry: Registry = REGISTRY,
+                               profiler: Optional[SamplingProfiler] = None,
+                               ready: Optional[Callable[[], bool]] = None
+                               ) -> web.AppRunner:
+    runner = web.AppRunner(create_metrics_app(registry, profiler, ready),
+                           access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики на http://{host}:{port}/metrics")
+    return runner
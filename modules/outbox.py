@@ -0,0 +1,157 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (TelegramBadRequest, TelegramForbiddenError,
+                                TelegramNetworkError, TelegramRetryAfter,
+                                TelegramServerError)
+
+from config import (OUTBOX_MAX_PENDING, TELEGRAM_CHAT_INTERVAL,
+                    TELEGRAM_GLOBAL_RATE)
+from modules.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class MessageOutbox:
+    """Черга вихідних повідомлень з лімітами Telegram
+
+    Загальна частота обмежена TokenBucket, а в один чат повідомлення йдуть
+    не частіше, ніж раз на chat_interval секунд. Повідомлення для чату, що
+    ще "остигає", відкладаються і не затримують інші чати. Після
+    retry_after відправка призупиняється для всіх чатів.
+    """
+
+    def __init__(self, bot: Bot, rate: float = TELEGRAM_GLOBAL_RATE,
+                 chat_interval: float = TELEGRAM_CHAT_INTERVAL,
+                 max_pending: int = OUTBOX_MAX_PENDING, max_retries: int = 3,
+                 max_concurrency: int = 10):
+        self.bot = bot
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate)
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        # Відкладені повідомлення: (час готовності, порядковий номер, повідомлення)
+        self._delayed = []
+        self._sequence = itertools.count()
+        self._next_allowed: Dict[int, float] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._sending = set()
+        # Повідомлення, яке цикл уже взяв, але ще не передав на відправку
+        self._holding = 0
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    async def send(self, chat_id: int, text: str, **kwargs):
+        """Ставить повідомлення в чергу; чекає, якщо черга переповнена"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        await self._queue.put({'chat_id': chat_id, 'text': text,
+                               'kwargs': kwargs, 'attempt': 0})
+
+    def _delay(self, message: dict, ready_at: float):
+        heapq.heappush(self._delayed, (ready_at, next(self._sequence), message))
+
+    async def _next_message(self) -> dict:
+        while True:
+            now = time.monotonic()
+            if self._delayed and self._delayed[0][0] <= now:
+                return heapq.heappop(self._delayed)[2]
+            # Повтори після помилок додаються у відкладені з задач відправки,
+            # тому черга перевіряється щонайменше раз на секунду
+            timeout = min(self._delayed[0][0] - now, 1.0) if self._delayed else 1.0
+            try:
+                return await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                continue
+
+    async def _run(self):
+        while True:
+            message = await self._next_message()
+            chat_id = message['chat_id']
+            now = time.monotonic()
+            ready_at = self._next_allowed.get(chat_id, 0.0)
+            if ready_at > now:
+                self._delay(message, ready_at)
+                continue
+
+            self._holding = 1
+            await self.bucket.acquire()
+            self._next_allowed[chat_id] = time.monotonic() + self.chat_interval
+            if len(self._next_allowed) > 10000:
+                self._prune(time.monotonic())
+
+            await self._semaphore.acquire()
+            task = asyncio.create_task(self._deliver(message))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+            self._holding = 0
+
+    def _prune(self, now: float):
+        self._next_allowed = {chat_id: ready_at for chat_id, ready_at
+                              in self._next_allowed.items() if ready_at > now}
+
+    async def _deliver(self, message: dict):
+        try:
+            await self.bot.send_message(message['chat_id'], message['text'],
+                                        **message['kwargs'])
+            self.sent += 1
+        except TelegramRetryAfter as e:
+            logger.warning(f"Telegram просить зачекати {e.retry_after} с")
+            self.bucket.pause(e.retry_after)
+            self._retry(message, e.retry_after)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Користувач заблокував бота або чат недоступний
+            self.failed += 1
+            logger.info(f"Повідомлення в чат {message['chat_id']} не доставлено: {e}")
+        except (TelegramNetworkError, TelegramServerError) as e:
+            logger.warning(f"Помилка відправки в чат {message['chat_id']}: {e!r}")
+            self._retry(message, 2 ** message['attempt'])
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Неочікувана помилка відправки: {e!r}")
+        finally:
+            self._semaphore.release()
+
+    def _retry(self, message: dict, delay: float):
+        if message['attempt'] >= self.max_retries:
+            self.failed += 1
+            logger.error(f"Повідомлення в чат {message['chat_id']} не доставлено "
+                         f"після {self.max_retries} повторів")
+            return
+        message['attempt'] += 1
+        self.retried += 1
+        self._delay(message, time.monotonic() + delay)
+
+    @property
+    def pending(self) -> int:
+        return (self._queue.qsize() + len(self._delayed) + len(self._sending)
+                + self._holding)
+
+    def stats(self) -> dict:
+        return {
+            'pending': self.pending,
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+        }
+
+    async def close(self, timeout: float = 30.0):
+        """Дочікується відправки черги (не довше timeout) і зупиняється"""
+        if self._task is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self.pending:
+            logger.error(f"Не відправлено повідомлень: {self.pending}")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        await asyncio.gather(*self._sending, return_exceptions=True)
+        self._task = None
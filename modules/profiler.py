@@ -0,0 +1,88 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+
+class SamplingProfiler:
+    """Семплюючий профайлер головного потоку, який вмикається на ходу
+
+    Окремий потік кожні interval секунд читає поточний стек потоку з
+    event loop і рахує однакові стеки. Поки профайлер вимкнено, він нічого
+    не коштує. Стек циклу подій, що чекає на select, теж потрапляє у
+    вибірку, тому частка простою видна поруч із гарячими корутинами.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._thread_id = threading.main_thread().ident
+        self._samples = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at = 0.0
+        self.duration = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval: Optional[float] = None):
+        """Починає нову вибірку; попередні стеки відкидаються"""
+        if self.running:
+            return
+        if interval is not None:
+            self.interval = max(interval, 0.001)
+        with self._lock:
+            self._samples.clear()
+        self._stop.clear()
+        self.started_at = time.monotonic()
+        self.duration = 0.0
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.duration = time.monotonic() - self.started_at
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:'
+                             f'{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            # collapsed stacks: від кореня до листа через крапку з комою
+            key = ';'.join(reversed(stack))
+            with self._lock:
+                self._samples[key] += 1
+
+    def collapsed(self, limit: Optional[int] = None) -> str:
+        """Стеки у форматі collapsed stacks, найчастіші першими"""
+        with self._lock:
+            samples = self._samples.most_common(limit)
+        return ''.join(f'{stack} {count}\n' for stack, count in samples)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self._samples.values())
+        return {
+            'running': self.running,
+            'interval': self.interval,
+            'samples': total,
+            'stacks': len(self._samples),
+            'seconds': (time.monotonic() - self.started_at if self.running
+                        else self.duration),
+        }
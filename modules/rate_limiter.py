@@ -0,0 +1,44 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Обмеження частоти: rate токенів за секунду, запас до capacity
+
+    pause() зупиняє видачу токенів, наприклад, після відповіді Telegram
+    з retry_after.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        # Після паузи відправка відновлюється плавно, без накопиченого запасу
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+    async def acquire(self):
+        """Чекає, поки з'явиться токен; черговість очікувачів зберігається"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
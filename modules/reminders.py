@@ -0,0 +1,269 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import pytz
+
+from config import (DEFAULT_REMINDER_INTERVAL, DEFAULT_TIMEZONE,
+                    REMINDER_ACTIVE_DAYS, REMINDER_QUIET_HOURS,
+                    REMINDER_SAVE_INTERVAL)
+from modules.outbox import MessageOutbox
+
+logger = logging.getLogger(__name__)
+
+REMINDER_TEXT = "⏰ Що ти зараз робиш? Напиши, і я запишу активність."
+STATE_VERSION = 1
+
+
+class _Schedule:
+    __slots__ = ('next_fire', 'last_activity', 'interval', 'timezone')
+
+    def __init__(self, next_fire: float, last_activity: float,
+                 interval: Optional[float], timezone: Optional[str]):
+        self.next_fire = next_fire
+        self.last_activity = last_activity
+        # None - налаштування користувача ще не завантажено
+        self.interval = interval
+        self.timezone = timezone
+
+
+class ReminderEngine:
+    """Нагадування всім користувачам з однієї купи таймерів
+
+    Купа містить пари (час спрацювання, user_id), а один цикл спить до
+    найближчого з них. Нова активність лише оновлює час останньої
+    активності, без операцій з купою: коли запис спрацьовує, а користувач
+    був активний нещодавно, запис просто переноситься. Налаштування
+    (reminder_interval у хвилинах, timezone) завантажуються ліниво, коли
+    вони вперше потрібні. Користувачі, неактивні довше active_days,
+    випадають із розкладу до наступного повідомлення. Стан зберігається у
+    JSON файл, тож після перезапуску розклад відновлюється без запитів.
+    """
+
+    def __init__(self, outbox: MessageOutbox,
+                 load_settings: Callable[[str], Awaitable[Optional[Dict]]],
+                 state_path: str = '',
+                 save_interval: float = REMINDER_SAVE_INTERVAL,
+                 active_days: float = REMINDER_ACTIVE_DAYS,
+                 quiet_hours: Tuple[int, int] = REMINDER_QUIET_HOURS,
+                 max_batch: int = 500):
+        self.outbox = outbox
+        self.load_settings = load_settings
+        self.state_path = state_path
+        self.save_interval = save_interval
+        self.active_seconds = active_days * 24 * 3600
+        self.quiet_hours = quiet_hours
+        self.max_batch = max_batch
+        self._schedules: Dict[str, _Schedule] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.postponed = 0
+        self.dropped = 0
+
+    def _push(self, user_id: str, schedule: _Schedule, fire_at: float):
+        schedule.next_fire = fire_at
+        heapq.heappush(self._heap, (fire_at, user_id))
+        self._dirty = True
+
+    def record_activity(self, user_id: str, at: Optional[float] = None):
+        """Позначає активність користувача; O(1) для вже відомих"""
+        user_id = str(user_id)
+        at = at if at is not None else time.time()
+        schedule = self._schedules.get(user_id)
+        if schedule is None:
+            schedule = self._schedules[user_id] = _Schedule(0.0, at, None, None)
+            self._push(user_id, schedule, at + DEFAULT_REMINDER_INTERVAL * 60)
+        else:
+            schedule.last_activity = max(schedule.last_activity, at)
+            self._dirty = True
+
+    def update_settings(self, user_id: str, settings: Dict):
+        """Застосовує нові reminder_interval і timezone для відомого користувача"""
+        schedule = self._schedules.get(str(user_id))
+        if schedule is None:
+            return
+        if 'reminder_interval' in settings:
+            schedule.interval = self._interval(settings)
+            # Менший інтервал має спрацювати раніше вже запланованого
+            if schedule.interval:
+                fire_at = schedule.last_activity + schedule.interval
+                if fire_at < schedule.next_fire:
+                    self._push(str(user_id), schedule, fire_at)
+        if 'timezone' in settings:
+            schedule.timezone = settings['timezone']
+        self._dirty = True
+
+    @staticmethod
+    def _interval(settings: Dict) -> float:
+        """Інтервал у секундах; 0 вимикає нагадування"""
+        try:
+            minutes = float(settings.get('reminder_interval', DEFAULT_REMINDER_INTERVAL))
+        except (TypeError, ValueError):
+            minutes = DEFAULT_REMINDER_INTERVAL
+        return max(minutes, 0.0) * 60
+
+    def _quiet_until(self, schedule: _Schedule, now: float) -> Optional[float]:
+        """Кінець тихих годин за місцевим часом або None, якщо зараз не ніч"""
+        start, end = self.quiet_hours
+        if start == end:
+            return None
+        try:
+            timezone = pytz.timezone(schedule.timezone or DEFAULT_TIMEZONE)
+        except pytz.UnknownTimeZoneError:
+            timezone = pytz.timezone(DEFAULT_TIMEZONE)
+        local = datetime.fromtimestamp(now, timezone)
+        quiet = (start <= local.hour or local.hour < end) if start > end \
+            else start <= local.hour < end
+        if not quiet:
+            return None
+        wake = local.replace(hour=end, minute=0, second=0, microsecond=0,
+                             tzinfo=None)
+        if local.hour >= end:
+            wake += timedelta(days=1)
+        return timezone.localize(wake).timestamp()
+
+    async def _fire_due(self, now: float):
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.max_batch:
+            fire_at, user_id = heapq.heappop(self._heap)
+            schedule = self._schedules.get(user_id)
+            # Застарілий запис: користувача перенесли або видалили
+            if schedule is not None and schedule.next_fire == fire_at:
+                due.append((user_id, schedule))
+        if not due:
+            return
+
+        unknown = [(user_id, schedule) for user_id, schedule in due
+                   if schedule.interval is None]
+        if unknown:
+            loaded = await asyncio.gather(
+                *(self.load_settings(user_id) for user_id, _ in unknown),
+                return_exceptions=True)
+            for (user_id, schedule), settings in zip(unknown, loaded):
+                if isinstance(settings, Exception):
+                    logger.warning(f"Не вдалося завантажити налаштування {user_id}: "
+                                   f"{settings!r}")
+                    settings = None
+                settings = settings or {}
+                schedule.interval = self._interval(settings)
+                schedule.timezone = settings.get('timezone')
+
+        for user_id, schedule in due:
+            if not schedule.interval or now - schedule.last_activity > self.active_seconds:
+                del self._schedules[user_id]
+                self.dropped += 1
+                self._dirty = True
+                continue
+
+            since_activity = schedule.last_activity + schedule.interval
+            if since_activity > now:
+                # Користувач писав нещодавно - нагадування не потрібне
+                self._push(user_id, schedule, since_activity)
+                self.postponed += 1
+                continue
+
+            quiet_until = self._quiet_until(schedule, now)
+            if quiet_until is not None:
+                self._push(user_id, schedule, quiet_until)
+                self.postponed += 1
+                continue
+
+            self._push(user_id, schedule, now + schedule.interval)
+            await self.outbox.send(int(user_id), REMINDER_TEXT)
+            self.sent += 1
+
+        # Купа з лінивим видаленням: прибираємо застарілі записи
+        if len(self._heap) > 2 * len(self._schedules) + 1000:
+            self._heap = [(schedule.next_fire, user_id)
+                          for user_id, schedule in self._schedules.items()]
+            heapq.heapify(self._heap)
+
+    def load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path) as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError) as e:
+            logger.error(f"Не вдалося прочитати стан нагадувань: {e!r}")
+            return
+        if state.get('version') != STATE_VERSION:
+            return
+
+        for user_id, (next_fire, last_activity, interval, timezone) \
+                in state.get('users', {}).items():
+            self._schedules[user_id] = _Schedule(next_fire, last_activity,
+                                                 interval, timezone)
+        self._heap = [(schedule.next_fire, user_id)
+                      for user_id, schedule in self._schedules.items()]
+        heapq.heapify(self._heap)
+        logger.info(f"Відновлено розклад нагадувань: {len(self._schedules)} користувачів")
+
+    async def save_state(self):
+        """Знімок стану в циклі подій, серіалізація і запис - в окремому потоці"""
+        if not self.state_path or not self._dirty:
+            return
+        users = {user_id: (schedule.next_fire, schedule.last_activity,
+                           schedule.interval, schedule.timezone)
+                 for user_id, schedule in self._schedules.items()}
+        self._dirty = False
+        await asyncio.to_thread(self._write_state, users)
+
+    def _write_state(self, users: Dict):
+        temporary = f'{self.state_path}.tmp'
+        with open(temporary, 'w') as state_file:
+            json.dump({'version': STATE_VERSION, 'users': users}, state_file,
+                      separators=(',', ':'))
+        os.replace(temporary, self.state_path)
+
+    async def _run(self):
+        next_save = time.monotonic() + self.save_interval
+        while True:
+            now = time.time()
+            try:
+                await self._fire_due(now)
+            except Exception as e:
+                logger.error(f"Помилка надсилання нагадувань: {e!r}")
+
+            if time.monotonic() >= next_save:
+                next_save = time.monotonic() + self.save_interval
+                try:
+                    await self.save_state()
+                except Exception as e:
+                    logger.error(f"Не вдалося зберегти стан нагадувань: {e!r}")
+                    self._dirty = True
+
+            if self._heap and self._heap[0][0] <= time.time():
+                continue
+            # Нові записи з'являються не раніше ніж через інтервал, тому
+            # короткого обмеження сну достатньо замість окремого пробудження
+            delay = min(self._heap[0][0] - time.time(), 30.0) if self._heap else 30.0
+            await asyncio.sleep(max(delay, 0.0))
+
+    def start(self):
+        if self._task is None:
+            self.load_state()
+            self._task = asyncio.create_task(self._run())
+
+    def stats(self) -> dict:
+        return {
+            'users': len(self._schedules),
+            'heap': len(self._heap),
+            'sent': self.sent,
+            'postponed': self.postponed,
+            'dropped': self.dropped,
+        }
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await self.save_state()
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import uuid
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from config import WRITE_FLUSH_INTERVAL, WRITE_BUFFER_MAX_PENDING
+from modules.repository import FIRST_DAY, LAST_DAY, Repository
+from modules.write_buffer import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+# Позначка в профілі primary: історію користувача вже скопійовано з репліки
+HISTORY_COPIED_FIELD = 'history_copied'
+
+
+class ReplicatedRepository(Repository):
+    """Локальне основне сховище з асинхронною реплікацією в репліку
+
+    Читання і запис виконуються в primary (наприклад, SQLite), а зміни у
+    фоні пакетами передаються в replica (наприклад, Firestore). Активності
+    мають ідентифікатори від клієнта, тому повторна реплікація не створює
+    дублікатів документів. Агрегати при повторі не подвоюються, лише якщо
+    replica відкидає вже записаний пакет: SQLite - за id активності,
+    Firestore - за маркером пакета (FirestoreRepository._commit_chunk).
+    Для інших сховищ агрегати репліки можна перебудувати командою
+    `python manage.py backfill-aggregates`.
+
+    Історія користувачів, що з'явилися до переходу на primary, лежить лише
+    в репліці. При першому зверненні до такого користувача його активності
+    у фоні копіюються в primary (агрегати primary перебудовує сам), а доки
+    копіювання не завершене, агрегати й активності читаються з репліки.
+    """
+
+    def __init__(self, primary: Repository, replica: Repository,
+                 max_batch: int = 250):
+        self.primary = primary
+        self.replica = replica
+        self._outbox = WriteBehindBuffer(self._replicate,
+                                         max_batch=max_batch,
+                                         flush_interval=WRITE_FLUSH_INTERVAL,
+                                         max_pending=WRITE_BUFFER_MAX_PENDING)
+        # Користувачі, чия історія вже є в primary, і незавершені копіювання
+        self._copied = set()
+        self._copying: Dict[str, asyncio.Task] = {}
+
+    async def get_user(self, user_id: str) -> Optional[Dict]:
+        user = await self.primary.get_user(user_id)
+        if user is None:
+            # Користувач, що з'явився до переходу на локальне сховище
+            user = await self.replica.get_user(user_id)
+            if user is not None:
+                await self.primary.create_user(user_id, user)
+        if user is not None and not user.get(HISTORY_COPIED_FIELD):
+            self._start_copy(user_id)
+        return user
+
+    async def create_user(self, user_id: str, user_data: Dict):
+        # У нового користувача немає історії в репліці, копіювати нічого
+        await self.primary.create_user(user_id, {**user_data, HISTORY_COPIED_FIELD: True})
+        self._copied.add(user_id)
+        await self._outbox.add(('user', user_id, user_data))
+
+    async def update_user_settings(self, user_id: str, settings: Dict):
+        await self.primary.update_user_settings(user_id, settings)
+        await self._outbox.add(('settings', user_id, settings))
+
+    async def add_activities(self, activity_docs: List[Dict]):
+        activity_docs = [doc if doc.get('id') else {**doc, 'id': uuid.uuid4().hex}
+                         for doc in activity_docs]
+        await self.primary.add_activities(activity_docs)
+        for activity_doc in activity_docs:
+            await self._outbox.add(('activity', activity_doc))
+
+    async def get_daily_aggregates(self, user_id: str,
+                                   days: Iterable[str]) -> Dict[str, Dict]:
+        source = await self._history_source(user_id)
+        return await source.get_daily_aggregates(user_id, days)
+
+    async def get_daily_aggregates_bulk(
+            self, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict]:
+        keys = list(keys)
+        copied = {user_id for user_id in {user_id for user_id, _ in keys}
+                  if await self._history_source(user_id) is self.primary}
+        found = await self.primary.get_daily_aggregates_bulk(
+            [key for key in keys if key[0] in copied])
+        pending = [key for key in keys if key[0] not in copied]
+        if pending:
+            found.update(await self.replica.get_daily_aggregates_bulk(pending))
+        return found
+
+    def iter_users(self, fields: Optional[List[str]] = None
+                   ) -> AsyncIterator[Tuple[str, Dict]]:
+        return self.primary.iter_users(fields)
+
+    async def iter_activities(self, user_id: str, start_day: str, end_day: str,
+                              fields: Optional[List[str]] = None) -> AsyncIterator[Dict]:
+        source = await self._history_source(user_id)
+        async for activity in source.iter_activities(user_id, start_day, end_day, fields):
+            yield activity
+
+    async def _history_source(self, user_id: str) -> Repository:
+        """primary, якщо історію користувача вже скопійовано, інакше replica"""
+        user_id = str(user_id)
+        if user_id in self._copied:
+            return self.primary
+        user = await self.primary.get_user(user_id)
+        if user is not None and user.get(HISTORY_COPIED_FIELD):
+            self._copied.add(user_id)
+            return self.primary
+        return self.replica
+
+    def _start_copy(self, user_id: str):
+        if user_id in self._copied or user_id in self._copying:
+            return
+        task = asyncio.create_task(self.copy_history(user_id))
+        self._copying[user_id] = task
+        task.add_done_callback(lambda _: self._copying.pop(user_id, None))
+
+    async def copy_history(self, user_id: str, chunk_size: int = 500):
+        """Копіює активності користувача з репліки в primary
+
+        primary ігнорує вже записані id, тож нові активності, збережені під
+        час копіювання, і повторний запуск після збою не дублюються.
+        Позначка HISTORY_COPIED_FIELD ставиться лише після всієї історії.
+        """
+        user_id = str(user_id)
+        try:
+            copied = 0
+            chunk = []
+            async for activity in self.replica.iter_activities(user_id, FIRST_DAY, LAST_DAY):
+                chunk.append({**activity, 'user_id': user_id})
+                if len(chunk) >= chunk_size:
+                    await self.primary.add_activities(chunk)
+                    copied += len(chunk)
+                    chunk = []
+            if chunk:
+                await self.primary.add_activities(chunk)
+                copied += len(chunk)
+
+            user = await self.primary.get_user(user_id)
+            if user is not None:
+                await self.primary.create_user(user_id, {**user, HISTORY_COPIED_FIELD: True})
+            self._copied.add(user_id)
+            logger.info(f"Історію користувача {user_id} скопійовано з репліки: "
+                        f"{copied} активностей")
+        except Exception as e:
+            # Наступне звернення до користувача запустить копіювання знову
+            logger.error(f"Не вдалося скопіювати історію користувача {user_id}: {e}")
+
+    async def _replicate(self, operations: List[tuple]):
+        """Застосовує операції до репліки в порядку надходження
+
+        Сусідні активності об'єднуються в один виклик add_activities.
+        """
+        activities = []
+        for operation in operations:
+            if operation[0] == 'activity':
+                activities.append(operation[1])
+                continue
+
+            if activities:
+                await self.replica.add_activities(activities)
+                activities = []
+
+            kind, user_id, payload = operation
+            if kind == 'user':
+                await self.replica.create_user(user_id, payload)
+            elif kind == 'settings':
+                await self.replica.update_user_settings(user_id, payload)
+
+        if activities:
+            await self.replica.add_activities(activities)
+
+    def stats(self) -> dict:
+        return {'replication': self._outbox.stats(),
+                'history_copying': len(self._copying)}
+
+    async def close(self):
+        """Дописує чергу реплікації і закриває обидва сховища"""
+        if self._copying:
+            await asyncio.gather(*self._copying.values(), return_exceptions=True)
+        await self._outbox.close()
+        await self.primary.close()
+        await self.replica.close()
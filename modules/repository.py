@@ -0,0 +1,66 @@
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+# Увесь можливий діапазон дат для iter_activities
+FIRST_DAY, LAST_DAY = '0000-01-01', '9999-12-31'
+
+
+class Repository:
+    """Інтерфейс сховища користувачів, активностей і денних агрегатів
+
+    Активність - це словник з полями user_id, date (YYYY-MM-DD), timestamp,
+    type, subtype, details тощо, а також id, який задає клієнт, щоб запис
+    можна було безпечно повторити. Денний агрегат - словник з полями total,
+    types, subtypes, drinks, exercise_reps (див. modules.aggregates).
+    """
+
+    async def get_user(self, user_id: str) -> Optional[Dict]:
+        """Профіль користувача або None"""
+        raise NotImplementedError
+
+    async def create_user(self, user_id: str, user_data: Dict):
+        raise NotImplementedError
+
+    async def update_user_settings(self, user_id: str, settings: Dict):
+        """Оновлює лише передані ключі settings"""
+        raise NotImplementedError
+
+    async def add_activities(self, activity_docs: List[Dict]):
+        """Атомарно записує активності разом з оновленням денних агрегатів"""
+        raise NotImplementedError
+
+    async def get_daily_aggregates(self, user_id: str,
+                                   days: Iterable[str]) -> Dict[str, Dict]:
+        """Агрегати за вказані дні: {дата: агрегат}, лише для наявних днів"""
+        raise NotImplementedError
+
+    async def get_daily_aggregates_bulk(
+            self, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict]:
+        """Агрегати для багатьох пар (user_id, дата) якомога меншим числом запитів"""
+        by_user = {}
+        for user_id, day in keys:
+            by_user.setdefault(user_id, []).append(day)
+        found = {}
+        for user_id, days in by_user.items():
+            for day, aggregate in (await self.get_daily_aggregates(user_id, days)).items():
+                found[(user_id, day)] = aggregate
+        return found
+
+    def iter_users(self, fields: Optional[List[str]] = None
+                   ) -> AsyncIterator[Tuple[str, Dict]]:
+        """Посторінково повертає пари (user_id, профіль)
+
+        fields (зокрема вкладені, як 'settings.timezone') - підказка, які
+        поля потрібні; сховище може повернути й більше.
+        """
+        raise NotImplementedError
+
+    def iter_activities(self, user_id: str, start_day: str, end_day: str,
+                        fields: Optional[List[str]] = None) -> AsyncIterator[Dict]:
+        """Посторінково повертає активності за період, впорядковані за датою
+
+        fields обмежує набір полів верхнього рівня, які треба прочитати.
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        pass
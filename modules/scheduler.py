@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+
+class Shed(Exception):
+    """Оновлення відкинуто через перевантаження"""
+
+
+class UpdateScheduler:
+    """Черги FIFO для кожного користувача і спільний ліміт обробників
+
+    Одночасно виконується не більше max_concurrency задач і не більше однієї
+    задачі одного користувача, тому його повідомлення обробляються по черзі.
+    Користувачі з чергами обслуговуються по колу, по одній задачі за раз.
+    Відкладених задач не більше max_backlog (і max_user_backlog на одного
+    користувача); решту submit() відкидає одразу. Задачу, що чекала довше
+    max_wait секунд, теж відкинуто - відповідь на неї вже запізнилась.
+    """
+
+    def __init__(self, max_concurrency: int = 50, max_backlog: int = 1000,
+                 max_user_backlog: int = 20, max_wait: Optional[float] = None):
+        self.max_concurrency = max_concurrency
+        self.max_backlog = max_backlog
+        self.max_user_backlog = max_user_backlog
+        self.max_wait = max_wait
+        # Ключ присутній, поки в користувача є задачі в черзі або в роботі
+        self._queues: Dict[Hashable, deque] = {}
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._workers = []
+        self._drained: Optional[asyncio.Future] = None
+        self.backlog = 0
+        self.in_flight = 0
+        self.max_backlog_seen = 0
+        self.processed = 0
+        self.shed = 0
+        self.expired = 0
+
+    def submit(self, key: Hashable,
+               task: Callable[[], Awaitable[Any]]) -> Optional[asyncio.Future]:
+        """Ставить задачу в чергу користувача; None, якщо її відкинуто"""
+        queue = self._queues.get(key)
+        if (self.backlog >= self.max_backlog
+                or (queue is not None and len(queue) >= self.max_user_backlog)):
+            self.shed += 1
+            return None
+
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work())
+                             for _ in range(self.max_concurrency)]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._ready.put_nowait(key)
+        queue.append((future, task, loop.time()))
+        self.backlog += 1
+        self.max_backlog_seen = max(self.max_backlog_seen, self.backlog)
+        return future
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            key = await self._ready.get()
+            queue = self._queues[key]
+            future, task, enqueued_at = queue.popleft()
+            self.backlog -= 1
+
+            if self.max_wait is not None and loop.time() - enqueued_at > self.max_wait:
+                self.expired += 1
+                if not future.done():
+                    future.set_exception(Shed())
+            elif not future.done():
+                self.in_flight += 1
+                try:
+                    result = await task()
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    self.in_flight -= 1
+                    self.processed += 1
+
+            # Користувач стає в кінець черги, щоб інші не чекали на нього
+            if queue:
+                self._ready.put_nowait(key)
+            else:
+                del self._queues[key]
+                if not self._queues and self._drained is not None \
+                        and not self._drained.done():
+                    self._drained.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            'backlog': self.backlog,
+            'users_queued': len(self._queues),
+            'in_flight': self.in_flight,
+            'max_backlog_seen': self.max_backlog_seen,
+            'processed': self.processed,
+            'shed': self.shed,
+            'expired': self.expired,
+        }
+
+    async def close(self):
+        """Дочікується всіх поставлених задач і зупиняє обробників"""
+        if self._queues:
+            self._drained = asyncio.get_running_loop().create_future()
+            await self._drained
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+class SchedulerMiddleware(BaseMiddleware):
+    """Outer middleware, що пропускає оновлення через UpdateScheduler
+
+    on_shed викликається для відкинутих оновлень і має відповідати дешево,
+    без звернень до AI.
+    """
+
+    def __init__(self, scheduler: UpdateScheduler,
+                 on_shed: Callable[[Update, Dict[str, Any]], Awaitable[Any]]):
+        self.scheduler = scheduler
+        self.on_shed = on_shed
+
+    async def __call__(self, handler, event: Update, data: Dict[str, Any]) -> Any:
+        user = data.get('event_from_user')
+        chat = data.get('event_chat')
+        key = user.id if user else chat.id if chat else event.update_id
+
+        future = self.scheduler.submit(key, lambda: handler(event, data))
+        if future is not None:
+            try:
+                return await future
+            except Shed:
+                pass
+        logger.debug(f"Перевантаження, оновлення {event.update_id} відкинуто")
+        return await self.on_shed(event, data)
@@ -0,0 +1,50 @@
+from typing import Dict, Optional
+
+# Поля Update, у яких автор лежить у 'from' або 'user'
+_UPDATE_FIELDS = (
+    'message', 'edited_message', 'callback_query', 'inline_query',
+    'chosen_inline_result', 'shipping_query', 'pre_checkout_query',
+    'poll_answer', 'my_chat_member', 'chat_member', 'chat_join_request',
+    'channel_post', 'edited_channel_post',
+)
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping, Veach)
+
+    При зміні кількості шардів з n на n+1 переїжджає лише 1/(n+1) ключів.
+    """
+    if buckets <= 0:
+        raise ValueError("Кількість шардів має бути додатною")
+    key &= _MASK64
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & _MASK64
+        jump = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+
+def update_user_id(update: Dict) -> Optional[int]:
+    """Id автора з сирого JSON оновлення Telegram або None"""
+    for field in _UPDATE_FIELDS:
+        payload = update.get(field)
+        if not isinstance(payload, dict):
+            continue
+        author = payload.get('from') or payload.get('user')
+        if isinstance(author, dict) and 'id' in author:
+            return author['id']
+        chat = payload.get('chat')
+        if isinstance(chat, dict) and 'id' in chat:
+            return chat['id']
+    return None
+
+
+def shard_for_update(update: Dict, shards: int) -> int:
+    """Шард оновлення; усі оновлення одного користувача йдуть в один шард"""
+    key = update_user_id(update)
+    if key is None:
+        key = update.get('update_id', 0)
+    return jump_hash(key, shards)
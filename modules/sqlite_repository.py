@@ -0,0 +1,227 @@
+import asyncio
+import json
+import sqlite3
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from modules.aggregates import activity_increments, merge_increments
+from modules.metrics import STORAGE_SECONDS
+from modules.repository import Repository
+
+# Поля, які зберігаються як ISO рядки і відновлюються в datetime
+DATETIME_FIELDS = ('timestamp', 'created_at')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS activities (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_activities_user_date
+    ON activities (user_id, date, id);
+CREATE TABLE IF NOT EXISTS daily_aggregates (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, date)
+) WITHOUT ROWID;
+'''
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Непідтримуваний тип: {type(value).__name__}")
+
+
+def dumps(data: Dict) -> str:
+    return json.dumps(data, ensure_ascii=False, default=_encode)
+
+
+def loads(raw: str) -> Dict:
+    data = json.loads(raw)
+    for field in DATETIME_FIELDS:
+        value = data.get(field)
+        if isinstance(value, str):
+            try:
+                data[field] = datetime.fromisoformat(value)
+            except ValueError:
+                pass
+    return data
+
+
+class SqliteRepository(Repository):
+    """Локальне сховище у SQLite для роботи без хмари
+
+    Усі звернення до з'єднання йдуть через один окремий потік, тому event
+    loop не блокується, а SQLite працює зі своїм звичним з'єднанням.
+    """
+
+    def __init__(self, path: str, page_size: int = 500):
+        self.path = path
+        self.page_size = page_size
+        self._executor = ThreadPoolExecutor(max_workers=1,
+                                            thread_name_prefix='sqlite')
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor.submit(self._connect).result()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        self._conn = conn
+
+    async def _run(self, func, *args):
+        # Час включає очікування в черзі потоку SQLite
+        with STORAGE_SECONDS.time(backend='sqlite', operation=func.__name__.lstrip('_')):
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, func, *args)
+
+    async def get_user(self, user_id: str) -> Optional[Dict]:
+        return await self._run(self._get_user, str(user_id))
+
+    def _get_user(self, user_id: str) -> Optional[Dict]:
+        row = self._conn.execute('SELECT data FROM users WHERE user_id = ?',
+                                 (user_id,)).fetchone()
+        return loads(row[0]) if row else None
+
+    async def create_user(self, user_id: str, user_data: Dict):
+        await self._run(self._create_user, str(user_id), user_data)
+
+    def _create_user(self, user_id: str, user_data: Dict):
+        with self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO users (user_id, data) VALUES (?, ?)',
+                               (user_id, dumps(user_data)))
+
+    async def update_user_settings(self, user_id: str, settings: Dict):
+        await self._run(self._update_user_settings, str(user_id), settings)
+
+    def _update_user_settings(self, user_id: str, settings: Dict):
+        with self._conn:
+            user = self._get_user(user_id)
+            if user is None:
+                raise KeyError(f"Користувача {user_id} не знайдено")
+            user.setdefault('settings', {}).update(settings)
+            self._conn.execute('UPDATE users SET data = ? WHERE user_id = ?',
+                               (dumps(user), user_id))
+
+    async def add_activities(self, activity_docs: List[Dict]):
+        await self._run(self._add_activities, activity_docs)
+
+    def _add_activities(self, activity_docs: List[Dict]):
+        """Одна транзакція на пакет; повторний запис того ж id ігнорується"""
+        daily_increments = {}
+        with self._conn:
+            for activity_doc in activity_docs:
+                data = dict(activity_doc)
+                activity_id = data.pop('id', None) or uuid.uuid4().hex
+                cursor = self._conn.execute(
+                    'INSERT OR IGNORE INTO activities (id, user_id, date, data) '
+                    'VALUES (?, ?, ?, ?)',
+                    (activity_id, data['user_id'], data['date'], dumps(data)))
+                if cursor.rowcount:
+                    merge_increments(
+                        daily_increments.setdefault((data['user_id'], data['date']), {}),
+                        activity_increments(data))
+
+            for (user_id, day), increments in daily_increments.items():
+                row = self._conn.execute(
+                    'SELECT data FROM daily_aggregates WHERE user_id = ? AND date = ?',
+                    (user_id, day)).fetchone()
+                aggregate = json.loads(row[0]) if row else {'date': day}
+                merge_increments(aggregate, increments)
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO daily_aggregates (user_id, date, data) '
+                    'VALUES (?, ?, ?)',
+                    (user_id, day, json.dumps(aggregate, ensure_ascii=False)))
+
+    async def get_daily_aggregates(self, user_id: str,
+                                   days: Iterable[str]) -> Dict[str, Dict]:
+        return await self._run(self._get_daily_aggregates, str(user_id), list(days))
+
+    def _get_daily_aggregates(self, user_id: str, days: List[str]) -> Dict[str, Dict]:
+        if not days:
+            return {}
+        placeholders = ', '.join('?' * len(days))
+        rows = self._conn.execute(
+            f'SELECT date, data FROM daily_aggregates '
+            f'WHERE user_id = ? AND date IN ({placeholders})',
+            (user_id, *days)).fetchall()
+        return {day: json.loads(data) for day, data in rows}
+
+    async def get_daily_aggregates_bulk(
+            self, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict]:
+        return await self._run(self._get_daily_aggregates_bulk,
+                               [(str(user_id), day) for user_id, day in keys])
+
+    def _get_daily_aggregates_bulk(self, keys: List[Tuple[str, str]]
+                                   ) -> Dict[Tuple[str, str], Dict]:
+        found = {}
+        # Два параметри на пару; старі збірки SQLite приймають до 999 параметрів
+        for offset in range(0, len(keys), 400):
+            chunk = keys[offset:offset + 400]
+            values = ', '.join('(?, ?)' for _ in chunk)
+            rows = self._conn.execute(
+                f'SELECT user_id, date, data FROM daily_aggregates '
+                f'WHERE (user_id, date) IN (VALUES {values})',
+                [value for key in chunk for value in key]).fetchall()
+            for user_id, day, data in rows:
+                found[(user_id, day)] = json.loads(data)
+        return found
+
+    async def iter_users(self, fields: Optional[List[str]] = None
+                         ) -> AsyncIterator[Tuple[str, Dict]]:
+        """Усі профілі цілком, сторінками за user_id"""
+        last_id = ''
+        while True:
+            rows = await self._run(self._users_page, last_id)
+            if not rows:
+                return
+            for user_id, raw in rows:
+                yield user_id, loads(raw)
+            last_id = rows[-1][0]
+
+    def _users_page(self, last_id: str) -> List[tuple]:
+        return self._conn.execute(
+            'SELECT user_id, data FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?',
+            (last_id, self.page_size)).fetchall()
+
+    async def iter_activities(self, user_id: str, start_day: str, end_day: str,
+                              fields: Optional[List[str]] = None) -> AsyncIterator[Dict]:
+        """Сторінки за ключем (date, id), без OFFSET"""
+        cursor = ('', '')
+        while True:
+            rows = await self._run(self._activities_page, str(user_id),
+                                   start_day, end_day, cursor)
+            if not rows:
+                return
+            for activity_id, raw, _ in rows:
+                data = loads(raw)
+                if fields:
+                    data = {field: data[field] for field in fields if field in data}
+                data['id'] = activity_id
+                yield data
+            last_id, _, last_day = rows[-1]
+            cursor = (last_day, last_id)
+
+    def _activities_page(self, user_id: str, start_day: str, end_day: str,
+                         cursor: tuple) -> List[tuple]:
+        return self._conn.execute(
+            'SELECT id, data, date FROM activities '
+            'WHERE user_id = ? AND date BETWEEN ? AND ? AND (date, id) > (?, ?) '
+            'ORDER BY date, id LIMIT ?',
+            (user_id, start_day, end_day, *cursor, self.page_size)).fetchall()
+
+    async def close(self):
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
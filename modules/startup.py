@@ -0,0 +1,52 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """Тривалості етапів імпорту і запуску для відстеження холодного старту
+
+    Етапи можуть виконуватися одночасно (наприклад, Firebase і прогрів AI),
+    тому їхня сума може бути більшою за total.
+    """
+
+    def __init__(self, started_at: Optional[float] = None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.total: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started_at
+
+    def stats(self) -> dict:
+        stats = {f'{name}_seconds': round(seconds, 4)
+                 for name, seconds in self.phases.items()}
+        if self.total is not None:
+            stats['total_seconds'] = round(self.total, 4)
+        return stats
+
+    def log(self):
+        phases = ', '.join(f'{name} {seconds * 1000:.0f} мс'
+                           for name, seconds in self.phases.items())
+        total = f'{self.total * 1000:.0f} мс' if self.total is not None else '-'
+        logger.info(f"Запуск за {total}: {phases}")
+
+    def save(self, path: str):
+        """Записує звіт у JSON, щоб порівнювати запуски між версіями"""
+        try:
+            with open(path, 'w') as report_file:
+                json.dump(self.stats(), report_file, indent=2)
+        except OSError as e:
+            logger.error(f"Не вдалося записати звіт запуску {path}: {e}")
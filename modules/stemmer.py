@@ -0,0 +1,80 @@
+"""Легкий стемер української мови для швидкого шляху класифікації
+
+Відкидає одне закінчення (і зворотний суфікс -ся/-сь), тож "присідань" і
+"присідання", "вечеряю" і "вечеря" зводяться до однієї основи. Форми,
+які суфіксами не звести (п'ю - пив, сніданок - сніданку з випадним о),
+перелічені в LEMMAS. Ключові слова і текст нормалізуються однаково, а
+основи слів тексту кешуються.
+"""
+import re
+from functools import lru_cache
+
+WORD_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+# Закінчення від довших до коротших: перевіряється найдовше можливе
+ENDINGS = tuple(sorted({
+    'ннями', 'нням', 'ннях', 'нні', 'нню', 'ння',
+    'ами', 'ями', 'ові', 'еві', 'ого', 'ому', 'ими', 'іми', 'ій', 'ий',
+    'ною', 'ної', 'ним', 'них', 'ний', 'ній',
+    'ала', 'али', 'ало', 'ила', 'или', 'ило', 'ати', 'ити', 'яти', 'іти',
+    'ють', 'ять', 'ємо', 'ете', 'уєш',
+    'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'єм', 'ою', 'ею', 'ів', 'ей', 'ої',
+    'ок', 'ую', 'юю', 'аю', 'яю', 'ав', 'яв', 'ив', 'нь', 'ть',
+    'а', 'я', 'у', 'ю', 'і', 'и', 'е', 'о', 'ь', 'й', 'є', 'ї',
+}, key=len, reverse=True))
+REFLEXIVE = ('ся', 'сь')
+# Основа після довгого закінчення - щонайменше 4 літери, після однолітерного -
+# 3: так "вода" і "воду" зводяться до "вод", а "готую" не стає префіксом "готель"
+MIN_STEM = 4
+MIN_SHORT_STEM = 3
+
+# Нерегулярні форми частих слів: форма -> слово, яке далі стемиться.
+# Омоніми сюди не додаються: "пила" (інструмент) чи "спала" (температура)
+# дали б хибну активність, тож такі форми лишаються AI
+LEMMAS = {
+    **dict.fromkeys(["пив", "пили", "п'є", "п'ємо", "п'єш", "п'ють",
+                     "пити", "попив", "попила"], "п'ю"),
+    **dict.fromkeys(["випила", "випили", "вип'ю", "вип'є", "випити"], "випив"),
+    **dict.fromkeys(["прибрав", "прибрала", "прибрали", "прибрати", "прибираю",
+                     "прибирав", "прибирала", "прибираємо", "прибрано"], "прибирання"),
+    **dict.fromkeys(["чаю", "чаєм", "чаї"], "чай"),
+    **dict.fromkeys(["їв", "їла", "їли", "їмо", "поїв", "поїла", "поїли", "з'їв",
+                     "з'їла", "з'їли"], "їм"),
+    **dict.fromkeys(["біжу", "бігаю", "бігав", "бігала", "бігали", "пробіжка",
+                     "пробіжку", "пробіжки"], "біг"),
+    **dict.fromkeys(["сплю", "спав", "заснув", "заснула", "спатоньки"], "спати"),
+    **dict.fromkeys(["мию", "помив", "помила", "помию", "вимив", "вимила"], "миття"),
+    **dict.fromkeys(["ранку", "вранці", "зранку"], "ранок"),
+    **dict.fromkeys(["снідаю", "снідав", "снідала", "поснідав", "поснідала"], "сніданок"),
+    # Випадний о: основа "сніданок" - "снідан", а "сніданку" - "сніданк"
+    **dict.fromkeys(["сніданку", "сніданки", "сніданком", "сніданків"], "сніданок"),
+    **dict.fromkeys(["порядку", "порядком"], "порядок"),
+    **dict.fromkeys(["спортзал", "спортзалі", "спортзалу"], "спорт"),
+    **dict.fromkeys(["працював", "працювала", "працювали", "працювати"], "працюю"),
+    **dict.fromkeys(["читав", "читала", "читали", "читати"], "читаю"),
+    **dict.fromkeys(["водою"], "вода"),
+}
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Основа слова в нижньому регістрі; числа повертаються без змін"""
+    word = LEMMAS.get(word, word)
+    if not word.isalpha() and "'" not in word:
+        return word
+    for suffix in REFLEXIVE:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            word = word[:-len(suffix)]
+            break
+    for ending in ENDINGS:
+        if word.endswith(ending):
+            rest = len(word) - len(ending)
+            if rest >= MIN_STEM or (len(ending) == 1 and rest >= MIN_SHORT_STEM):
+                return word[:-len(ending)]
+    return word
+
+
+def normalize(text_lower: str) -> str:
+    """Основи слів тексту через пробіл; розділові знаки відкидаються"""
+    return ' '.join(stem(word)
+                    for word in WORD_RE.findall(text_lower.replace('’', "'")))
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+import pytz
+
+from config import (DEFAULT_SUMMARY_TIME, DEFAULT_TIMEZONE, SUMMARY_CHUNK_SIZE,
+                    SUMMARY_REFRESH_INTERVAL)
+from modules.aggregates import stats_from_aggregates
+from modules.outbox import MessageOutbox
+from modules.repository import Repository
+from modules.summary_manager import SummaryManager
+
+logger = logging.getLogger(__name__)
+
+TIME_RE = re.compile(r'^([01]?\d|2[0-3]):([0-5]\d)$')
+# Скільки пропущених хвилин наздоганяти після паузи event loop
+MAX_CATCH_UP_MINUTES = 10
+
+
+class SummaryBroadcaster:
+    """Щоденні підсумки за локальним часом користувачів
+
+    Користувачі згруповані за парою (часовий пояс, час підсумку), тож щохвилини
+    перевіряється лише кілька поясів, а не кожен користувач. Агрегати всіх
+    користувачів, чий час настав, читаються пакетно, а повідомлення йдуть
+    через MessageOutbox з лімітами Telegram. Розклад читається зі сховища при
+    старті і раз на refresh_interval; зміни налаштувань передаються через
+    schedule_user().
+    """
+
+    def __init__(self, repository: Repository, outbox: MessageOutbox,
+                 refresh_interval: float = SUMMARY_REFRESH_INTERVAL,
+                 chunk_size: int = SUMMARY_CHUNK_SIZE):
+        self.repository = repository
+        self.outbox = outbox
+        self.refresh_interval = refresh_interval
+        self.chunk_size = chunk_size
+        self._slots: Dict[Tuple[str, str], Set[str]] = {}
+        self._user_slots: Dict[str, Tuple[str, str]] = {}
+        # Локальна дата останнього підсумку, щоб не надіслати його двічі
+        self._sent: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.skipped_empty = 0
+
+    @staticmethod
+    def _slot(settings: Dict) -> Tuple[str, str]:
+        timezone = settings.get('timezone') or DEFAULT_TIMEZONE
+        if timezone not in pytz.all_timezones_set:
+            timezone = DEFAULT_TIMEZONE
+        match = TIME_RE.match(str(settings.get('daily_summary_time') or ''))
+        if match is None:
+            match = TIME_RE.match(DEFAULT_SUMMARY_TIME)
+        return timezone, f'{int(match.group(1)):02d}:{match.group(2)}'
+
+    def schedule_user(self, user_id: str, settings: Dict):
+        """Додає користувача в розклад або переносить після зміни налаштувань"""
+        user_id = str(user_id)
+        previous = self._user_slots.get(user_id)
+        if previous is not None:
+            settings = {**self._slot_settings(previous), **settings}
+        slot = self._slot(settings)
+        if slot == previous:
+            return
+        if previous is not None:
+            users = self._slots[previous]
+            users.discard(user_id)
+            if not users:
+                del self._slots[previous]
+        self._slots.setdefault(slot, set()).add(user_id)
+        self._user_slots[user_id] = slot
+
+    @staticmethod
+    def _slot_settings(slot: Tuple[str, str]) -> Dict:
+        return {'timezone': slot[0], 'daily_summary_time': slot[1]}
+
+    async def load(self):
+        """Перечитує розклад усіх користувачів з проекцією лише потрібних полів"""
+        count = 0
+        async for user_id, user in self.repository.iter_users(
+                ['settings.timezone', 'settings.daily_summary_time']):
+            self.schedule_user(user_id, (user or {}).get('settings') or {})
+            count += 1
+        logger.info(f"Розклад підсумків: {count} користувачів, "
+                    f"{len(self._slots)} груп")
+
+    def due(self, now_utc: datetime) -> Dict[str, List[str]]:
+        """Користувачі, чий час підсумку - поточна хвилина: {локальна дата: [id]}"""
+        due = {}
+        for timezone in {slot[0] for slot in self._slots}:
+            local = now_utc.astimezone(pytz.timezone(timezone))
+            users = self._slots.get((timezone, local.strftime('%H:%M')))
+            if not users:
+                continue
+            day = local.strftime('%Y-%m-%d')
+            due.setdefault(day, []).extend(
+                user_id for user_id in users if self._sent.get(user_id) != day)
+        return due
+
+    async def send_due(self, now_utc: datetime):
+        for day, user_ids in self.due(now_utc).items():
+            local_date = datetime.strptime(day, '%Y-%m-%d').date()
+            for offset in range(0, len(user_ids), self.chunk_size):
+                chunk = user_ids[offset:offset + self.chunk_size]
+                aggregates = await self.repository.get_daily_aggregates_bulk(
+                    [(user_id, day) for user_id in chunk])
+                for user_id in chunk:
+                    self._sent[user_id] = day
+                    aggregate = aggregates.get((user_id, day))
+                    stats, total = stats_from_aggregates([aggregate] if aggregate else [])
+                    if total == 0:
+                        self.skipped_empty += 1
+                        continue
+                    text = SummaryManager.format_summary(stats, total, local_date, local_date)
+                    await self.outbox.send(int(user_id), f"🌙 {text}")
+                    self.sent += 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error(f"Не вдалося завантажити розклад підсумків: {e!r}")
+        next_refresh = loop.time() + self.refresh_interval
+        last_minute = datetime.now(pytz.utc).replace(second=0, microsecond=0)
+
+        while True:
+            now = datetime.now(pytz.utc)
+            next_minute = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+            await asyncio.sleep((next_minute - now).total_seconds())
+
+            current = datetime.now(pytz.utc).replace(second=0, microsecond=0)
+            minute = max(last_minute + timedelta(minutes=1),
+                         current - timedelta(minutes=MAX_CATCH_UP_MINUTES))
+            while minute <= current:
+                try:
+                    await self.send_due(minute)
+                except Exception as e:
+                    logger.error(f"Помилка розсилки підсумків за {minute}: {e!r}")
+                minute += timedelta(minutes=1)
+            last_minute = current
+
+            if loop.time() >= next_refresh:
+                next_refresh = loop.time() + self.refresh_interval
+                try:
+                    await self.load()
+                except Exception as e:
+                    logger.error(f"Не вдалося оновити розклад підсумків: {e!r}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stats(self) -> dict:
+        return {
+            'users': len(self._user_slots),
+            'slots': len(self._slots),
+            'sent': self.sent,
+            'skipped_empty': self.skipped_empty,
+        }
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -1,9 +1,19 @@
-from datetime import datetime, timedelta
+from datetime import date, timedelta
+from typing import Dict, Optional
+
+from modules.aggregates import load_period_stats
+from modules.local_time import local_today
+from modules.repository import Repository
+from modules.timeline import Timeline
+
 
 class SummaryManager:
+    def __init__(self, repository: Repository, timeline: Optional[Timeline] = None):
+        self.repository = repository
+        self.timeline = timeline
+
     @staticmethod
-    def get_period_dates(period: str):
-        today = datetime.now().date()
+    def get_period_dates(period: str, today: date):
         if period == "day":
             return today, today
         elif period == "week":
@@ -13,23 +23,21 @@ class SummaryManager:
         else:
             raise ValueError("Unknown period")
 
-    @staticmethod
-    def get_summary(user_id: str, db, period: str = "day"):
-        start_date, end_date = SummaryManager.get_period_dates(period)
-        activities_ref = db.collection('activities')
-        query = activities_ref.where('user_id', '==', user_id)
-        docs = query.stream()
-
-        summary = {}
-        total = 0
-        for doc in docs:
-            data = doc.to_dict()
-            act_date = datetime.strptime(data.get('date'), "%Y-%m-%d").date()
-            if start_date <= act_date <= end_date:
-                act_type = data.get('type', 'other')
-                summary[act_type] = summary.get(act_type, 0) + 1
-                total += 1
+    async def get_summary(self, user_id: str, period: str = "day",
+                          settings: Optional[Dict] = None):
+        """Підсумок за період з пам'яті або з денних агрегатів (документ на день)
 
+        Період відраховується від сьогодні в поясі з settings користувача.
+        """
+        start_date, end_date = SummaryManager.get_period_dates(
+            period, local_today(settings))
+        stats = None
+        if self.timeline is not None:
+            stats = await self.timeline.period_stats(user_id, start_date, end_date)
+        if stats is None:
+            stats = await load_period_stats(self.repository, user_id,
+                                            start_date, end_date)
+        summary, total = stats
         return summary, total, start_date, end_date
 
     @staticmethod
@@ -0,0 +1,213 @@
+"""Недавні активності користувачів у пам'яті процесу
+
+Більшість читань стосуються сьогодні або поточного тижня, тому останні
+TIMELINE_DAYS днів кожного активного користувача тримаються в пам'яті:
+нові активності додаються одразу з save_activity, а історія вікна
+читається зі сховища при першому зверненні. Запис - це об'єкт зі
+__slots__ з інтернованими рядками дня і типу, а не повний документ.
+
+Загальна кількість записів обмежена; при переповненні витісняються
+користувачі, до яких найдовше не зверталися.
+"""
+import asyncio
+import logging
+import sys
+from collections import OrderedDict, deque
+from datetime import date, timedelta
+from typing import Deque, Dict, Optional, Set, Tuple
+
+from config import TIMELINE_DAYS, TIMELINE_MAX_RECORDS, TIMELINE_USER_MAX_RECORDS
+from modules.aggregates import field_key
+from modules.local_time import LATEST_TIMEZONE, local_today
+from modules.repository import Repository
+
+logger = logging.getLogger(__name__)
+
+
+class TimelineRecord:
+    """Одна активність: ідентифікатор, день YYYY-MM-DD і тип як в агрегатах"""
+
+    __slots__ = ('id', 'day', 'type')
+
+    def __init__(self, activity_id: str, day: str, act_type: str):
+        self.id = activity_id
+        # Днів у вікні і типів небагато, тож рядки спільні для всіх записів
+        self.day = sys.intern(day)
+        self.type = sys.intern(act_type)
+
+    @classmethod
+    def from_activity(cls, activity: Dict) -> Optional['TimelineRecord']:
+        day = activity.get('date')
+        if not activity.get('id') or not isinstance(day, str):
+            return None
+        return cls(activity['id'], day, field_key(activity.get('type')))
+
+
+class UserTimeline:
+    """Кільцевий буфер записів одного користувача, впорядкований за днем
+
+    covers_from - перший день, за який буфер містить усі активності; None,
+    поки історію ще не завантажено зі сховища.
+    """
+
+    __slots__ = ('records', 'ids', 'covers_from')
+
+    def __init__(self, max_records: int):
+        self.records: Deque[TimelineRecord] = deque(maxlen=max_records)
+        self.ids: Set[str] = set()
+        self.covers_from: Optional[str] = None
+
+    def add(self, record: TimelineRecord) -> int:
+        """Додає запис; повертає зміну кількості записів"""
+        if record.id in self.ids:
+            return 0
+        if len(self.records) == self.records.maxlen:
+            dropped = self.records[0]
+            self.ids.discard(dropped.id)
+            # Повнота буфера тепер гарантована лише з наступного дня
+            next_day = (date.fromisoformat(dropped.day) + timedelta(days=1)).isoformat()
+            if self.covers_from is not None and next_day > self.covers_from:
+                self.covers_from = next_day
+            self.records.append(record)
+            self.ids.add(record.id)
+            return 0
+        self.records.append(record)
+        self.ids.add(record.id)
+        return 1
+
+    def prune(self, first_day: str) -> int:
+        """Видаляє записи до first_day; повертає кількість видалених"""
+        removed = 0
+        while self.records and self.records[0].day < first_day:
+            self.ids.discard(self.records.popleft().id)
+            removed += 1
+        if self.covers_from is not None and self.covers_from < first_day:
+            self.covers_from = first_day
+        return removed
+
+    def stats(self, start_day: str, end_day: str) -> Tuple[Dict[str, int], int]:
+        """(кількість за типами, загальна кількість) за дні start_day..end_day"""
+        stats: Dict[str, int] = {}
+        total = 0
+        for record in self.records:
+            if start_day <= record.day <= end_day:
+                stats[record.type] = stats.get(record.type, 0) + 1
+                total += 1
+        return stats, total
+
+
+class Timeline:
+    """Вікна недавніх активностей користувачів з LRU витісненням"""
+
+    def __init__(self, repository: Repository, days: int = TIMELINE_DAYS,
+                 max_records: int = TIMELINE_MAX_RECORDS,
+                 user_max_records: int = TIMELINE_USER_MAX_RECORDS):
+        self.repository = repository
+        self.days = days
+        self.max_records = max_records
+        self.user_max_records = user_max_records
+        self._users: 'OrderedDict[str, UserTimeline]' = OrderedDict()
+        self._loading: Dict[str, asyncio.Task] = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def _first_day(self) -> str:
+        # Вікно спільне для користувачів з різними поясами, тож воно
+        # відраховується від найранішого "сьогодні"
+        today = local_today({'timezone': LATEST_TIMEZONE})
+        return (today - timedelta(days=self.days - 1)).isoformat()
+
+    def _get(self, user_id: str) -> UserTimeline:
+        timeline = self._users.get(user_id)
+        if timeline is None:
+            timeline = self._users[user_id] = UserTimeline(self.user_max_records)
+        self._users.move_to_end(user_id)
+        return timeline
+
+    def _evict(self, keep: str):
+        while self.size > self.max_records and len(self._users) > 1:
+            user_id, timeline = next(iter(self._users.items()))
+            if user_id == keep:
+                self._users.move_to_end(user_id)
+                continue
+            del self._users[user_id]
+            self.size -= len(timeline.records)
+            self.evictions += 1
+
+    def add(self, user_id: str, activity: Dict):
+        """Записує нову активність; для ще не завантажених користувачів теж,
+        щоб завантаження зі сховища не пропустило активності з буфера запису"""
+        record = TimelineRecord.from_activity(activity)
+        if record is None:
+            return
+        timeline = self._get(user_id)
+        self.size += timeline.add(record)
+        self.size -= timeline.prune(self._first_day())
+        self._evict(user_id)
+
+    async def _load(self, user_id: str, first_day: str):
+        records = []
+        async for activity in self.repository.iter_activities(
+                user_id, first_day, '9999-12-31', ['date', 'type']):
+            record = TimelineRecord.from_activity(activity)
+            if record is not None:
+                records.append(record)
+        self.loads += 1
+
+        timeline = self._get(user_id)
+        # Активності, додані під час читання, можуть уже бути і в сховищі
+        pending = list(timeline.records)
+        timeline.records.clear()
+        timeline.ids.clear()
+        self.size -= len(pending)
+        merged = records + pending
+        merged.sort(key=lambda record: record.day)
+        timeline.covers_from = first_day
+        for record in merged:
+            self.size += timeline.add(record)
+        self._evict(user_id)
+
+    async def period_stats(self, user_id: str, start_date: date,
+                           end_date: date) -> Optional[Tuple[Dict[str, int], int]]:
+        """(stats, total) за період з пам'яті або None, якщо період
+        виходить за межі вікна"""
+        first_day = self._first_day()
+        start_day = start_date.isoformat()
+        if start_day < first_day:
+            return None
+
+        timeline = self._users.get(user_id)
+        if timeline is None or timeline.covers_from is None:
+            self.misses += 1
+            task = self._loading.get(user_id)
+            if task is None:
+                task = asyncio.ensure_future(self._load(user_id, first_day))
+                self._loading[user_id] = task
+                task.add_done_callback(lambda _: self._loading.pop(user_id, None))
+            await asyncio.shield(task)
+            timeline = self._users.get(user_id)
+            if timeline is None:
+                return None
+        else:
+            self.hits += 1
+
+        self._users.move_to_end(user_id)
+        self.size -= timeline.prune(first_day)
+        if timeline.covers_from is None or start_day < timeline.covers_from:
+            return None
+        return timeline.stats(start_day, end_date.isoformat())
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'users': len(self._users),
+            'records': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,65 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Set
+
+from modules.cache import TTLCache
+
+
+class UserCache:
+    """Кеш профілів користувачів з об'єднанням одночасних запитів
+
+    Якщо профіль одного користувача запитують кілька обробників одночасно,
+    до бази йде лише один запит, решта чекають на його результат.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.cache = TTLCache(maxsize, ttl)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Користувачі, інвалідовані під час завантаження: результат такого
+        # завантаження вже може бути застарілим, тому його не кешуємо
+        self._stale: Set[str] = set()
+        self.coalesced = 0
+
+    async def get_or_load(self, user_id: str,
+                          loader: Callable[[], Awaitable[Dict]]) -> Dict:
+        """Повертає профіль з кешу або завантажує його один раз"""
+        user = self.cache.get(user_id)
+        if user is not None:
+            return user
+
+        future = self._inflight.get(user_id)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = future
+        try:
+            user = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Виняток уже передано тим, хто чекає; позначаємо його отриманим
+            future.exception()
+            raise
+        else:
+            if user_id not in self._stale:
+                self.cache.set(user_id, user)
+            future.set_result(user)
+            return user
+        finally:
+            self._inflight.pop(user_id, None)
+            self._stale.discard(user_id)
+
+    def invalidate(self, user_id: str):
+        """Скидає профіль після зміни налаштувань"""
+        self.cache.invalidate(user_id)
+        if user_id in self._inflight:
+            self._stale.add(user_id)
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        stats['inflight'] = len(self._inflight)
+        stats['coalesced'] = self.coalesced
+        return stats
@@ -1,29 +1,65 @@
 import re
-from datetime import datetime
-from typing import Dict
-from aiogram import types
-from firebase_admin import firestore
-
-# Отримуємо клієнт Firestore (буде ініціалізований в bot.py)
-db = None
+import time
+import uuid
+from datetime import datetime, time as day_time
+from typing import Callable, Dict, List, Optional, Tuple
 
+import pytz
+from aiogram import types
 
-def init_db(firestore_client):
-    """Ініціалізує клієнт Firestore"""
-    global db
-    db = firestore_client
+from config import (WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL, WRITE_BUFFER_MAX_PENDING,
+                    USER_CACHE_SIZE, USER_CACHE_TTL, TIMELINE_MAX_RECORDS)
+from modules.aggregates import load_period_stats
+from modules.local_time import local_today, user_timezone
+from modules.repository import Repository
+from modules.timeline import Timeline
+from modules.user_cache import UserCache
+from modules.write_buffer import WriteBehindBuffer
 
 
 class UserManager:
-
-    @staticmethod
-    async def get_or_create_user(telegram_user: types.User) -> Dict:
-        """Отримує або створює користувача в Firestore"""
-        user_ref = db.collection('users').document(str(telegram_user.id))
-        user_doc = user_ref.get()
-
-        if user_doc.exists:
-            return user_doc.to_dict()
+    """Користувачі і активності поверх сховища (Firestore, SQLite тощо)"""
+
+    def __init__(self, repository: Repository):
+        self.repository = repository
+        # Буфер відкладеного запису активностей; кожна активність у Firestore -
+        # це до двох операцій у WriteBatch (документ і оновлення агрегату), і
+        # ще одна операція на пакет - його маркер
+        self.activity_buffer = WriteBehindBuffer(
+            repository.add_activities,
+            max_batch=(WRITE_BATCH_SIZE - 1) // 2,
+            flush_interval=WRITE_FLUSH_INTERVAL,
+            max_pending=WRITE_BUFFER_MAX_PENDING)
+        # Профілі змінюються рідко, тому не читаємо їх на кожне повідомлення
+        self.user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+        # Останні дні активностей у пам'яті; спільні з SummaryManager
+        self.timeline = Timeline(repository) if TIMELINE_MAX_RECORDS else None
+        # Викликаються з (user_id, settings) для нового користувача і після
+        # зміни налаштувань, наприклад, щоб оновити розклад підсумків
+        self.settings_listeners: List[Callable[[str, Dict], None]] = []
+        # Викликаються з (user_id, час у секундах) для кожної нової активності
+        self.activity_listeners: List[Callable[[str, float], None]] = []
+
+    def _notify_settings(self, user_id: str, settings: Dict):
+        for listener in self.settings_listeners:
+            listener(user_id, settings)
+
+    async def close(self):
+        """Дописує буфер активностей перед завершенням роботи"""
+        await self.activity_buffer.close()
+
+    async def get_or_create_user(self, telegram_user: types.User) -> Dict:
+        """Отримує або створює користувача, спершу перевіряючи кеш"""
+        return await self.user_cache.get_or_load(
+            str(telegram_user.id),
+            lambda: self._load_or_create_user(telegram_user))
+
+    async def _load_or_create_user(self, telegram_user: types.User) -> Dict:
+        """Отримує або створює користувача у сховищі"""
+        user_id = str(telegram_user.id)
+        user = await self.repository.get_user(user_id)
+        if user is not None:
+            return user
 
         user_data = {
             'telegram_id': str(telegram_user.id),
@@ -44,54 +80,105 @@ class UserManager:
             }
         }
 
-        user_ref.set(user_data)
+        await self.repository.create_user(user_id, user_data)
+        self._notify_settings(user_id, user_data['settings'])
         return user_data
 
-    @staticmethod
-    async def get_daily_stats(user_id: str, db):
-        today = datetime.now().strftime('%Y-%m-%d')
-        activities_ref = db.collection('activities')
-        query = activities_ref.where('user_id', '==',
-                                     user_id).where('date', '==', today)
-        docs = query.stream()
-
-        stats = {}
-        total = 0
-        for doc in docs:
-            data = doc.to_dict()
-            act_type = data.get('type', 'other')
-            stats[act_type] = stats.get(act_type, 0) + 1
-            total += 1
-
-        return stats, total
+    async def get_settings(self, user_id: str) -> Optional[Dict]:
+        """Налаштування наявного користувача або None
+
+        Відсутній профіль не кладеться в кеш, тому читання йде напряму, якщо
+        профілю ще немає в кеші.
+        """
+        user = self.user_cache.cache.get(user_id)
+        if user is None:
+            user = await self.repository.get_user(user_id)
+        return user.get('settings') if user else None
+
+    def cached_settings(self, user_id: str) -> Optional[Dict]:
+        """Налаштування з кешу профілів, без звернення до сховища"""
+        user = self.user_cache.cache.get(user_id)
+        return user.get('settings') if user else None
+
+    async def update_settings(self, user_id: str, settings: Dict):
+        """Оновлює налаштування користувача і скидає його профіль з кешу"""
+        await self.repository.update_user_settings(user_id, settings)
+        self.user_cache.invalidate(user_id)
+        self._notify_settings(user_id, settings)
+
+    async def get_daily_stats(self, user_id: str):
+        """Статистика за сьогодні в поясі користувача з пам'яті або з денного
+        агрегату"""
+        today = local_today(await self.get_settings(user_id))
+        if self.timeline is not None:
+            stats = await self.timeline.period_stats(user_id, today, today)
+            if stats is not None:
+                return stats
+        return await load_period_stats(self.repository, user_id, today, today)
 
     @staticmethod
-    async def save_activity(user_id: str, activity_data: Dict, raw_text: str):
-        """Зберігає активність в Firestore"""
-        now = datetime.utcnow()
-
+    def _activity_doc(user_id: str, activity_data: Dict, raw_text: str,
+                      now: datetime, tz) -> Dict:
+        """Документ активності з міткою часу в UTC
+
+        HH:MM на початку тексту - місцевий час користувача за сьогодні; date -
+        місцевий день активності.
+        """
+        local_now = now.astimezone(tz)
         # Парсимо час з повідомлення
         time_match = re.match(r'^(\d{1,2}):(\d{2})', raw_text.strip())
         if time_match:
             hour, minute = int(time_match.group(1)), int(time_match.group(2))
-            today = datetime.now().date()
-            activity_time = datetime.combine(
-                today,
-                datetime.min.time().replace(hour=hour, minute=minute))
+            local_time = tz.localize(datetime.combine(local_now.date(),
+                                                      day_time(hour, minute)))
+            activity_time = local_time.astimezone(pytz.utc)
         else:
+            local_time = local_now
             activity_time = now
 
-        activity_doc = {
+        return {
+            # Ідентифікатор від клієнта робить повторний запис ідемпотентним
+            'id': uuid.uuid4().hex,
             'user_id': user_id,
             'timestamp': activity_time,
-            'date': activity_time.strftime('%Y-%m-%d'),
+            'date': local_time.strftime('%Y-%m-%d'),
             'type': activity_data['type'],
             'subtype': activity_data['subtype'],
             'details': activity_data['details'],
             'raw_text': raw_text,
             'mood': '',
             'auto_detected': activity_data['auto_detected'],
+            # Звідки тип: keyword, ai, local тощо (ActivityTracker)
+            'source': activity_data.get('source', ''),
             'created_at': now
         }
 
-        db.collection('activities').add(activity_doc)
+    async def save_activity(self, user_id: str, activity_data: Dict, raw_text: str):
+        """Ставить активність у чергу на пакетний запис у сховище"""
+        await self.save_activities(user_id, [(activity_data, raw_text)])
+
+    async def save_activities(self, user_id: str, entries: List[Tuple[Dict, str]],
+                              at: Optional[datetime] = None, tz=None):
+        """Ставить у чергу кілька активностей (activity_data, raw_text) одного
+        повідомлення; вони записуються одним пакетом
+
+        at - час надсилання повідомлення, якщо його обробили не одразу;
+        без HH:MM у тексті він стає часом активності. tz - пояс користувача,
+        якщо він уже відомий; інакше читаються налаштування.
+        """
+        if tz is None:
+            tz = user_timezone(await self.get_settings(user_id))
+        now = at.astimezone(pytz.utc) if at is not None else datetime.now(pytz.utc)
+        activity_docs = [self._activity_doc(user_id, activity_data, raw_text, now, tz)
+                         for activity_data, raw_text in entries]
+
+        if len(activity_docs) == 1:
+            await self.activity_buffer.add(activity_docs[0])
+        else:
+            await self.activity_buffer.add_group(activity_docs)
+        if self.timeline is not None:
+            for activity_doc in activity_docs:
+                self.timeline.add(user_id, activity_doc)
+        saved_at = time.time()
+        for listener in self.activity_listeners:
+            listener(user_id, saved_at)
@@ -0,0 +1,248 @@
+"""Режим webhook з горизонтально шардованими воркерами
+
+Фронт приймає оновлення від Telegram і розподіляє їх між воркерами за
+jump consistent hash від id користувача. Кожен воркер - окремий процес
+(або контейнер) з власним Dispatcher. Оновлення до воркера йдуть однією
+чергою і пересилаються пакетами по порядку, а воркер обробляє оновлення
+одного користувача послідовно (див. modules.scheduler), тож порядок
+повідомлень зберігається.
+
+    Telegram -> фронт (WEBHOOK_PORT) -> POST /updates -> воркер i
+"""
+import asyncio
+import logging
+import os
+import random
+import signal
+import sys
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from config import (METRICS_PORT, WEBHOOK_FORWARD_BATCH, WEBHOOK_FORWARD_MAX_PENDING,
+                    WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET,
+                    WEBHOOK_URL, WEBHOOK_WORKER_BASE_PORT, WEBHOOK_WORKER_URLS,
+                    WEBHOOK_WORKERS)
+from modules.metrics import REGISTRY
+from modules.sharding import shard_for_update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+UPDATES_PATH = '/updates'
+
+
+async def _wait_for_signal():
+    """Чекає SIGINT або SIGTERM, щоб завершити роботу без втрати черг"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+
+async def _start_site(app: web.Application, host: str, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+class ShardForwarder:
+    """Упорядкована пересилка оновлень воркерам, по одній черзі на воркер
+
+    Пакет повторюється, доки воркер його не прийме, а наступні оновлення
+    чекають у черзі - так порядок не порушується. Коли черга заповнена,
+    фронт не відповідає Telegram, і той сам сповільнює доставку.
+    """
+
+    def __init__(self, worker_urls: List[str], max_batch: int = WEBHOOK_FORWARD_BATCH,
+                 max_pending: int = WEBHOOK_FORWARD_MAX_PENDING,
+                 retry_base_delay: float = 0.5, max_retry_delay: float = 10.0):
+        if not worker_urls:
+            raise ValueError("Потрібен хоча б один воркер")
+        self.worker_urls = worker_urls
+        self.max_batch = max_batch
+        self.retry_base_delay = retry_base_delay
+        self.max_retry_delay = max_retry_delay
+        self._queues = [asyncio.Queue(maxsize=max_pending) for _ in worker_urls]
+        self._tasks: List[asyncio.Task] = []
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.forwarded = [0] * len(worker_urls)
+
+    async def start(self):
+        self._session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=30))
+        self._tasks = [asyncio.create_task(self._run(index))
+                       for index in range(len(self.worker_urls))]
+
+    async def put(self, update: Dict):
+        shard = shard_for_update(update, len(self.worker_urls))
+        await self._queues[shard].put(update)
+
+    async def _run(self, index: int):
+        queue = self._queues[index]
+        url = self.worker_urls[index].rstrip('/') + UPDATES_PATH
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            attempt = 0
+            while True:
+                try:
+                    async with self._session.post(url, json=batch) as response:
+                        if response.status == 200:
+                            break
+                        logger.warning(f"Воркер {url} повернув статус {response.status}")
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.warning(f"Воркер {url} недоступний: {e!r}")
+                delay = min(self.max_retry_delay,
+                            self.retry_base_delay * (2 ** attempt))
+                await asyncio.sleep(random.uniform(delay / 2, delay))
+                attempt += 1
+
+            self.forwarded[index] += len(batch)
+            for _ in batch:
+                queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            'pending': [queue.qsize() for queue in self._queues],
+            'forwarded': list(self.forwarded),
+        }
+
+    async def close(self, timeout: float = 10.0):
+        """Дочікується пересилки черг (не довше timeout) і зупиняється"""
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Не переслано оновлень: {sum(self.stats()['pending'])}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+
+
+def create_front_app(forwarder: ShardForwarder, secret: str = WEBHOOK_SECRET,
+                     path: str = WEBHOOK_PATH) -> web.Application:
+    async def receive(request: web.Request) -> web.Response:
+        if secret and request.headers.get(SECRET_HEADER) != secret:
+            return web.Response(status=401)
+        await forwarder.put(await request.json())
+        return web.Response()
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response(forwarder.stats())
+
+    app = web.Application()
+    app.router.add_post(path, receive)
+    app.router.add_get('/health', health)
+    return app
+
+
+def create_worker_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    """Воркер; порядок і ліміт обробки задає UpdateScheduler диспетчера"""
+    tasks = set()
+
+    async def process(update: Update):
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            logger.error(f"Помилка обробки оновлення {update.update_id}: {e!r}")
+
+    async def receive(request: web.Request) -> web.Response:
+        # Задачі створюються в порядку пакета і в цьому ж порядку
+        # потрапляють у черги користувачів планувальника
+        for raw in await request.json():
+            task = asyncio.create_task(
+                process(Update.model_validate(raw, context={'bot': bot})))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        return web.Response()
+
+    async def health(request: web.Request) -> web.Response:
+        return web.Response(text='ok')
+
+    app = web.Application()
+    app.router.add_post(UPDATES_PATH, receive)
+    app.router.add_get('/health', health)
+    app['tasks'] = tasks
+    return app
+
+
+async def run_worker(dp: Dispatcher, bot: Bot, host: str = WEBHOOK_HOST,
+                     port: int = WEBHOOK_PORT):
+    """Воркер: приймає пакети оновлень від фронту і обробляє їх"""
+    app = create_worker_app(dp, bot)
+    await dp.emit_startup(bot=bot, **dp.workflow_data)
+    runner = await _start_site(app, host, port)
+    logger.info(f"Воркер слухає {host}:{port}")
+    try:
+        await _wait_for_signal()
+    finally:
+        await runner.cleanup()
+        await asyncio.gather(*app['tasks'], return_exceptions=True)
+        await dp.emit_shutdown(bot=bot, **dp.workflow_data)
+
+
+async def _supervise_worker(index: int, port: int, stopping: asyncio.Event):
+    """Запускає локальний воркер і перезапускає його після падіння"""
+    env = dict(os.environ, BOT_MODE='worker', WEBHOOK_HOST='127.0.0.1',
+               WEBHOOK_PORT=str(port),
+               METRICS_PORT=str(METRICS_PORT + 1 + index if METRICS_PORT else 0))
+    while not stopping.is_set():
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(sys.argv[0]), env=env,
+            # Сигнали терміналу отримує лише фронт: він спершу дописує
+            # черги воркерам, а потім зупиняє їх сам
+            start_new_session=True)
+        logger.info(f"Воркер {index} (pid {process.pid}) на порту {port}")
+        waiter = asyncio.create_task(process.wait())
+        stopper = asyncio.create_task(stopping.wait())
+        await asyncio.wait({waiter, stopper}, return_when=asyncio.FIRST_COMPLETED)
+        if stopping.is_set():
+            if process.returncode is None:
+                process.terminate()
+            await waiter
+            return
+        stopper.cancel()
+        logger.error(f"Воркер {index} завершився з кодом {process.returncode}, "
+                     f"перезапуск")
+        await asyncio.sleep(1)
+
+
+async def run_front(bot: Bot, allowed_updates: List[str]):
+    """Фронт webhook; без WEBHOOK_WORKER_URLS сам запускає локальних воркерів"""
+    stopping = asyncio.Event()
+    supervisors = []
+    worker_urls = WEBHOOK_WORKER_URLS
+    if not worker_urls:
+        ports = [WEBHOOK_WORKER_BASE_PORT + index for index in range(WEBHOOK_WORKERS)]
+        worker_urls = [f'http://127.0.0.1:{port}' for port in ports]
+        supervisors = [asyncio.create_task(_supervise_worker(index, port, stopping))
+                       for index, port in enumerate(ports)]
+
+    forwarder = ShardForwarder(worker_urls)
+    REGISTRY.add_stats('bot_forwarder', forwarder.stats)
+    await forwarder.start()
+    runner = await _start_site(create_front_app(forwarder), WEBHOOK_HOST, WEBHOOK_PORT)
+    logger.info(f"Webhook слухає {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}, "
+                f"воркерів: {len(worker_urls)}")
+
+    if WEBHOOK_URL:
+        await bot.set_webhook(WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+                              secret_token=WEBHOOK_SECRET or None,
+                              allowed_updates=allowed_updates)
+    try:
+        await _wait_for_signal()
+    finally:
+        await runner.cleanup()
+        await forwarder.close()
+        stopping.set()
+        await asyncio.gather(*supervisors, return_exceptions=True)
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import random
+from typing import Awaitable, Callable, List
+
+logger = logging.getLogger(__name__)
+
+# Маркер завершення роботи у черзі
+_CLOSE = object()
+
+
+class WriteBehindBuffer:
+    """Накопичує документи і записує їх пакетами у фоні
+
+    Пакет відправляється, коли набралося max_batch документів або минуло
+    flush_interval секунд від першого документа в пакеті. Черга обмежена
+    max_pending записами (група з add_group - один запис): коли вона
+    повна, add() чекає (backpressure).
+    """
+
+    def __init__(self, commit: Callable[[List], Awaitable[None]],
+                 max_batch: int = 500, flush_interval: float = 0.25,
+                 max_pending: int = 5000, max_retries: int = 3,
+                 retry_base_delay: float = 0.5):
+        self.commit = commit
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._task = None
+        self._closed = False
+        self.flushed = 0
+        self.batches = 0
+        self.dropped = 0
+
+    async def add(self, item):
+        """Додає документ у чергу; чекає, якщо черга переповнена"""
+        if self._closed:
+            raise RuntimeError("Буфер запису вже закрито")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        await self._queue.put(item)
+
+    async def add_group(self, items: List):
+        """Додає документи, які мають потрапити в один пакет
+
+        Група займає одне місце в черзі і не розділяється між пакетами,
+        тому не може бути більшою за max_batch.
+        """
+        if len(items) > self.max_batch:
+            raise ValueError(f"Група з {len(items)} документів більша за пакет "
+                             f"({self.max_batch})")
+        await self.add(list(items))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+        carry = None
+
+        while not closing:
+            if carry is not None:
+                item, carry = carry, None
+            else:
+                item = await self._queue.get()
+            if item is _CLOSE:
+                break
+
+            batch = item if isinstance(item, list) else [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+
+                if item is _CLOSE:
+                    closing = True
+                    break
+                if isinstance(item, list):
+                    if len(batch) + len(item) > self.max_batch:
+                        # Група не вміщується: вона почне наступний пакет
+                        carry = item
+                        break
+                    batch.extend(item)
+                else:
+                    batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List):
+        """Записує пакет, повторюючи спробу при тимчасових помилках"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.commit(batch)
+                self.flushed += len(batch)
+                self.batches += 1
+                return
+            except Exception as e:
+                logger.warning(f"Помилка запису пакета з {len(batch)} документів "
+                               f"(спроба {attempt + 1}): {e!r}")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(random.uniform(
+                        0, self.retry_base_delay * (2 ** attempt)))
+
+        self.dropped += len(batch)
+        logger.error(f"Втрачено пакет з {len(batch)} документів після всіх спроб")
+
+    async def close(self):
+        """Дописує все, що залишилось у черзі, і зупиняє фонову задачу"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is not None:
+            await self._queue.put(_CLOSE)
+            await self._task
+            self._task = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            'pending': self.pending,
+            'flushed': self.flushed,
+            'batches': self.batches,
+            'dropped': self.dropped
+        }
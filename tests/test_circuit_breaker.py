@@ -0,0 +1,104 @@
+import pytest
+
+from modules import circuit_breaker
+from modules.circuit_breaker import CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(failure_threshold=3, reset_timeout=30, slow_call=10)
+
+
+def fail(breaker, clock, times=1):
+    for _ in range(times):
+        breaker.record(False, clock())
+
+
+def test_opens_after_threshold_failures(breaker, clock):
+    fail(breaker, clock, 2)
+    assert breaker.state == 'closed'
+    assert breaker.allow()
+
+    fail(breaker, clock)
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+    assert breaker.stats() == {'open': 1, 'failures': 3, 'opened': 1, 'rejected': 1}
+
+
+def test_success_resets_failures(breaker, clock):
+    fail(breaker, clock, 2)
+    breaker.record(True, clock())
+    fail(breaker, clock, 2)
+    assert breaker.state == 'closed'
+
+
+def test_slow_success_counts_as_failure(breaker, clock):
+    for _ in range(3):
+        started = clock()
+        clock.now += 11
+        breaker.record(True, started)
+    assert breaker.state == 'open'
+
+
+def test_half_open_lets_one_probe_through(breaker, clock):
+    fail(breaker, clock, 3)
+    clock.now += 30
+    assert breaker.state == 'half_open'
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_probe_success_closes(breaker, clock):
+    fail(breaker, clock, 3)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(True, clock())
+    assert breaker.state == 'closed'
+    assert breaker.allow()
+
+
+def test_probe_failure_reopens(breaker, clock):
+    fail(breaker, clock, 3)
+    clock.now += 30
+    assert breaker.allow()
+    fail(breaker, clock)
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+    assert breaker.opened == 1
+
+
+def test_unfinished_probe_does_not_block_next_one(breaker, clock):
+    fail(breaker, clock, 3)
+    clock.now += 30
+    assert breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_result_started_before_opening_is_ignored(breaker, clock):
+    in_flight = clock()
+    clock.now += 1
+    fail(breaker, clock, 3)
+
+    breaker.record(True, in_flight)
+    assert breaker.state == 'open'
+    assert breaker.failures == 3
+
+    clock.now += 30
+    breaker.record(False, in_flight)
+    assert breaker.state == 'half_open'
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+import pytz
+
+from benchmarks.fakes import FakeFirestore
+from modules.firestore_repository import (WRITE_MARKERS_COLLECTION, FirestoreRepository,
+                                          batch_marker_id)
+
+
+def activity(activity_id, day='2026-01-01', activity_type='food'):
+    return {'id': activity_id, 'user_id': '1', 'date': day,
+            'timestamp': datetime(2026, 1, 1, 12, tzinfo=pytz.utc),
+            'type': activity_type, 'subtype': '', 'details': {},
+            'raw_text': 'обід', 'auto_detected': True}
+
+
+class LostResponseBatch:
+    """Пакет, що записується, але відповідь на commit() губиться"""
+
+    def __init__(self, batch):
+        self._batch = batch
+
+    def __getattr__(self, name):
+        return getattr(self._batch, name)
+
+    async def commit(self):
+        await self._batch.commit()
+        raise ConnectionError('відповідь загублено')
+
+
+def test_marker_id_does_not_depend_on_order():
+    docs = [activity('a'), activity('b')]
+    assert batch_marker_id(docs) == batch_marker_id(docs[::-1])
+    assert batch_marker_id(docs) != batch_marker_id(docs[:1])
+
+
+def test_marker_id_missing_without_ids():
+    assert batch_marker_id([activity('a'), activity(None)]) is None
+    assert batch_marker_id([]) is None
+
+
+def test_retried_chunk_is_applied_once():
+    db = FakeFirestore()
+    repository = FirestoreRepository(db)
+    docs = [activity('a'), activity('b'), activity('c', day='2026-01-02', activity_type='work')]
+
+    async def scenario():
+        batch = db.batch
+        db.batch = lambda: LostResponseBatch(batch())
+        with pytest.raises(ConnectionError):
+            await repository._commit_chunk(docs)
+        db.batch = batch
+
+        # Повтор після загубленої відповіді: маркер уже існує
+        await repository._commit_chunk(docs)
+        await repository._commit_chunk(list(reversed(docs)))
+        return await repository.get_daily_aggregates('1', ['2026-01-01', '2026-01-02'])
+
+    aggregates = asyncio.run(scenario())
+    assert aggregates['2026-01-01']['total'] == 2
+    assert aggregates['2026-01-01']['types'] == {'food': 2}
+    assert aggregates['2026-01-02']['total'] == 1
+    assert len(db._documents(WRITE_MARKERS_COLLECTION)) == 1
+
+
+def test_marker_has_expiry():
+    db = FakeFirestore()
+    repository = FirestoreRepository(db)
+    asyncio.run(repository._commit_chunk([activity('a')]))
+
+    marker, = db._documents(WRITE_MARKERS_COLLECTION).values()
+    assert marker['activities'] == 1
+    assert marker['expires_at'] > datetime.now(pytz.utc)
+
+
+def test_chunk_without_ids_is_not_deduplicated():
+    db = FakeFirestore()
+    repository = FirestoreRepository(db)
+
+    async def scenario():
+        await repository._commit_chunk([activity(None)])
+        await repository._commit_chunk([activity(None)])
+        return await repository.get_daily_aggregates('1', ['2026-01-01'])
+
+    assert asyncio.run(scenario())['2026-01-01']['total'] == 2
+    assert not db._documents(WRITE_MARKERS_COLLECTION)
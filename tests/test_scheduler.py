@@ -0,0 +1,105 @@
+import asyncio
+import random
+
+import pytest
+
+from modules.scheduler import Shed, UpdateScheduler
+
+
+def test_tasks_of_one_user_run_in_order():
+    async def scenario():
+        scheduler = UpdateScheduler(max_concurrency=8, max_user_backlog=100)
+        random.seed(1)
+        finished = {user: [] for user in range(5)}
+        running = set()
+
+        def task(user, number):
+            async def run():
+                assert user not in running
+                running.add(user)
+                await asyncio.sleep(random.random() / 100)
+                running.discard(user)
+                finished[user].append(number)
+                return number
+            return run
+
+        futures = [scheduler.submit(user, task(user, number))
+                   for number in range(20) for user in range(5)]
+        results = await asyncio.gather(*futures)
+        await scheduler.close()
+        return finished, results, scheduler.stats()
+
+    finished, results, stats = asyncio.run(scenario())
+    assert all(numbers == list(range(20)) for numbers in finished.values())
+    assert results == [number for number in range(20) for _ in range(5)]
+    assert stats['processed'] == 100
+    assert stats['backlog'] == 0 and stats['users_queued'] == 0
+
+
+def test_failed_task_does_not_stop_user_queue():
+    async def scenario():
+        scheduler = UpdateScheduler(max_concurrency=2)
+        order = []
+
+        async def broken():
+            order.append('broken')
+            raise ValueError('помилка')
+
+        async def next_one():
+            order.append('next')
+
+        first = scheduler.submit('user', broken)
+        second = scheduler.submit('user', next_one)
+        with pytest.raises(ValueError):
+            await first
+        await second
+        await scheduler.close()
+        return order
+
+    assert asyncio.run(scenario()) == ['broken', 'next']
+
+
+def test_backlog_limits_shed_new_tasks():
+    async def scenario():
+        scheduler = UpdateScheduler(max_concurrency=1, max_backlog=3, max_user_backlog=2)
+        release = asyncio.Event()
+
+        async def wait():
+            await release.wait()
+
+        accepted = [scheduler.submit('a', wait), scheduler.submit('a', wait)]
+        user_over = scheduler.submit('a', wait)
+        accepted.append(scheduler.submit('b', wait))
+        total_over = scheduler.submit('c', wait)
+        release.set()
+        await asyncio.gather(*accepted)
+        await scheduler.close()
+        return user_over, total_over, scheduler.stats()
+
+    user_over, total_over, stats = asyncio.run(scenario())
+    assert user_over is None and total_over is None
+    assert stats['shed'] == 2 and stats['processed'] == 3
+
+
+def test_task_waiting_longer_than_max_wait_expires():
+    async def scenario():
+        scheduler = UpdateScheduler(max_concurrency=1, max_wait=0.01)
+        ran = []
+
+        async def slow():
+            await asyncio.sleep(0.05)
+
+        async def late():
+            ran.append('late')
+
+        first = scheduler.submit('a', slow)
+        second = scheduler.submit('b', late)
+        await first
+        with pytest.raises(Shed):
+            await second
+        await scheduler.close()
+        return ran, scheduler.stats()
+
+    ran, stats = asyncio.run(scenario())
+    assert ran == []
+    assert stats['expired'] == 1